@@ -1,15 +1,73 @@
 from flask import Flask
 from extensions import db, migrate, login_manager, csrf
+from config import database_config, install_sqlite_pragmas
 import os
 from datetime import datetime
 import pytz
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'your-secret-key-change-this-in-production'
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///product_registry.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # Database URL, pool and SQLite PRAGMAs from the environment (see config.py)
+    app.config.update(database_config())
+    
+    # Serial verification cache (see verification.py)
+    app.config['VERIFICATION_CACHE_SIZE'] = 10000
+    app.config['VERIFICATION_CACHE_TTL'] = 300  # seconds
+    # Bumped on every product change so all workers drop their cached records
+    app.config['VERIFICATION_VERSION_FILE'] = os.path.join(app.instance_path, 'verification.version')
+    app.config['VERIFICATION_BATCH_LIMIT'] = 500  # serials per verify_products_batch request
+    
+    # Logged-in user cache (see principal.py)
+    app.config['PRINCIPAL_CACHE_SIZE'] = 10000
+    app.config['PRINCIPAL_CACHE_TTL'] = 60  # seconds
+    # Bumped when a user's role or approval changes so all workers drop cached users
+    app.config['PRINCIPAL_VERSION_FILE'] = os.path.join(app.instance_path, 'principal.version')
+    
+    # Password hashing policy (see password_policy.py); existing hashes are
+    # upgraded or downgraded to PASSWORD_HASH_METHOD as users log in
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:600000'
+    app.config['PASSWORD_HASH_WORKERS'] = 2  # concurrent hashes per process
+    app.config['PASSWORD_HASH_TIMEOUT'] = 10  # seconds to wait for a free worker
+    
+    # Per-request SQL counts and timings (see instrumentation.py)
+    app.config['SQL_INSTRUMENTATION'] = True
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = 250  # None turns the slow-query log off
+    app.config['SLOWEST_STATEMENTS_KEPT'] = 3  # per request, in the structured log
+    app.config['REQUEST_STATS_BUFFER_SIZE'] = 5000  # recent requests behind the admin page
+    app.config['SERVER_TIMING'] = False  # Server-Timing header with DB timings on every response
+    app.config['INSTRUMENTATION_LOG_LEVEL'] = 'INFO'  # per-request JSON lines; None: use the logging config
+    
+    # Sampled request profiling (see profiling.py); off unless enabled
+    app.config['PROFILING_ENABLED'] = False
+    app.config['PROFILE_SAMPLE_RATE'] = 0.01  # share of requests profiled
+    app.config['PROFILE_HEADER'] = 'X-Profile'  # profiles the request when sent by an admin
+    app.config['PROFILE_DIR'] = os.path.join(app.instance_path, 'profiles')
+    app.config['PROFILE_KEEP'] = 20  # newest profiles kept per endpoint
+    
+    # Deal PDF rendering queue (see pdf_queue.py)
+    app.config['PDF_CACHE_DIR'] = os.path.join(app.instance_path, 'pdf_cache')
+    app.config['PDF_WORKERS'] = 2
+    app.config['PDF_WAIT_SECONDS'] = 0.5  # then show a "being prepared" page
+    app.config['PDF_CACHE_MAX_FILES'] = 10000
+    app.config['PDF_CACHE_MAX_AGE'] = 7 * 24 * 3600  # seconds
+    app.config['PDF_CACHE_PRUNE_INTERVAL'] = 300  # seconds between prunes per process
+    # Exports render within the request: about 2s for a full statement, 5-8s for a cold ZIP
+    app.config['DEAL_EXPORT_STATEMENT_LIMIT'] = 250  # deals per combined PDF
+    app.config['DEAL_EXPORT_ZIP_LIMIT'] = 500  # deals per ZIP export
+    
+    # Bulk product import (see product_import.py)
+    app.config['PRODUCT_IMPORT_MAX_ROWS'] = 5000  # products per uploaded file
+    
+    # Category and brand cache (see reference_data.py); rewritten on every change
+    app.config['REFERENCE_DATA_VERSION_FILE'] = os.path.join(app.instance_path, 'reference_data.version')
+    
+    # Overrides for scripts, benchmarks and tests
+    if config:
+        app.config.update(config)
+    
     # Set Pakistan timezone as default
     app.config['TIMEZONE'] = 'Asia/Karachi'
     os.environ['TZ'] = 'Asia/Karachi'
@@ -61,6 +119,14 @@ def create_app():
 
     # Initialize extensions with app
     db.init_app(app)
+    with app.app_context():
+        install_sqlite_pragmas(db.engine, app.config.get('SQLITE_PRAGMAS'))
+    if app.config['SQL_INSTRUMENTATION']:
+        from instrumentation import init_instrumentation
+        init_instrumentation(app)
+    if app.config['PROFILING_ENABLED']:
+        from profiling import init_profiling
+        init_profiling(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     csrf.init_app(app)
@@ -127,6 +193,10 @@ if __name__ == '__main__':
                 db.session.add(brand)
                 
         db.session.commit()
+        
+        # Seed the dashboard counters (see counters.py)
+        from counters import reconcile_counters
+        reconcile_counters()
         print("Database initialized successfully!")
         print("Default admin user: username='admin', password='admin123'")
     
@@ -0,0 +1,121 @@
+"""
+Shared helpers for the benchmark scripts
+Builds a throwaway app on a temporary SQLite database and seeds it with
+reference data, users and products.
+"""
+
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import create_app
+from extensions import db
+from models import User, Category, Brand, Product, Deal, DealItem
+
+
+def create_benchmark_app(db_path=None, **config):
+    """Create an app bound to a fresh SQLite file and create the schema"""
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix='registry_bench_', suffix='.db')
+        os.close(fd)
+    overrides = {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'WTF_CSRF_ENABLED': False,
+        'TESTING': True,
+        # Only slow queries: a JSON line per request would add to every timing
+        'INSTRUMENTATION_LOG_LEVEL': 'WARNING'
+    }
+    overrides.update(config)
+    app = create_app(overrides)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app, db_path
+
+
+def seed_registry(num_users=100, num_products=1000, shopkeeper_ratio=0.2):
+    """Bulk insert categories, brands, users and products; returns the serial numbers"""
+    categories = ['Camera', 'Lens', 'Light', 'Audio', 'Accessories']
+    brands = ['Canon', 'Nikon', 'Sony', 'Fujifilm', 'Panasonic', 'Godox', 'Manfrotto']
+    now = datetime.utcnow()
+
+    db.session.execute(insert(Category), [{'name': name} for name in categories])
+    db.session.execute(insert(Brand), [{'name': name} for name in brands])
+
+    # One shared hash keeps seeding fast; benchmarks never log in with these
+    password_hash = 'pbkdf2:sha256:1$bench$0'
+    shopkeepers = int(num_users * shopkeeper_ratio)
+    db.session.execute(insert(User), [{
+        'username': f'bench_user_{i}',
+        'email': f'bench_user_{i}@example.com',
+        'mobile_number': f'03{i:09d}',
+        'id_card_number': f'{i:05d}-{i:07d}-1'[:15],
+        'password_hash': password_hash,
+        'is_shopkeeper': i < shopkeepers,
+        'shopkeeper_approved': True,
+        'created_at': now - timedelta(days=30)
+    } for i in range(num_users)])
+
+    statuses = ['for_sale'] * 8 + ['locked', 'stolen']
+    serials = [f'BENCH-{i:08d}' for i in range(num_products)]
+    db.session.execute(insert(Product), [{
+        'name': f'Product {i}',
+        'serial_number': serial,
+        'status': statuses[i % len(statuses)],
+        'user_id': (i % num_users) + 1,
+        'category_id': (i % len(categories)) + 1,
+        'brand_id': (i % len(brands)) + 1,
+        'created_at': now - timedelta(days=i % 7)
+    } for i, serial in enumerate(serials)])
+    db.session.commit()
+    return serials
+
+
+def seed_deals(num_deals=1000, items_per_deal=2, num_users=100, num_products=1000):
+    """Bulk insert deals with items over the products created by seed_registry()"""
+    now = datetime.utcnow()
+    statuses = ['pending'] * 6 + ['approved', 'rejected', 'completed']
+    db.session.execute(insert(Deal), [{
+        'status': statuses[i % len(statuses)],
+        'buyer_id': (i % num_users) + 1,
+        'seller_id': ((i + 1) % num_users) + 1 if i % 3 else None,
+        'seller_name': None if i % 3 else f'Walk-in Seller {i}',
+        'seller_mobile': None if i % 3 else f'0345{i:07d}',
+        'created_at': now - timedelta(minutes=i)
+    } for i in range(num_deals)])
+    db.session.execute(insert(DealItem), [{
+        'deal_id': i + 1,
+        'product_id': ((i * items_per_deal + j) % num_products) + 1,
+        'price': 0.0
+    } for i in range(num_deals) for j in range(items_per_deal)])
+    db.session.commit()
+
+
+def time_calls(func, args_list):
+    """Call func once per argument and return per-call latencies in milliseconds"""
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(latencies):
+    """p50/p95/p99/mean summary of a list of millisecond latencies"""
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered), 4),
+        'p50_ms': round(percentile(50), 4),
+        'p95_ms': round(percentile(95), 4),
+        'p99_ms': round(percentile(99), 4)
+    }
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark deal approval throughput: the original one-deal-per-POST ORM loop
+against set-based bulk approval in deal_approval.py.
+
+Usage:
+    python benchmark_deal_approval.py [--deals 2000] [--items 3] [--batch 100]
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import update
+
+from benchmark_common import create_benchmark_app, seed_registry, seed_deals
+from deal_approval import approve_deals
+from extensions import db
+from models import Deal, OwnershipHistory
+
+APPROVER_ID = 1
+
+
+def legacy_approve(deal_id):
+    """What admin_deal_approval did for one approved deal"""
+    deal = Deal.query.get(deal_id)
+    deal.status = 'approved'
+    deal.approved_by = APPROVER_ID
+    deal.approved_at = datetime.utcnow()
+    deal.approval_notes = ''
+    for deal_item in deal.deal_items:
+        product = deal_item.product
+        db.session.add(OwnershipHistory(
+            product_id=product.id,
+            previous_owner_id=product.user_id,
+            new_owner_id=deal.buyer_id,
+            deal_id=deal.id,
+            transfer_type='sale'
+        ))
+        product.user_id = deal.buyer_id
+    db.session.commit()
+    db.session.remove()
+
+
+def bulk_approve(deal_ids):
+    result = approve_deals(deal_ids, APPROVER_ID)
+    assert not result.errors, result.errors
+    db.session.remove()
+
+
+def seeded_app(num_deals, items_per_deal):
+    """Fresh database where every deal is pending and no two deals share a product"""
+    num_users = max(50, num_deals // 20)
+    num_products = num_deals * items_per_deal
+    app, db_path = create_benchmark_app()
+    with app.app_context():
+        seed_registry(num_users=num_users, num_products=num_products)
+        seed_deals(num_deals=num_deals, items_per_deal=items_per_deal,
+                   num_users=num_users, num_products=num_products)
+        db.session.execute(update(Deal).values(status='pending'))
+        db.session.commit()
+    return app, db_path
+
+
+def measure(app, func, batches):
+    with app.app_context():
+        start = time.perf_counter()
+        for batch in batches:
+            func(batch)
+        elapsed = time.perf_counter() - start
+        approved = Deal.query.filter_by(status='approved').count()
+        transfers = OwnershipHistory.query.count()
+    return {
+        'seconds': round(elapsed, 3),
+        'deals_approved': approved,
+        'ownership_records': transfers,
+        'deals_per_second': round(approved / elapsed, 1)
+    }
+
+
+def run_benchmark(num_deals, items_per_deal, batch_size):
+    deal_ids = list(range(1, num_deals + 1))
+    results = {'deals': num_deals, 'items_per_deal': items_per_deal, 'batch_size': batch_size}
+
+    app, db_path = seeded_app(num_deals, items_per_deal)
+    try:
+        results['one_per_request'] = measure(app, legacy_approve, deal_ids)
+    finally:
+        os.remove(db_path)
+
+    app, db_path = seeded_app(num_deals, items_per_deal)
+    try:
+        batches = [deal_ids[i:i + batch_size] for i in range(0, num_deals, batch_size)]
+        results['bulk'] = measure(app, bulk_approve, batches)
+    finally:
+        os.remove(db_path)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--deals', type=int, default=2000)
+    parser.add_argument('--items', type=int, default=3)
+    parser.add_argument('--batch', type=int, default=100)
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.deals, args.items, args.batch), indent=2))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark the admin deal search: the original four separate ilike scans
+merged in Python against the single ranked query in deal_search.py.
+
+Usage:
+    python benchmark_deal_search.py [--deals 20000] [--repeat 20]
+"""
+
+import argparse
+import json
+import os
+
+from sqlalchemy import or_
+
+from benchmark_common import create_benchmark_app, seed_registry, seed_deals, time_calls, summarize
+from deal_search import search_deals
+from extensions import db
+from models import User, Product, Deal, DealItem
+from pagination import paginate
+from query_options import with_loaders
+
+PAGE_SIZE = 25
+
+
+def legacy_search(status, search_query):
+    """The four-pass search admin_deal_approval used to run"""
+    query = Deal.query.filter_by(status=status)
+    seller_name_deals = query.join(User, Deal.seller_id == User.id, isouter=True).filter(
+        or_(User.username.ilike(f'%{search_query}%'), Deal.seller_name.ilike(f'%{search_query}%'))).all()
+    buyer_name_deals = query.join(User, Deal.buyer_id == User.id).filter(
+        User.username.ilike(f'%{search_query}%')).all()
+    mobile_deals = query.join(User, Deal.buyer_id == User.id, isouter=True).filter(
+        or_(User.mobile_number.ilike(f'%{search_query}%'), Deal.seller_mobile.ilike(f'%{search_query}%'))).all()
+    serial_deals = query.join(DealItem).join(Product).filter(
+        Product.serial_number.ilike(f'%{search_query}%')).all()
+    all_deals = seller_name_deals + buyer_name_deals + mobile_deals + serial_deals
+    deals = list({deal.id: deal for deal in all_deals}.values())
+    # The template then touched buyer/seller per row
+    for deal in deals[:PAGE_SIZE]:
+        deal.buyer, deal.seller
+    return deals[:PAGE_SIZE]
+
+
+def ranked_search(status, search_query):
+    """One statement, one page"""
+    query = with_loaders(Deal.query.filter_by(status=status), 'deal_listing')
+    query, keys = search_deals(query, search_query)
+    return paginate(query, keys=keys, per_page=PAGE_SIZE).items
+
+
+def run_benchmark(num_deals, repeat):
+    num_users = max(50, num_deals // 20)
+    num_products = num_deals * 2
+    app, db_path = create_benchmark_app()
+    try:
+        with app.app_context():
+            seed_registry(num_users=num_users, num_products=num_products)
+            seed_deals(num_deals=num_deals, num_users=num_users, num_products=num_products)
+            terms = ['bench_user_1', 'Walk-in', '0345', 'BENCH-0000', 'no-such-term']
+
+            results = {'deals': num_deals, 'terms': {}}
+            for term in terms:
+                args = [('pending', term)] * repeat
+
+                def legacy(status, q):
+                    legacy_search(status, q)
+                    db.session.remove()
+
+                def ranked(status, q):
+                    ranked_search(status, q)
+                    db.session.remove()
+
+                results['terms'][term] = {
+                    'four_pass': summarize(time_calls(legacy, args)),
+                    'single_query': summarize(time_calls(ranked, args))
+                }
+        return results
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--deals', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.deals, args.repeat), indent=2))
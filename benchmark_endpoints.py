@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Load test the key endpoints against a synthetic registry and report
+throughput and latency percentiles as JSON.
+
+Scenarios (each driven through the Flask test client by --threads
+concurrent, logged-in clients):
+    verify       POST /verify_product_ajax, mostly registered serials
+    dashboard    GET /user_dashboard as a regular user
+    deal_search  GET /admin/deals with a seller, mobile or serial search
+    create_deal  POST /user_create_deal with one or two sellable serials
+    export_pdf   GET /deal/<id>/export as the admin, cold PDF cache first
+
+Save a run with --output and pass it to a later run with --compare to see
+the change per scenario between commits.
+
+Usage:
+    python benchmark_endpoints.py [--scale 10k] [--db /tmp/registry_10k.db]
+                                  [--requests 200] [--threads 4]
+                                  [--scenarios verify dashboard ...]
+                                  [--output run.json] [--compare baseline.json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from benchmark_common import create_benchmark_app, summarize
+from extensions import db
+from models import User, Product, Deal
+from synthetic_data import SCALES, ADMIN_USERNAME, generate_dataset
+
+# Requests per scenario sent before measuring (connections, caches, PDF pool)
+WARMUP_REQUESTS = 10
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_fixtures(rng, sample_size=2000):
+    """Ids and search terms the scenarios draw their requests from"""
+    admin_id = db.session.scalar(select(User.id).where(User.username == ADMIN_USERNAME))
+    users = db.session.scalars(select(User.id).where(User.is_admin == False, User.is_shopkeeper == False)
+                               .order_by(func.random()).limit(50)).all()
+    serials = db.session.scalars(select(Product.serial_number)
+                                 .order_by(func.random()).limit(sample_size)).all()
+    sellable = db.session.scalars(select(Product.serial_number).where(Product.status == 'for_sale')
+                                  .order_by(func.random()).limit(sample_size)).all()
+    deals = db.session.execute(select(Deal.id, Deal.seller_name, Deal.seller_mobile)
+                               .order_by(func.random()).limit(sample_size)).all()
+    searches = []
+    for deal_id, seller_name, seller_mobile in deals:
+        if seller_name:
+            searches.append(seller_name)
+            searches.append(seller_mobile[:7])
+    searches += [serial[:10] for serial in rng.sample(serials, min(len(serials), 200))]
+    return {
+        'admin_id': admin_id,
+        'user_ids': users,
+        'serials': serials,
+        'sellable': sellable,
+        'deal_ids': [deal_id for deal_id, _, _ in deals],
+        'searches': searches,
+    }
+
+
+# Each scenario: (client user, expected status codes, request builder)
+# A builder returns (method, url, keyword arguments for the test client).
+
+def _verify(rng, fixtures):
+    serial = rng.choice(fixtures['serials']) if rng.random() < 0.9 else f'MISSING-{rng.randint(0, 10 ** 6)}'
+    return 'POST', '/verify_product_ajax', {'json': {'serial_number': serial}}
+
+
+def _dashboard(rng, fixtures):
+    return 'GET', '/user_dashboard', {}
+
+
+def _deal_search(rng, fixtures):
+    status = rng.choice(('pending', 'pending', 'approved', 'completed'))
+    return 'GET', '/admin/deals', {'query_string': {'status': status, 'search': rng.choice(fixtures['searches'])}}
+
+
+def _create_deal(rng, fixtures):
+    serials = rng.sample(fixtures['sellable'], rng.choice((1, 1, 2)))
+    return 'POST', '/user_create_deal', {'data': {
+        'seller_name': 'Load Test Seller',
+        'seller_mobile': '03451234567',
+        'seller_id_card': '42101-1234567-1',
+        'seller_address': 'Shop 12, Hall Road, Lahore',
+        'serial_numbers': ', '.join(serials),
+        'description': 'Load test deal'
+    }}
+
+
+def _export_pdf(rng, fixtures):
+    return 'GET', f'/deal/{rng.choice(fixtures["deal_ids"])}/export', {}
+
+
+SCENARIOS = {
+    'verify': (None, {200}, _verify),
+    'dashboard': ('user', {200}, _dashboard),
+    'deal_search': ('admin', {200}, _deal_search),
+    'create_deal': ('user', {302}, _create_deal),
+    'export_pdf': ('admin', {200, 202}, _export_pdf),
+}
+
+
+def _client(app, fixtures, role, index):
+    client = app.test_client()
+    if role is not None:
+        user_id = fixtures['admin_id'] if role == 'admin' else \
+            fixtures['user_ids'][index % len(fixtures['user_ids'])]
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+    return client
+
+
+def run_scenario(app, fixtures, name, num_requests, num_threads, seed):
+    """Send num_requests (after a warm-up) from num_threads clients; returns the result dict"""
+    role, expected, build = SCENARIOS[name]
+    rng = random.Random(seed)
+    requests = [build(rng, fixtures) for _ in range(WARMUP_REQUESTS + num_requests)]
+    warmup, requests = requests[:WARMUP_REQUESTS], requests[WARMUP_REQUESTS:]
+
+    warmup_client = _client(app, fixtures, role, 0)
+    for method, url, kwargs in warmup:
+        warmup_client.open(url, method=method, **kwargs)
+
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    position = iter(range(len(requests)))
+
+    def worker(index):
+        client = _client(app, fixtures, role, index)
+        while True:
+            with lock:
+                i = next(position, None)
+            if i is None:
+                return
+            method, url, kwargs = requests[i]
+            start = time.perf_counter()
+            response = client.open(url, method=method, **kwargs)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(num_threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    result = {
+        'requests': len(latencies),
+        'errors': sum(count for status, count in statuses.items() if status not in expected),
+        'status_codes': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': round(len(latencies) / wall, 2)
+    }
+    result.update(summarize(latencies))
+    return result
+
+
+def compare(current, baseline):
+    """Per-scenario change against a previous run, in percent (positive = more / slower)"""
+    def change(new, old):
+        return round((new - old) / old * 100, 1) if old else None
+
+    comparison = {}
+    for name, result in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        comparison[name] = {
+            'throughput_rps': change(result['throughput_rps'], before['throughput_rps']),
+            'p50_ms': change(result['p50_ms'], before['p50_ms']),
+            'p95_ms': change(result['p95_ms'], before['p95_ms']),
+            'p99_ms': change(result['p99_ms'], before['p99_ms'])
+        }
+    return {'baseline_commit': baseline.get('commit'), 'change_percent': comparison}
+
+
+def run_benchmark(scale, db_path, scenarios, num_requests, num_threads, seed=42):
+    keep_db = db_path is not None
+    reuse = keep_db and os.path.exists(db_path)
+    pdf_dir = tempfile.mkdtemp(prefix='registry_bench_pdf_')
+    if reuse:
+        from app import create_app
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}', 'WTF_CSRF_ENABLED': False,
+                          'TESTING': True, 'PDF_CACHE_DIR': pdf_dir, 'INSTRUMENTATION_LOG_LEVEL': 'WARNING'})
+    else:
+        app, db_path = create_benchmark_app(db_path, PDF_CACHE_DIR=pdf_dir)
+    try:
+        with app.app_context():
+            if reuse:
+                dataset = {'product': db.session.scalar(select(func.count(Product.id)))}
+            else:
+                dataset = generate_dataset(SCALES[scale], seed=seed, report=lambda line: None)
+            fixtures = load_fixtures(random.Random(seed))
+            db.session.remove()
+
+        results = {
+            'commit': _git_commit(),
+            'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'scale': None if reuse else scale,
+            'database': db_path,
+            'dataset': dataset,
+            'threads': num_threads,
+            'scenarios': {}
+        }
+        for offset, name in enumerate(scenarios):
+            results['scenarios'][name] = run_scenario(app, fixtures, name, num_requests, num_threads, seed + offset)
+        return results
+    finally:
+        shutil.rmtree(pdf_dir, ignore_errors=True)
+        if not keep_db:
+            os.remove(db_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scale', choices=SCALES, default='10k')
+    parser.add_argument('--db', help='Reuse this SQLite file if it exists, otherwise generate into it')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Also write the results to this file')
+    parser.add_argument('--compare', help='Results file of an earlier run to compare against')
+    args = parser.parse_args()
+
+    # Views print debug lines; keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run_benchmark(args.scale, args.db, args.scenarios, args.requests, args.threads, args.seed)
+    if args.compare:
+        with open(args.compare) as f:
+            results['comparison'] = compare(results, json.load(f))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
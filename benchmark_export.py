@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark for registry_export: rows per second and peak RSS when exporting
+the products table as streamed CSV, streamed XLSX and, for comparison, the
+naive way (load every Product, build the whole CSV in memory).
+
+Each run happens in a freshly spawned process so its peak RSS is its own.
+
+Usage:
+    python benchmark_export.py [--products 200000] [--modes csv xlsx naive]
+"""
+
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import resource
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app import create_app
+from benchmark_common import create_benchmark_app, seed_registry
+from extensions import db
+from models import Product
+from registry_export import stream_export
+
+CHUNK = 100000
+
+
+def seed(num_products):
+    app, db_path = create_benchmark_app()
+    with app.app_context():
+        # seed_registry inserts in one statement; keep the batches bounded
+        seed_registry(100, min(num_products, CHUNK))
+        for start in range(CHUNK, num_products, CHUNK):
+            db.session.execute(insert(Product), [{
+                'name': f'Product {i}',
+                'serial_number': f'BENCH-{i:08d}',
+                'status': 'for_sale',
+                'user_id': (i % 100) + 1,
+                'category_id': (i % 5) + 1,
+                'brand_id': (i % 7) + 1,
+                'created_at': datetime.utcnow()
+            } for i in range(start, min(start + CHUNK, num_products))])
+            db.session.commit()
+        db.engine.dispose()
+    return db_path
+
+
+def _naive_export():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for product in Product.query.all():
+        writer.writerow([product.id, product.serial_number, product.name, product.brand.name,
+                         product.category.name, product.status, product.owner.username,
+                         product.created_at, product.updated_at])
+    yield buffer.getvalue().encode()
+
+
+def run_mode(mode, db_path, results):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}', 'TESTING': True})
+    with app.app_context():
+        rows = Product.query.count()
+        start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        if mode == 'naive':
+            chunks = _naive_export()
+        else:
+            chunks, _, _ = stream_export('products', {}, mode)
+        size = sum(len(chunk) for chunk in chunks)
+        elapsed = time.perf_counter() - start
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put({
+        'mode': mode,
+        'rows': rows,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed),
+        'output_mib': round(size / 1024 / 1024, 1),
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mib': round(peak_rss / 1024, 1),
+        'rss_growth_mib': round((peak_rss - start_rss) / 1024, 1),
+    })
+
+
+def run_benchmark(num_products, modes):
+    db_path = seed(num_products)
+    context = multiprocessing.get_context('spawn')
+    report = {}
+    try:
+        for mode in modes:
+            results = context.Queue()
+            process = context.Process(target=run_mode, args=(mode, db_path, results))
+            process.start()
+            report[mode] = results.get()
+            process.join()
+    finally:
+        os.remove(db_path)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--products', type=int, default=200000)
+    parser.add_argument('--modes', nargs='+', default=['csv', 'xlsx', 'naive'],
+                        choices=['csv', 'xlsx', 'naive'])
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.products, args.modes), indent=2))
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark password hashing policies: logins per second per core for each
+PASSWORD_HASH_METHOD, measured by posting to /login through the test client.
+
+Each policy is timed twice: sequentially (logins per CPU second is the
+per-core rate) and with --threads concurrent clients sharing the process's
+hashing pool (wall-clock throughput and latency under a burst).
+
+Usage:
+    python benchmark_password.py [--logins 50] [--threads 8] [--workers 2]
+                                 [--policies pbkdf2:sha256:600000 scrypt:32768:8:1]
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import insert
+
+from benchmark_common import create_benchmark_app, summarize
+from extensions import db
+from models import User
+import password_policy
+
+DEFAULT_POLICIES = ['pbkdf2:sha256:600000', 'pbkdf2:sha256:260000', 'scrypt:32768:8:1', 'scrypt:16384:8:1']
+PASSWORD = 'bench-password'
+
+
+def _seed_users(count):
+    # Every user shares one hash under the policy being measured
+    password_hash = password_policy.hash_password(PASSWORD)
+    db.session.execute(insert(User), [{
+        'username': f'login_user_{i}',
+        'email': f'login_user_{i}@example.com',
+        'mobile_number': f'03{i:09d}',
+        'id_card_number': f'35202-{i:07d}-1',
+        'password_hash': password_hash,
+        'shopkeeper_approved': True
+    } for i in range(count)])
+    db.session.commit()
+
+
+def _login(app, username):
+    client = app.test_client()
+    start = time.perf_counter()
+    response = client.post('/login', data={'username': username, 'password': PASSWORD})
+    elapsed = (time.perf_counter() - start) * 1000
+    if response.status_code != 302:
+        raise RuntimeError(f'login for {username} returned {response.status_code}')
+    return elapsed
+
+
+def run_policy(method, num_logins, num_threads, workers):
+    app, db_path = create_benchmark_app(PASSWORD_HASH_METHOD=method, PASSWORD_HASH_WORKERS=workers)
+    try:
+        with app.app_context():
+            _seed_users(num_logins)
+        usernames = [f'login_user_{i}' for i in range(num_logins)]
+
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        sequential = [_login(app, username) for username in usernames]
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+
+        with ThreadPoolExecutor(max_workers=num_threads) as pool:
+            burst_start = time.perf_counter()
+            burst = list(pool.map(lambda username: _login(app, username), usernames))
+            burst_wall = time.perf_counter() - burst_start
+
+        return {
+            'logins': num_logins,
+            'logins_per_cpu_second': round(num_logins / cpu, 2),
+            'sequential_logins_per_second': round(num_logins / wall, 2),
+            'sequential': summarize(sequential),
+            'burst_threads': num_threads,
+            'burst_logins_per_second': round(num_logins / burst_wall, 2),
+            'burst': summarize(burst)
+        }
+    finally:
+        os.remove(db_path)
+
+
+def run_benchmark(policies, num_logins, num_threads, workers):
+    return {
+        'cpus': os.cpu_count(),
+        'hash_workers': workers,
+        'policies': {method: run_policy(method, num_logins, num_threads, workers) for method in policies}
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--logins', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2, help='PASSWORD_HASH_WORKERS')
+    parser.add_argument('--policies', nargs='+', default=DEFAULT_POLICIES)
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.policies, args.logins, args.threads, args.workers), indent=2))
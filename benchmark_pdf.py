@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for pdf_generator.generate_deal_pdf_reportlab: per-document
+latency and peak Python memory for deals with 1, 10 and 200 items.
+
+Usage:
+    python benchmark_pdf.py [--sizes 1 10 200] [--repeat 20]
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from benchmark_common import summarize
+from pdf_generator import generate_deal_pdf_reportlab
+
+
+def sample_deal(num_items):
+    """Deal-shaped object with num_items products (same shape as a pdf_queue snapshot)"""
+    now = datetime.utcnow()
+    party = SimpleNamespace(username='bench_buyer', email='buyer@example.com', mobile_number='03001234567')
+    return SimpleNamespace(
+        id=1,
+        status='approved',
+        deal_type='normal',
+        total_amount=0.0,
+        description='Benchmark deal',
+        created_at=now - timedelta(days=1),
+        approved_by=1,
+        approved_at=now,
+        approval_notes='Approved for benchmarking',
+        buyer=party,
+        seller=None,
+        seller_name='Walk-in Seller',
+        seller_mobile='03450000000',
+        seller_id_card='35202-0000000-1',
+        deal_items=[SimpleNamespace(price=0.0, product=SimpleNamespace(
+            name=f'Product {i}',
+            serial_number=f'BENCH-{i:08d}',
+            brand=SimpleNamespace(name='Canon'),
+            category=SimpleNamespace(name='Camera')
+        )) for i in range(num_items)]
+    )
+
+
+def measure(deal, repeat):
+    latencies = []
+    peaks = []
+    size = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = len(generate_deal_pdf_reportlab(deal))
+        latencies.append((time.perf_counter() - start) * 1000)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    # tracemalloc slows allocation-heavy code; time a clean pass as well
+    clean = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        generate_deal_pdf_reportlab(deal)
+        clean.append((time.perf_counter() - start) * 1000)
+    result = summarize(clean)
+    result['pdf_bytes'] = size
+    result['peak_kib'] = round(max(peaks) / 1024, 1)
+    return result
+
+
+def run_benchmark(sizes, repeat):
+    results = {}
+    # The first document also builds the per-thread rendering context
+    start = time.perf_counter()
+    generate_deal_pdf_reportlab(sample_deal(1))
+    results['first_document_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    for num_items in sizes:
+        results[f'{num_items}_items'] = measure(sample_deal(num_items), repeat)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 200])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.sizes, args.repeat), indent=2))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark serial verification: the original ORM path (filter_by + lazy
+brand/category loads + can_be_sold owner query) against verification.py,
+both uncached and cached.
+
+Usage:
+    python benchmark_verification.py [--products 10000] [--lookups 2000]
+"""
+
+import argparse
+import json
+import os
+import random
+
+from benchmark_common import create_benchmark_app, seed_registry, time_calls, summarize
+from extensions import db
+from models import Product
+import verification
+
+
+def legacy_verify(serial_number):
+    """The lookup verify_product_ajax used to perform"""
+    product = Product.query.filter_by(serial_number=serial_number).first()
+    if not product:
+        return None
+    return {
+        'name': product.name,
+        'serial_number': product.serial_number,
+        'brand': product.brand.name,
+        'category': product.category.name,
+        'status': product.status,
+        'can_sell': product.can_be_sold()
+    }
+
+
+def run_benchmark(num_products, num_lookups):
+    app, db_path = create_benchmark_app()
+    try:
+        with app.app_context():
+            serials = seed_registry(num_users=max(10, num_products // 20), num_products=num_products)
+            random.seed(42)
+            # Mix of hits and misses, with repeats like keystroke-driven checks
+            sample = [(random.choice(serials),) for _ in range(num_lookups)]
+            sample += [(f'MISSING-{i}',) for i in range(num_lookups // 10)]
+
+            def legacy(serial_number):
+                legacy_verify(serial_number)
+                db.session.remove()
+
+            def uncached(serial_number):
+                verification.fetch_verification(serial_number)
+                db.session.remove()
+
+            def cached(serial_number):
+                verification.lookup_serial(serial_number)
+                db.session.remove()
+
+            verification.clear_cache()
+            results = {
+                'products': num_products,
+                'lookups': len(sample),
+                'legacy_orm': summarize(time_calls(legacy, sample)),
+                'single_query': summarize(time_calls(uncached, sample)),
+                'cached_cold': summarize(time_calls(cached, sample)),
+                'cached_warm': summarize(time_calls(cached, sample))
+            }
+        return results
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.products, args.lookups), indent=2))
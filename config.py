@@ -0,0 +1,119 @@
+"""
+Database Configuration
+Environment-driven database settings with a profile per backend.
+
+DATABASE_URL selects the database (default: the local SQLite file). A
+postgres:// or postgresql:// URL selects the PostgreSQL profile, which runs
+a connection pool sized for gunicorn workers; anything else uses the SQLite
+profile, which tunes each connection with PRAGMAs so readers and the single
+writer stop blocking each other.
+
+Every setting can be overridden from the environment:
+
+    DATABASE_URL          database URL
+    DB_POOL_SIZE          persistent connections per worker (PostgreSQL)
+    DB_MAX_OVERFLOW       extra connections allowed under load (PostgreSQL)
+    DB_POOL_TIMEOUT       seconds to wait for a free connection (PostgreSQL)
+    DB_POOL_RECYCLE       seconds before a connection is replaced (PostgreSQL)
+    DB_POOL_PRE_PING      test connections before use, 1/0 (PostgreSQL)
+    SQLITE_JOURNAL_MODE   journal mode PRAGMA, e.g. WAL or DELETE
+    SQLITE_SYNCHRONOUS    synchronous PRAGMA, e.g. NORMAL or FULL
+    SQLITE_BUSY_TIMEOUT   milliseconds a writer waits for the lock
+    SQLITE_MMAP_SIZE      bytes of the database file to memory-map
+"""
+
+import os
+
+from sqlalchemy import event
+
+DEFAULT_DATABASE_URL = 'sqlite:///product_registry.db'
+
+POSTGRES_PROFILE = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True,
+}
+
+SQLITE_PROFILE = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 268435456,  # 256 MB
+}
+
+
+def _env(name, default, cast=str):
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+    if cast is bool:
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    return cast(value)
+
+
+def database_url():
+    """DATABASE_URL, normalised for SQLAlchemy (Heroku still issues postgres://)"""
+    url = _env('DATABASE_URL', DEFAULT_DATABASE_URL)
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def is_sqlite(url):
+    return url.startswith('sqlite')
+
+
+def engine_options(url):
+    """SQLALCHEMY_ENGINE_OPTIONS for the profile matching url"""
+    if is_sqlite(url):
+        # SQLite keeps the pool SQLAlchemy picks for it; tuning is done per connection
+        return {}
+    return {
+        'pool_size': _env('DB_POOL_SIZE', POSTGRES_PROFILE['pool_size'], int),
+        'max_overflow': _env('DB_MAX_OVERFLOW', POSTGRES_PROFILE['max_overflow'], int),
+        'pool_timeout': _env('DB_POOL_TIMEOUT', POSTGRES_PROFILE['pool_timeout'], int),
+        'pool_recycle': _env('DB_POOL_RECYCLE', POSTGRES_PROFILE['pool_recycle'], int),
+        'pool_pre_ping': _env('DB_POOL_PRE_PING', POSTGRES_PROFILE['pool_pre_ping'], bool),
+    }
+
+
+def sqlite_pragmas():
+    """PRAGMAs applied to every new SQLite connection, in order"""
+    return {
+        'journal_mode': _env('SQLITE_JOURNAL_MODE', SQLITE_PROFILE['journal_mode']),
+        'synchronous': _env('SQLITE_SYNCHRONOUS', SQLITE_PROFILE['synchronous']),
+        'busy_timeout': _env('SQLITE_BUSY_TIMEOUT', SQLITE_PROFILE['busy_timeout'], int),
+        'mmap_size': _env('SQLITE_MMAP_SIZE', SQLITE_PROFILE['mmap_size'], int),
+    }
+
+
+def database_config():
+    """Flask config keys for the database, read from the environment"""
+    url = database_url()
+    return {
+        'SQLALCHEMY_DATABASE_URI': url,
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options(url),
+        'SQLITE_PRAGMAS': sqlite_pragmas() if is_sqlite(url) else {},
+    }
+
+
+def install_sqlite_pragmas(engine, pragmas):
+    """Run the PRAGMAs on every connection the engine opens
+
+    WAL is skipped for in-memory databases, which cannot use it.
+    """
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    in_memory = engine.url.database in (None, '', ':memory:')
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            if name == 'journal_mode' and in_memory:
+                continue
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
@@ -0,0 +1,200 @@
+"""
+Registry Counters
+Keeps the admin dashboard totals in the registry_stat table so the
+dashboard reads four numbers instead of running four COUNT(*) scans.
+
+Every flush adds its inserts, deletes and status changes to the stored
+values with UPDATE ... SET value = value + delta on the flush's own
+connection, so the counters commit or roll back together with the rows
+they describe. Bulk statements that bypass the ORM (and any other drift)
+are corrected by reconcile_counters(), run from reconcile_counters.py.
+
+The per-user quota count, User.product_count, is maintained the same way
+and repaired by reconcile_product_counts().
+"""
+
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from extensions import db
+from models import User, Product, Deal, RegistryStat
+
+TOTAL_USERS = 'total_users'
+TOTAL_PRODUCTS = 'total_products'
+TOTAL_DEALS = 'total_deals'
+STOLEN_PRODUCTS = 'stolen_products'
+
+# Source of truth for each counter, used to seed and reconcile
+COUNTER_QUERIES = {
+    TOTAL_USERS: lambda: db.session.query(func.count(User.id)).filter(User.is_admin == False),
+    TOTAL_PRODUCTS: lambda: db.session.query(func.count(Product.id)),
+    TOTAL_DEALS: lambda: db.session.query(func.count(Deal.id)),
+    STOLEN_PRODUCTS: lambda: db.session.query(func.count(Product.id)).filter(Product.status == 'stolen'),
+}
+
+
+def _old_value(obj, attr):
+    """Value of attr before this flush (the current value if it did not change)"""
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, attr)
+
+
+def _flush_deltas(session):
+    """Counter changes caused by the objects in this flush"""
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, User):
+            deltas[TOTAL_USERS] += not obj.is_admin
+        elif isinstance(obj, Product):
+            deltas[TOTAL_PRODUCTS] += 1
+            deltas[STOLEN_PRODUCTS] += obj.status == 'stolen'
+        elif isinstance(obj, Deal):
+            deltas[TOTAL_DEALS] += 1
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            deltas[TOTAL_USERS] -= not _old_value(obj, 'is_admin')
+        elif isinstance(obj, Product):
+            deltas[TOTAL_PRODUCTS] -= 1
+            deltas[STOLEN_PRODUCTS] -= _old_value(obj, 'status') == 'stolen'
+        elif isinstance(obj, Deal):
+            deltas[TOTAL_DEALS] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            deltas[TOTAL_USERS] += (not obj.is_admin) - (not _old_value(obj, 'is_admin'))
+        elif isinstance(obj, Product):
+            deltas[STOLEN_PRODUCTS] += (obj.status == 'stolen') - (_old_value(obj, 'status') == 'stolen')
+    return {name: delta for name, delta in deltas.items() if delta}
+
+
+# active_history makes an assignment load the previous value when it is
+# expired (e.g. after a commit), so _old_value() can see what changed
+@event.listens_for(User.is_admin, 'set', active_history=True)
+@event.listens_for(Product.status, 'set', active_history=True)
+@event.listens_for(Product.user_id, 'set', active_history=True)
+def _keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+def _owner_deltas(session):
+    """Change in product_count per user id caused by this flush"""
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Product):
+            deltas[obj.user_id] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            deltas[_old_value(obj, 'user_id')] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, Product):
+            old_owner = _old_value(obj, 'user_id')
+            if old_owner != obj.user_id:
+                deltas[old_owner] -= 1
+                deltas[obj.user_id] += 1
+    return {user_id: delta for user_id, delta in deltas.items() if delta and user_id is not None}
+
+
+def adjust_product_counts(connection, deltas):
+    """Add {user_id: delta} to User.product_count
+
+    Called from the flush listener, and directly by bulk statements that
+    move products without going through the ORM.
+    """
+    for user_id, delta in deltas.items():
+        connection.execute(
+            update(User.__table__)
+            .where(User.__table__.c.id == user_id)
+            .values(product_count=User.__table__.c.product_count + delta))
+
+
+def adjust_counters(connection, deltas):
+    """Add {counter name: delta} to the stored counters
+
+    Like adjust_product_counts(), for bulk statements that bypass the ORM.
+    """
+    for name, delta in deltas.items():
+        connection.execute(
+            update(RegistryStat)
+            .where(RegistryStat.name == name)
+            .values(value=RegistryStat.value + delta, updated_at=datetime.utcnow()))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _apply_flush_deltas(session, flush_context):
+    connection = session.connection()
+    adjust_counters(connection, _flush_deltas(session))
+
+    deltas = _owner_deltas(session)
+    adjust_product_counts(connection, deltas)
+    for user_id, delta in deltas.items():
+        # Keep an already loaded owner in step with the row
+        user = session.identity_map.get(identity_key(User, user_id))
+        if user is not None and 'product_count' in inspect(user).dict:
+            set_committed_value(user, 'product_count', (user.product_count or 0) + delta)
+
+
+def reconcile_counters():
+    """Recount every counter from its source table and correct the stored values
+
+    The stored value and the true count are read by one statement, so they
+    come from the same snapshot, and the difference is applied as a relative
+    UPDATE: increments that flushes commit meanwhile are kept, not overwritten.
+
+    Returns {name: (stored, actual)} for the counters that had drifted or
+    were missing (stored is None).
+    """
+    drift = {}
+    for name, count_query in COUNTER_QUERIES.items():
+        row = db.session.query(RegistryStat.value, count_query().scalar_subquery()) \
+            .filter(RegistryStat.name == name).first()
+        if row is None:
+            actual = count_query().scalar()
+            db.session.add(RegistryStat(name=name, value=actual))
+            drift[name] = (None, actual)
+            continue
+        stored, actual = row
+        if stored != actual:
+            drift[name] = (stored, actual)
+            adjust_counters(db.session.connection(), {name: actual - stored})
+    db.session.commit()
+    return drift
+
+
+def reconcile_product_counts():
+    """Recompute User.product_count from the product table in bulk
+
+    Returns {user_id: (stored, actual)} for the users that were repaired.
+    """
+    actual = (select(func.count(Product.id))
+              .where(Product.user_id == User.id)
+              .correlate(User)
+              .scalar_subquery())
+    drift = {user_id: (stored, count) for user_id, stored, count in
+             db.session.query(User.id, User.product_count, actual)
+             .filter(User.product_count != actual).all()}
+    if drift:
+        db.session.execute(
+            update(User)
+            .where(User.id.in_(list(drift)))
+            .values(product_count=actual)
+            .execution_options(synchronize_session=False))
+    db.session.commit()
+    return drift
+
+
+def get_counters():
+    """All counters as {name: value}
+
+    A counter that has not been seeded yet (a database built with
+    db.create_all() and never reconciled) is counted live instead.
+    """
+    values = dict(db.session.query(RegistryStat.name, RegistryStat.value).all())
+    for name, count_query in COUNTER_QUERIES.items():
+        if name not in values:
+            values[name] = count_query().scalar()
+    return values
@@ -2,45 +2,78 @@
 """
 Script to create initial status history entries for existing products
 that don't have any history records.
+
+Products missing their initial entry are found with one anti-join and
+filled in batches, each batch one multi-row INSERT and its own commit.
+Safe to run repeatedly: a product that already has its entry is skipped.
 """
 
+import argparse
+
+from sqlalchemy import exists, func, insert, select
+
 from app import create_app
 from models import db, Product, ProductStatusHistory
 
-def create_initial_history_for_all_products():
+DEFAULT_BATCH_SIZE = 1000
+
+def _missing_initial_history():
+    """Products with no initial (old_status IS NULL) history entry"""
+    has_initial = exists().where(
+        ProductStatusHistory.product_id == Product.id,
+        ProductStatusHistory.old_status.is_(None))
+    return ~has_initial
+
+def backfill_initial_history(batch_size=DEFAULT_BATCH_SIZE, dry_run=False, report=print):
+    """Insert the missing initial entries; returns the number of products backfilled"""
+    missing = _missing_initial_history()
+    total = db.session.scalar(select(func.count(Product.id)).where(missing))
+    if total == 0 or dry_run:
+        return total
+
+    done = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Product.id, Product.status, Product.created_at,
+                   func.coalesce(Product.original_owner_id, Product.user_id))
+            .where(missing, Product.id > last_id)
+            .order_by(Product.id)
+            .limit(batch_size)).all()
+        if not rows:
+            break
+        db.session.execute(insert(ProductStatusHistory), [{
+            'product_id': product_id,
+            'old_status': None,
+            'new_status': status,
+            'changed_at': created_at,
+            'changed_by': registrant_id
+        } for product_id, status, created_at, registrant_id in rows])
+        db.session.commit()
+        done += len(rows)
+        last_id = rows[-1][0]
+        report(f"Created initial history for {done}/{total} products (up to product ID {last_id})")
+    return done
+
+def create_initial_history_for_all_products(batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
     """Create initial status history for all products that don't have any"""
     app = create_app()
-    
+
     with app.app_context():
-        # Get all products
-        products = Product.query.all()
-        updated_count = 0
-        
-        for product in products:
-            # Check if product already has initial history
-            existing_history = ProductStatusHistory.query.filter_by(
-                product_id=product.id, 
-                old_status=None
-            ).first()
-            
-            if not existing_history:
-                # Create initial history entry
-                initial_history = ProductStatusHistory(
-                    product_id=product.id,
-                    old_status=None,
-                    new_status=product.status,
-                    changed_at=product.created_at,
-                    changed_by=product.user_id
-                )
-                db.session.add(initial_history)
-                updated_count += 1
-                print(f"Created initial history for product: {product.name} (ID: {product.id})")
-        
-        if updated_count > 0:
-            db.session.commit()
-            print(f"\nSuccessfully created initial history entries for {updated_count} products.")
-        else:
+        count = backfill_initial_history(batch_size, dry_run)
+
+        if count == 0:
             print("No products needed initial history entries.")
+        elif dry_run:
+            print(f"{count} products need initial history entries (dry run, nothing written).")
+        else:
+            print(f"\nSuccessfully created initial history entries for {count} products.")
 
 if __name__ == "__main__":
-    create_initial_history_for_all_products()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='Products inserted per statement and commit')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Only report how many products are missing an entry')
+    args = parser.parse_args()
+    create_initial_history_for_all_products(args.batch_size, args.dry_run)
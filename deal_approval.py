@@ -0,0 +1,196 @@
+"""
+Deal Approval
+Approves and completes deals with set-based statements: the products of
+every deal in a batch change owner with one UPDATE per buyer, the ownership
+history is written with one multi-row INSERT and the deals themselves with
+one UPDATE, all inside a single transaction. The deal UPDATE only matches
+deals still in the expected status, so a deal approved twice at the same
+time is processed once and reported as already processed to the other.
+Used for the single-deal approve and complete actions as well as bulk
+approval of selected deals.
+"""
+
+from collections import defaultdict, namedtuple
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert, select, update
+
+from counters import adjust_product_counts
+from extensions import db
+from models import Product, Deal, DealItem, OwnershipHistory
+from verification import invalidate_serials
+
+# Most deals one bulk request may approve
+BULK_APPROVAL_LIMIT = 500
+
+# succeeded: deal ids that were processed; errors: {deal_id: message}
+ApprovalResult = namedtuple('ApprovalResult', ['succeeded', 'errors'])
+
+
+def parse_deal_ids(values):
+    """Distinct integer deal ids from form values, in submission order"""
+    deal_ids = []
+    for value in values:
+        try:
+            deal_id = int(value)
+        except (TypeError, ValueError):
+            continue
+        if deal_id not in deal_ids:
+            deal_ids.append(deal_id)
+    return deal_ids
+
+
+def _check_deals(deal_ids, expected_status):
+    """Split deal_ids into {deal_id: buyer_id} to process and {deal_id: error}"""
+    rows = db.session.execute(
+        select(Deal.id, Deal.status, Deal.buyer_id).where(Deal.id.in_(deal_ids))).all()
+    found = {row.id: row for row in rows}
+
+    buyers, errors = {}, {}
+    for deal_id in deal_ids:
+        row = found.get(deal_id)
+        if row is None:
+            errors[deal_id] = f'Deal #{deal_id} not found.'
+        elif row.status != expected_status:
+            errors[deal_id] = f'Deal #{deal_id} is {row.status}, not {expected_status}.'
+        else:
+            buyers[deal_id] = row.buyer_id
+    return buyers, errors
+
+
+def _load_items(buyers, errors):
+    """Products of the deals in buyers, dropping deals that share a product
+
+    A product can only change owner once per batch, so a deal whose product
+    was already claimed by an earlier deal in the batch is reported instead.
+    """
+    rows = db.session.execute(
+        select(DealItem.deal_id, Product.id, Product.user_id, Product.serial_number)
+        .join(Product, Product.id == DealItem.product_id)
+        .where(DealItem.deal_id.in_(list(buyers)))
+        .order_by(DealItem.deal_id, DealItem.id)).all()
+
+    items_by_deal = defaultdict(list)
+    for row in rows:
+        items_by_deal[row.deal_id].append(row)
+
+    claimed = {}
+    items = []
+    for deal_id in list(buyers):
+        deal_items = items_by_deal.get(deal_id, [])
+        clash = next((row for row in deal_items if row.id in claimed), None)
+        if clash is not None:
+            errors[deal_id] = (f'Product {clash.serial_number} is also in deal '
+                               f'#{claimed[clash.id]} in this batch.')
+            del buyers[deal_id]
+            continue
+        for row in deal_items:
+            claimed[row.id] = deal_id
+        items.extend(deal_items)
+    return items
+
+
+def _transfer_products(buyers, items, transfer_type='sale'):
+    """Move every item's product to its deal's buyer and record the history
+
+    Products already owned by the buyer are left alone. Returns the serial
+    numbers that changed owner.
+    """
+    now = datetime.utcnow()
+    moves = [(row, buyers[row.deal_id]) for row in items if row.user_id != buyers[row.deal_id]]
+    if not moves:
+        return []
+
+    products_by_buyer = defaultdict(list)
+    owner_deltas = defaultdict(int)
+    for row, buyer_id in moves:
+        products_by_buyer[buyer_id].append(row.id)
+        owner_deltas[row.user_id] -= 1
+        owner_deltas[buyer_id] += 1
+
+    db.session.execute(insert(OwnershipHistory), [{
+        'product_id': row.id,
+        'previous_owner_id': row.user_id,
+        'new_owner_id': buyer_id,
+        'deal_id': row.deal_id,
+        'transfer_date': now,
+        'transfer_type': transfer_type
+    } for row, buyer_id in moves])
+
+    for buyer_id, product_ids in products_by_buyer.items():
+        db.session.execute(
+            update(Product)
+            .where(Product.id.in_(product_ids))
+            .values(user_id=buyer_id, updated_at=now)
+            .execution_options(synchronize_session=False))
+
+    # These statements bypass the ORM flush, so keep the quota counts in step here
+    adjust_product_counts(db.session.connection(), owner_deltas)
+    return [row.serial_number for row, _ in moves]
+
+
+def _claim_deals(buyers, expected_status, deal_values):
+    """Move the deals in buyers out of expected_status; False if another request got there first
+
+    The status condition makes the UPDATE the point of no return: of two
+    requests processing the same deal only one matches the row.
+    """
+    result = db.session.execute(
+        update(Deal)
+        .where(Deal.id.in_(list(buyers)), Deal.status == expected_status)
+        .values(**deal_values)
+        .execution_options(synchronize_session=False))
+    return result.rowcount == len(buyers)
+
+
+def _run(deal_ids, expected_status, deal_values):
+    buyers, errors = _check_deals(deal_ids, expected_status)
+    serials = []
+    if buyers:
+        items = _load_items(buyers, errors)
+        try:
+            if _claim_deals(buyers, expected_status, deal_values):
+                serials = _transfer_products(buyers, items)
+                db.session.commit()
+            else:
+                db.session.rollback()
+                # Some deals changed status since they were checked; nothing in the batch was applied
+                _, changed = _check_deals(list(buyers), expected_status)
+                for deal_id in buyers:
+                    errors[deal_id] = (f'Deal #{deal_id} was already processed by another request.'
+                                       if deal_id in changed else
+                                       f'Deal #{deal_id} was not processed because another deal in the '
+                                       f'batch changed meanwhile; please try again.')
+                buyers = {}
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('Processing deals %s failed', list(buyers))
+            # One transaction: nothing in the batch was applied
+            for deal_id in buyers:
+                errors[deal_id] = f'Deal #{deal_id} could not be processed; please try again.'
+            buyers = {}
+            serials = []
+    # Owners changed behind the ORM's back; drop any cached verification records
+    if serials:
+        invalidate_serials(serials)
+    succeeded = [deal_id for deal_id in deal_ids if deal_id in buyers]
+    return ApprovalResult(succeeded, errors)
+
+
+def approve_deals(deal_ids, approver_id, notes=''):
+    """Approve pending deals and transfer their products to the buyers"""
+    return _run(deal_ids, 'pending', {
+        'status': 'approved',
+        'approved_by': approver_id,
+        'approved_at': datetime.utcnow(),
+        'approval_notes': notes
+    })
+
+
+def complete_deals(deal_ids):
+    """Complete approved deals, transferring any product not yet with its buyer"""
+    return _run(deal_ids, 'approved', {
+        'status': 'completed',
+        'completed_at': datetime.utcnow()
+    })
@@ -0,0 +1,168 @@
+"""
+Batch Deal Export
+Exports many deals at once, either as one combined statement PDF or as a
+ZIP of the individual deal documents.
+
+Deals are read in id-ordered chunks with the 'deal_document' loader preset,
+so each chunk costs two queries however many parties and products it has.
+The ZIP is assembled in a SpooledTemporaryFile from the documents the PDF
+worker pool renders (and caches) one chunk at a time, so memory stays flat
+whatever the number of deals; the caller streams the finished file. A
+combined PDF only keeps plain snapshots of the deals, not the loaded rows.
+
+Exports are rendered within the request, so DEAL_EXPORT_STATEMENT_LIMIT and
+DEAL_EXPORT_ZIP_LIMIT keep a cold export well inside the worker timeout.
+"""
+
+import os
+import zipfile
+from datetime import datetime, timedelta
+from tempfile import SpooledTemporaryFile
+
+from flask import current_app
+from sqlalchemy import or_
+
+from extensions import db
+from models import User, Deal
+from pdf_queue import deal_snapshot, render_documents, render_statement
+from query_options import with_loaders
+
+EXPORT_FORMATS = ('zip', 'pdf')
+
+# Deals loaded and rendered per batch
+CHUNK_SIZE = 100
+
+# Kept in memory up to this size, then spilled to disk
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'Invalid {name} "{value}"; use YYYY-MM-DD.')
+
+
+def parse_export_filters(args):
+    """Export filters from request arguments; raises ValueError with a user-facing message"""
+    filters = {}
+    if args.get('status'):
+        filters['status'] = args['status']
+    if args.get('date_from'):
+        filters['date_from'] = _parse_date(args['date_from'], 'start date')
+    if args.get('date_to'):
+        # Inclusive of the whole end day
+        filters['date_to'] = _parse_date(args['date_to'], 'end date') + timedelta(days=1)
+    if args.get('user'):
+        filters['user'] = args['user'].strip()
+    if args.get('deal_ids'):
+        try:
+            filters['deal_ids'] = [int(v) for v in args['deal_ids'].replace(' ', '').split(',') if v]
+        except ValueError:
+            raise ValueError('Deal ids must be a comma-separated list of numbers.')
+    return filters
+
+
+def export_query(filters):
+    """Deal query for the filters; user matches the buyer or registered seller username"""
+    query = Deal.query
+    if 'status' in filters:
+        query = query.filter(Deal.status == filters['status'])
+    if 'date_from' in filters:
+        query = query.filter(Deal.created_at >= filters['date_from'])
+    if 'date_to' in filters:
+        query = query.filter(Deal.created_at < filters['date_to'])
+    if 'user' in filters:
+        user_ids = db.session.query(User.id).filter(User.username == filters['user'])
+        query = query.filter(or_(Deal.buyer_id.in_(user_ids), Deal.seller_id.in_(user_ids)))
+    if 'deal_ids' in filters:
+        query = query.filter(Deal.id.in_(filters['deal_ids']))
+    return query
+
+
+def iter_deal_chunks(query, chunk_size=CHUNK_SIZE):
+    """Yield lists of fully loaded deals in id order, seeking by id between chunks"""
+    query = with_loaders(query, 'deal_document').order_by(Deal.id)
+    last_id = 0
+    while True:
+        chunk = query.filter(Deal.id > last_id).limit(chunk_size).all()
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1].id
+
+
+def _document_name(deal):
+    return f'deal_{deal.id}_{deal.created_at.strftime("%Y%m%d")}.pdf'
+
+
+def write_zip(query, output):
+    """Write a ZIP of per-deal PDFs to output; returns the number of deals"""
+    count = 0
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for chunk in iter_deal_chunks(query):
+            for deal, path in zip(chunk, render_documents(chunk)):
+                archive.write(path, arcname=_document_name(deal))
+                count += 1
+    return count
+
+
+def write_statement(query, output):
+    """Write one combined PDF for every deal to output; returns the number of deals"""
+    # Plain snapshots are taken chunk by chunk, so loaded deals can be freed as it goes
+    snapshots = [deal_snapshot(deal) for chunk in iter_deal_chunks(query) for deal in chunk]
+    if not snapshots:
+        return 0
+    path = render_statement(snapshots)
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(64 * 1024)
+                if not block:
+                    break
+                output.write(block)
+    finally:
+        os.remove(path)
+    return len(snapshots)
+
+
+def build_export(filters, export_format):
+    """Render the export into a spooled temporary file positioned at the start
+
+    Returns (file, download name, mimetype). Raises ValueError when the
+    request cannot be served (unknown format, nothing matched, too many deals).
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format "{export_format}".')
+
+    query = export_query(filters)
+    total = query.count()
+    if total == 0:
+        raise ValueError('No deals match the selected filters.')
+
+    if export_format == 'pdf':
+        limit = current_app.config['DEAL_EXPORT_STATEMENT_LIMIT']
+        if total > limit:
+            raise ValueError(f'{total} deals selected; a combined PDF is limited to {limit}. '
+                             'Narrow the filters or export a ZIP instead.')
+    else:
+        limit = current_app.config['DEAL_EXPORT_ZIP_LIMIT']
+        if total > limit:
+            raise ValueError(f'{total} deals selected; a ZIP export is limited to {limit}. '
+                             'Narrow the filters.')
+
+    output = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        if export_format == 'pdf':
+            write_statement(query, output)
+            mimetype = 'application/pdf'
+        else:
+            write_zip(query, output)
+            mimetype = 'application/zip'
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+
+    stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    return output, f'deals_{stamp}.{export_format}', mimetype
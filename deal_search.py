@@ -0,0 +1,55 @@
+"""
+Deal Search
+Builds the admin deal search as one SQL statement: every match path
+(buyer, seller, mobile numbers, serial numbers) is a semi-join predicate on
+the same deal row, so de-duplication and ranking happen in the database
+and only the requested page is returned. Substring matching goes through
+the search index in search.py.
+"""
+
+from sqlalchemy import case, or_, select
+
+from models import User, Product, Deal, DealItem
+from search import matching_ids
+
+
+def _exact_predicates(term):
+    """Exact matches on the same fields; all are unique or short columns"""
+    return [
+        Deal.buyer_id.in_(select(User.id).where(or_(User.username == term, User.mobile_number == term))),
+        Deal.seller_id.in_(select(User.id).where(User.username == term)),
+        Deal.seller_name == term,
+        Deal.seller_mobile == term,
+        Deal.id.in_(select(DealItem.deal_id).join(Product, Product.id == DealItem.product_id)
+                    .where(Product.serial_number == term))
+    ]
+
+
+def _substring_predicates(term):
+    """Substring matches, resolved through the search index
+
+    Each is an uncorrelated semi-join (IN subquery), so every lookup table is
+    searched once per statement rather than once per deal.
+    """
+    return [
+        # Buyer name or mobile number
+        Deal.buyer_id.in_(matching_ids('user', term, ('username', 'mobile_number'))),
+        # Registered seller name
+        Deal.seller_id.in_(matching_ids('user', term, ('username',))),
+        # Non-registered seller details stored on the deal
+        Deal.id.in_(matching_ids('deal', term)),
+        # Serial number of any product in the deal
+        Deal.id.in_(select(DealItem.deal_id).where(DealItem.product_id.in_(matching_ids('product', term))))
+    ]
+
+
+def search_deals(query, term):
+    """Restrict a Deal query to deals matching term
+
+    Returns (query, keys) where keys is the keyset ordering for
+    pagination.paginate(): exact matches first, then newest first.
+    """
+    rank = case((or_(*_exact_predicates(term)), 0), else_=1)
+    query = query.filter(or_(*_substring_predicates(term)))
+    keys = [(rank, False), (Deal.created_at, True), (Deal.id, True)]
+    return query, keys
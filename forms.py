@@ -1,8 +1,10 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import StringField, PasswordField, SelectField, TextAreaField, FloatField, SubmitField, BooleanField, HiddenField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError, NumberRange
 from wtforms.widgets import TextArea
 from models import User, Product, Category, Brand
+from reference_data import category_choices, brand_choices
 
 class LoginForm(FlaskForm):
     """Login form for both users and admins"""
@@ -74,9 +76,9 @@ class ProductRegistrationForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(ProductRegistrationForm, self).__init__(*args, **kwargs)
-        # Populate category and brand choices
-        self.category_id.choices = [(c.id, c.name) for c in Category.query.all()]
-        self.brand_id.choices = [(b.id, b.name) for b in Brand.query.all()]
+        # Populate category and brand choices from the reference data cache
+        self.category_id.choices = category_choices()
+        self.brand_id.choices = brand_choices()
     
     def validate_serial_number(self, serial_number):
         """Check if serial number is already registered"""
@@ -84,6 +86,12 @@ class ProductRegistrationForm(FlaskForm):
         if product:
             raise ValidationError('This serial number is already registered.')
 
+class ProductImportForm(FlaskForm):
+    """Bulk product registration from a CSV or XLSX file"""
+    file = FileField('Product File', validators=[
+        FileRequired(), FileAllowed(['csv', 'xlsx'], 'Upload a .csv or .xlsx file.')])
+    submit = SubmitField('Import Products')
+
 class CategoryForm(FlaskForm):
     """Form for adding/editing categories (Admin only)"""
     name = StringField('Category Name', validators=[DataRequired(), Length(min=2, max=50)])
@@ -0,0 +1,219 @@
+"""
+Request Instrumentation
+Counts and times the SQL each request issues.
+
+SQLAlchemy cursor events add every statement's duration to a per-request
+record started by Flask's request_started signal. When the request
+finishes the totals go out in one structured (JSON) log line on the
+'instrumentation' logger, a bounded in-memory ring buffer that the admin
+performance page aggregates into per-endpoint percentiles and, only with
+SERVER_TIMING on, a Server-Timing header. Statements slower than
+SLOW_QUERY_THRESHOLD_MS are logged as warnings with the endpoint that ran
+them.
+
+The logger is set to INSTRUMENTATION_LOG_LEVEL ('WARNING' keeps only the
+slow-query lines) and, unless logging is already configured, writes to
+stderr. With INSTRUMENTATION_LOG_LEVEL = None the logger is left to the
+deployment's own logging config.
+
+Streamed responses (the exports) are measured up to the first byte; queries
+run while the body streams are not included.
+"""
+
+import heapq
+import json
+import logging
+import threading
+import time
+from collections import deque, namedtuple, defaultdict
+
+from flask import current_app, g, has_request_context, request, request_started, request_finished
+from sqlalchemy import event
+
+from extensions import db
+
+logger = logging.getLogger('instrumentation')
+
+# Longest statement text kept in logs
+STATEMENT_PREVIEW = 500
+
+# One finished request, as kept in the ring buffer
+RequestSample = namedtuple('RequestSample', ['endpoint', 'status', 'total_ms', 'db_ms', 'queries'])
+
+
+def _preview(statement):
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= STATEMENT_PREVIEW else statement[:STATEMENT_PREVIEW] + '...'
+
+
+class RequestStats:
+    """SQL activity of the current request"""
+    __slots__ = ('started', 'queries', 'db_ms', 'slowest', '_keep')
+
+    def __init__(self, keep):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.slowest = []  # min-heap of (ms, sequence, statement)
+        self._keep = keep
+
+    def record(self, statement, elapsed_ms):
+        self.queries += 1
+        self.db_ms += elapsed_ms
+        entry = (elapsed_ms, self.queries, statement)
+        if len(self.slowest) < self._keep:
+            heapq.heappush(self.slowest, entry)
+        elif self._keep and elapsed_ms > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def slowest_statements(self):
+        """[(ms, statement)], slowest first"""
+        return [(ms, statement) for ms, _, statement in sorted(self.slowest, reverse=True)]
+
+
+class RequestLog:
+    """Ring buffer of the most recent RequestSamples"""
+
+    def __init__(self, size):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, sample):
+        with self._lock:
+            self._samples.append(sample)
+
+    def samples(self):
+        with self._lock:
+            return list(self._samples)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+# SQL timing
+
+_START_KEY = 'instrumentation_started'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info[_START_KEY].pop()
+    if not has_request_context():
+        return
+    stats = g.get('_request_stats')
+    if stats is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    stats.record(statement, elapsed_ms)
+
+    threshold = current_app.config.get('SLOW_QUERY_THRESHOLD_MS')
+    if threshold is not None and elapsed_ms >= threshold:
+        logger.warning(json.dumps({
+            'event': 'slow_query',
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'ms': round(elapsed_ms, 2),
+            'statement': _preview(statement)
+        }))
+
+
+def _handle_error(exception_context):
+    # The failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get(_START_KEY):
+        connection.info[_START_KEY].pop()
+
+
+# Request lifecycle
+
+def _start_request(sender, **extra):
+    g._request_stats = RequestStats(sender.config.get('SLOWEST_STATEMENTS_KEPT', 3))
+
+
+def _finish_request(sender, response, **extra):
+    stats = g.pop('_request_stats', None)
+    if stats is None:
+        return
+    total_ms = (time.perf_counter() - stats.started) * 1000
+    endpoint = request.endpoint or '<unmatched>'
+
+    if sender.config.get('SERVER_TIMING'):
+        response.headers.add('Server-Timing', f'db;dur={stats.db_ms:.1f};desc="{stats.queries} queries"')
+        response.headers.add('Server-Timing', f'app;dur={total_ms:.1f}')
+
+    sender.extensions['instrumentation'].add(
+        RequestSample(endpoint, response.status_code, total_ms, stats.db_ms, stats.queries))
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({
+            'event': 'request',
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'db_ms': round(stats.db_ms, 2),
+            'queries': stats.queries,
+            'slowest': [{'ms': round(ms, 2), 'statement': _preview(statement)}
+                        for ms, statement in stats.slowest_statements()]
+        }))
+
+
+def init_instrumentation(app):
+    """Hook SQL timing into app's engine and request lifecycle; call after db.init_app"""
+    app.extensions['instrumentation'] = RequestLog(app.config.get('REQUEST_STATS_BUFFER_SIZE', 5000))
+    level = app.config.get('INSTRUMENTATION_LOG_LEVEL', 'INFO')
+    if level is not None:
+        logger.setLevel(level)
+        if not logger.hasHandlers():
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+            logger.addHandler(handler)
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+    request_started.connect(_start_request, app)
+    request_finished.connect(_finish_request, app)
+
+
+# Aggregation for the admin page
+
+def _percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def endpoint_summary(samples):
+    """Per-endpoint latency percentiles, slowest p95 first"""
+    by_endpoint = defaultdict(list)
+    for sample in samples:
+        by_endpoint[sample.endpoint].append(sample)
+
+    summary = []
+    for endpoint, group in by_endpoint.items():
+        total = sorted(sample.total_ms for sample in group)
+        db_ms = sorted(sample.db_ms for sample in group)
+        queries = [sample.queries for sample in group]
+        summary.append({
+            'endpoint': endpoint,
+            'count': len(group),
+            'errors': sum(1 for sample in group if sample.status >= 500),
+            'p50_ms': round(_percentile(total, 50), 2),
+            'p95_ms': round(_percentile(total, 95), 2),
+            'p99_ms': round(_percentile(total, 99), 2),
+            'db_p95_ms': round(_percentile(db_ms, 95), 2),
+            'mean_queries': round(sum(queries) / len(queries), 1),
+            'max_queries': max(queries)
+        })
+    summary.sort(key=lambda row: row['p95_ms'], reverse=True)
+    return summary
+
+
+def request_log():
+    """The current app's RequestLog, or None when SQL_INSTRUMENTATION is off"""
+    return current_app.extensions.get('instrumentation')
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Write throughput load test
+Runs several worker processes against one database, the way gunicorn runs
+app:app, each committing deal-approval-shaped write transactions (product
+ownership change + ownership history + deal status) as fast as it can.
+Reports committed transactions per second and lock errors for the default
+SQLite settings ("baseline") and for the tuned profile from config.py.
+
+    python loadtest_writes.py --workers 4 --seconds 10
+    DATABASE_URL=postgresql://... python loadtest_writes.py --profiles tuned
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy.exc import OperationalError
+
+from benchmark_common import create_benchmark_app, seed_registry, seed_deals
+from config import database_url, engine_options, is_sqlite, sqlite_pragmas
+from extensions import db
+from models import Product, Deal, OwnershipHistory
+
+NUM_USERS = 50
+NUM_PRODUCTS = 2000
+
+# Settings SQLite runs with when nothing is configured
+BASELINE_PRAGMAS = {}
+
+
+def profile_config(profile, url):
+    if profile == 'baseline':
+        return {'SQLALCHEMY_ENGINE_OPTIONS': {}, 'SQLITE_PRAGMAS': BASELINE_PRAGMAS}
+    return {
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options(url),
+        'SQLITE_PRAGMAS': sqlite_pragmas() if is_sqlite(url) else {},
+    }
+
+
+def make_app(url, profile):
+    from app import create_app
+    config = {'SQLALCHEMY_DATABASE_URI': url, 'WTF_CSRF_ENABLED': False, 'TESTING': True}
+    config.update(profile_config(profile, url))
+    return create_app(config)
+
+
+def approve_one(worker, i):
+    """One deal-approval-shaped transaction"""
+    product = db.session.get(Product, (worker * 7919 + i) % NUM_PRODUCTS + 1)
+    deal = db.session.get(Deal, (worker * 104729 + i) % NUM_PRODUCTS + 1)
+    new_owner = (product.user_id % NUM_USERS) + 1
+    db.session.add(OwnershipHistory(
+        product_id=product.id, previous_owner_id=product.user_id,
+        new_owner_id=new_owner, deal_id=deal.id, transfer_type='sale'))
+    product.user_id = new_owner
+    deal.status = 'completed'
+    deal.completed_at = datetime.utcnow()
+    db.session.commit()
+
+
+def worker_main(worker, url, profile, seconds, start_at, results):
+    app = make_app(url, profile)
+    committed = locked = 0
+    latencies = []
+    with app.app_context():
+        # Start all workers together
+        time.sleep(max(0.0, start_at - time.time()))
+        deadline = time.time() + seconds
+        i = 0
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                approve_one(worker, i)
+                committed += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+            except OperationalError:
+                db.session.rollback()
+                locked += 1
+            i += 1
+    results.put({'committed': committed, 'locked': locked, 'latencies': latencies})
+
+
+def prepare_database(profile):
+    """Fresh database for one run; returns its URL"""
+    url = os.environ.get('DATABASE_URL')
+    if url:
+        url = database_url()
+        app = make_app(url, profile)
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+    else:
+        app, db_path = create_benchmark_app(**profile_config(profile, 'sqlite://'))
+        url = f'sqlite:///{db_path}'
+    with app.app_context():
+        seed_registry(NUM_USERS, NUM_PRODUCTS)
+        seed_deals(NUM_PRODUCTS, 1, NUM_USERS, NUM_PRODUCTS)
+        db.engine.dispose()
+    return url
+
+
+def run_profile(profile, workers, seconds):
+    url = prepare_database(profile)
+    results = multiprocessing.Queue()
+    start_at = time.time() + 2
+    processes = [multiprocessing.Process(target=worker_main,
+                                         args=(w, url, profile, seconds, start_at, results))
+                 for w in range(workers)]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = sorted(l for outcome in outcomes for l in outcome['latencies'])
+    committed = sum(outcome['committed'] for outcome in outcomes)
+    return {
+        'workers': workers,
+        'seconds': seconds,
+        'committed': committed,
+        'lock_errors': sum(outcome['locked'] for outcome in outcomes),
+        'commits_per_second': round(committed / seconds, 1),
+        'p50_ms': round(latencies[len(latencies) // 2], 3) if latencies else None,
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)], 3) if latencies else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=int, default=10)
+    parser.add_argument('--profiles', nargs='+', default=['baseline', 'tuned'],
+                        choices=['baseline', 'tuned'])
+    args = parser.parse_args()
+
+    report = {profile: run_profile(profile, args.workers, args.seconds) for profile in args.profiles}
+    print(json.dumps(report, indent=2))
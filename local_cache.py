@@ -0,0 +1,84 @@
+"""
+Local Caches
+The in-process caches behind verification.py (serial records), principal.py
+(logged-in users) and reference_data.py (category and brand lists).
+
+A VersionedCache is a bounded LRU whose entries expire after a TTL and
+belong to one version stamp (see version_stamp.py): a reader passes the
+stamp it just read, and a different stamp empties the cache, so a commit
+in any worker process invalidates every other process on its next read.
+
+Caches are kept per SQLAlchemy engine (EngineCaches). Tests and scripts
+bind several apps to different databases in one process, and sqlite://
+in-memory databases share a URL, so keying by anything coarser would let
+one app serve another's rows.
+"""
+
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from extensions import db
+
+
+class VersionedCache:
+    """Bounded LRU of key -> (expires_at, value), valid for one version stamp"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+
+    def get(self, key, version):
+        """(True, value) for a live entry, else (False, None)"""
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+                return False, None
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, version, ttl=None, max_size=None):
+        """Store value, unless the stamp changed since version was read; ttl None never expires"""
+        with self._lock:
+            if version != self._version:
+                return  # read before a change another request has already seen
+            self._entries[key] = (time.monotonic() + ttl if ttl is not None else None, value)
+            self._entries.move_to_end(key)
+            while max_size is not None and len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class EngineCaches:
+    """One VersionedCache per engine, created on first use"""
+
+    def __init__(self):
+        self._caches = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The cache of the current app's engine"""
+        engine = db.engine
+        with self._lock:
+            cache = self._caches.get(engine)
+            if cache is None:
+                cache = self._caches[engine] = VersionedCache()
+            return cache
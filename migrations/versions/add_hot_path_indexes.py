@@ -0,0 +1,60 @@
+"""Add indexes for history, deal and product access paths
+
+Revision ID: add_hot_path_indexes
+Revises: add_user_product_count
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_hot_path_indexes'
+down_revision = 'add_user_product_count'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ownership_history', schema=None) as batch_op:
+        batch_op.create_index('ix_ownership_history_product_id_transfer_date', ['product_id', 'transfer_date'], unique=False)
+
+    with op.batch_alter_table('product_status_history', schema=None) as batch_op:
+        batch_op.create_index('ix_product_status_history_product_id_changed_at', ['product_id', 'changed_at'], unique=False)
+        batch_op.create_index('ix_product_status_history_product_id_old_status', ['product_id', 'old_status'], unique=False)
+
+    with op.batch_alter_table('deal', schema=None) as batch_op:
+        batch_op.create_index('ix_deal_status_created_at', ['status', 'created_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_deal_buyer_id'), ['buyer_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_deal_seller_id'), ['seller_id'], unique=False)
+
+    with op.batch_alter_table('deal_item', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_deal_item_deal_id'), ['deal_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_deal_item_product_id'), ['product_id'], unique=False)
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index('ix_product_status_created_at', ['status', 'created_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_product_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_product_user_id'))
+        batch_op.drop_index('ix_product_status_created_at')
+
+    with op.batch_alter_table('deal_item', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_deal_item_product_id'))
+        batch_op.drop_index(batch_op.f('ix_deal_item_deal_id'))
+
+    with op.batch_alter_table('deal', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_deal_seller_id'))
+        batch_op.drop_index(batch_op.f('ix_deal_buyer_id'))
+        batch_op.drop_index('ix_deal_status_created_at')
+
+    with op.batch_alter_table('product_status_history', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_status_history_product_id_old_status')
+        batch_op.drop_index('ix_product_status_history_product_id_changed_at')
+
+    with op.batch_alter_table('ownership_history', schema=None) as batch_op:
+        batch_op.drop_index('ix_ownership_history_product_id_transfer_date')
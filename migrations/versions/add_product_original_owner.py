@@ -0,0 +1,67 @@
+"""Add original_owner_id to Product
+
+Revision ID: add_product_original_owner
+Revises: add_hot_path_indexes
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_product_original_owner'
+down_revision = 'add_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+
+# The search index's FTS sync triggers on product (see add_search_index);
+# a table rebuild on SQLite drops them
+FTS_TRIGGERS = (
+    'CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON "product" BEGIN '
+    'INSERT INTO product_fts(rowid, serial_number) VALUES (new.id, new.serial_number); END',
+    'CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON "product" BEGIN '
+    "INSERT INTO product_fts(product_fts, rowid, serial_number) VALUES ('delete', old.id, old.serial_number); END",
+    'CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF serial_number ON "product" BEGIN '
+    "INSERT INTO product_fts(product_fts, rowid, serial_number) VALUES ('delete', old.id, old.serial_number); "
+    'INSERT INTO product_fts(rowid, serial_number) VALUES (new.id, new.serial_number); END',
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        # ADD COLUMN with an inline REFERENCES needs no table rebuild, which
+        # would drop the product FTS triggers
+        op.execute('ALTER TABLE product ADD COLUMN original_owner_id INTEGER '
+                   'CONSTRAINT fk_product_original_owner_id_user REFERENCES "user" (id)')
+    else:
+        op.add_column('product', sa.Column('original_owner_id', sa.Integer(), nullable=True))
+        op.create_foreign_key('fk_product_original_owner_id_user', 'product', 'user',
+                              ['original_owner_id'], ['id'])
+
+    # Backfill with the rule Product.get_original_owner_id() applied: the
+    # previous owner on the earliest transfer, else the current owner
+    op.execute("""
+        UPDATE product SET original_owner_id = COALESCE((
+            SELECT ownership_history.previous_owner_id FROM ownership_history
+            WHERE ownership_history.product_id = product.id
+            ORDER BY ownership_history.transfer_date ASC, ownership_history.id ASC
+            LIMIT 1
+        ), product.user_id)
+    """)
+
+
+def downgrade():
+    connection = op.get_bind()
+    if connection.dialect.name == 'sqlite':
+        # The column (and its inline constraint) only goes with a table rebuild
+        with op.batch_alter_table('product', schema=None) as batch_op:
+            batch_op.drop_column('original_owner_id')
+        if 'product_fts' in sa.inspect(connection).get_table_names():
+            for statement in FTS_TRIGGERS:
+                op.execute(statement)
+            op.execute("INSERT INTO product_fts(product_fts) VALUES ('rebuild')")
+    else:
+        op.drop_constraint('fk_product_original_owner_id_user', 'product', type_='foreignkey')
+        op.drop_column('product', 'original_owner_id')
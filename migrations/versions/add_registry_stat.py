@@ -0,0 +1,41 @@
+"""Add registry_stat counters table
+
+Revision ID: add_registry_stat
+Revises: add_search_index
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_registry_stat'
+down_revision = 'add_search_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('registry_stat',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    # Seed the counters from the existing rows
+    op.execute("""
+        INSERT INTO registry_stat (name, value, updated_at)
+        SELECT 'total_users', COUNT(*), CURRENT_TIMESTAMP FROM "user" WHERE is_admin = false
+        UNION ALL
+        SELECT 'total_products', COUNT(*), CURRENT_TIMESTAMP FROM product
+        UNION ALL
+        SELECT 'total_deals', COUNT(*), CURRENT_TIMESTAMP FROM deal
+        UNION ALL
+        SELECT 'stolen_products', COUNT(*), CURRENT_TIMESTAMP FROM product WHERE status = 'stolen'
+    """)
+
+
+def downgrade():
+    op.drop_table('registry_stat')
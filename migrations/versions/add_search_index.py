@@ -0,0 +1,70 @@
+"""Add search index for products, users and deals
+
+Revision ID: add_search_index
+Revises: 7c013343df29
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_search_index'
+down_revision = '7c013343df29'
+branch_labels = None
+depends_on = None
+
+# Kept local so the migration does not change if search.py does
+SEARCH_FIELDS = {
+    'product': ('serial_number',),
+    'user': ('username', 'mobile_number', 'id_card_number', 'shop_name', 'email'),
+    'deal': ('seller_name', 'seller_mobile'),
+}
+
+
+def upgrade():
+    connection = op.get_bind()
+    dialect = connection.dialect.name
+
+    if dialect == 'sqlite':
+        for source, fields in SEARCH_FIELDS.items():
+            fts = f'{source}_fts'
+            cols = ', '.join(fields)
+            new_values = ', '.join(f'new.{f}' for f in fields)
+            old_values = ', '.join(f'old.{f}' for f in fields)
+            op.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                       f"{cols}, content='{source}', content_rowid='id', tokenize='trigram')")
+            op.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON "{source}" BEGIN '
+                       f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END')
+            op.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON "{source}" BEGIN '
+                       f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END")
+            op.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON "{source}" BEGIN '
+                       f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+                       f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END')
+            # Index the rows that already exist
+            op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    elif dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for source, fields in SEARCH_FIELDS.items():
+            for field in fields:
+                op.execute(f'CREATE INDEX IF NOT EXISTS ix_{source}_{field}_trgm '
+                           f'ON "{source}" USING gin ({field} gin_trgm_ops)')
+
+
+def downgrade():
+    connection = op.get_bind()
+    dialect = connection.dialect.name
+
+    if dialect == 'sqlite':
+        for source in SEARCH_FIELDS:
+            fts = f'{source}_fts'
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+            op.execute(f'DROP TABLE IF EXISTS {fts}')
+
+    elif dialect == 'postgresql':
+        for source, fields in SEARCH_FIELDS.items():
+            for field in fields:
+                op.execute(f'DROP INDEX IF EXISTS ix_{source}_{field}_trgm')
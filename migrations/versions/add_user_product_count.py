@@ -0,0 +1,59 @@
+"""Add product_count to User
+
+Revision ID: add_user_product_count
+Revises: add_registry_stat
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_user_product_count'
+down_revision = 'add_registry_stat'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('product_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from the products each user currently owns
+    op.execute("""
+        UPDATE "user" SET product_count = (
+            SELECT COUNT(*) FROM product WHERE product.user_id = "user".id
+        )
+    """)
+
+
+# The search index's FTS sync triggers on user (see add_search_index);
+# the table rebuild that drops the column on SQLite drops them too
+FTS_FIELDS = ('username', 'mobile_number', 'id_card_number', 'shop_name', 'email')
+
+
+def _fts_triggers():
+    cols = ', '.join(FTS_FIELDS)
+    new_values = ', '.join(f'new.{f}' for f in FTS_FIELDS)
+    old_values = ', '.join(f'old.{f}' for f in FTS_FIELDS)
+    return (
+        f'CREATE TRIGGER IF NOT EXISTS user_fts_ai AFTER INSERT ON "user" BEGIN '
+        f'INSERT INTO user_fts(rowid, {cols}) VALUES (new.id, {new_values}); END',
+        f'CREATE TRIGGER IF NOT EXISTS user_fts_ad AFTER DELETE ON "user" BEGIN '
+        f"INSERT INTO user_fts(user_fts, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END",
+        f'CREATE TRIGGER IF NOT EXISTS user_fts_au AFTER UPDATE OF {cols} ON "user" BEGIN '
+        f"INSERT INTO user_fts(user_fts, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+        f'INSERT INTO user_fts(rowid, {cols}) VALUES (new.id, {new_values}); END',
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('product_count')
+
+    connection = op.get_bind()
+    if connection.dialect.name == 'sqlite' and 'user_fts' in sa.inspect(connection).get_table_names():
+        for statement in _fts_triggers():
+            op.execute(statement)
+        op.execute("INSERT INTO user_fts(user_fts) VALUES ('rebuild')")
@@ -1,10 +1,11 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 from flask import current_app
 import pytz
 
+import password_policy
+
 # Import db and login_manager from the extensions
 from extensions import db, login_manager
 
@@ -23,7 +24,29 @@ def utc_to_pakistan(utc_dt):
         utc_dt = pytz.utc.localize(utc_dt)
     return utc_dt.astimezone(PAKISTAN_TZ).strftime('%d-%m-%Y %I:%M %p')
 
-class User(UserMixin, db.Model):
+class ProductQuotaMixin:
+    """Registration quota rules, shared by User and the cached session Principal"""
+    __slots__ = ()
+    
+    def can_register_product(self):
+        """Check if user can register more products
+        Regular users: 3 free, unlimited with subscription
+        Shopkeepers: 25 free, unlimited with subscription (must be approved)
+        """
+        remaining = self.remaining_product_quota()
+        return remaining is None or remaining > 0
+    
+    def remaining_product_quota(self):
+        """Number of products the user may still register, None when unlimited"""
+        if self.is_shopkeeper and not self.shopkeeper_approved:
+            return 0  # Unapproved shopkeepers cannot register products
+        if self.has_subscription:
+            return None
+        
+        limit = 25 if self.is_shopkeeper else 3
+        return max(0, limit - (self.product_count or 0))
+
+class User(ProductQuotaMixin, UserMixin, db.Model):
     """User model for regular users, shopkeepers, and admins"""
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -40,32 +63,27 @@ class User(UserMixin, db.Model):
     reset_token = db.Column(db.String(100), nullable=True)
     reset_token_expiry = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    product_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Maintained in counters.py
     
     # Relationships
-    products = db.relationship('Product', backref='owner', lazy=True)
+    products = db.relationship('Product', foreign_keys='Product.user_id', backref='owner', lazy=True)
     deals_as_buyer = db.relationship('Deal', foreign_keys='Deal.buyer_id', backref='buyer', lazy=True)
     deals_as_seller = db.relationship('Deal', foreign_keys='Deal.seller_id', backref='seller', lazy=True)
     
     def set_password(self, password):
         """Set password hash"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_policy.hash_password(password)
     
     def check_password(self, password):
-        """Check password against hash"""
-        return check_password_hash(self.password_hash, password)
-    
-    def can_register_product(self):
-        """Check if user can register more products
-        Regular users: 3 free, unlimited with subscription
-        Shopkeepers: 25 free, unlimited with subscription (must be approved)
+        """Check password against hash
+        A correct password stored under another hashing policy is rehashed;
+        the caller commits the change.
         """
-        if self.is_shopkeeper and not self.shopkeeper_approved:
-            return False  # Unapproved shopkeepers cannot register products
-            
-        product_count = Product.query.filter_by(user_id=self.id).count()
-        if self.is_shopkeeper:
-            return product_count < 25 or self.has_subscription
-        return product_count < 3 or self.has_subscription
+        if not password_policy.check_password(self.password_hash, password):
+            return False
+        if password_policy.needs_rehash(self.password_hash):
+            self.password_hash = password_policy.hash_password(password)
+        return True
     
     def can_sell_products(self):
         """Check if user can create deals to sell products
@@ -114,7 +132,9 @@ class User(UserMixin, db.Model):
 # User loader for Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # A cached Principal rather than the full row (see principal.py)
+    from principal import load_principal
+    return load_principal(user_id)
 
 class Category(db.Model):
     """Product categories (Camera, Lens, Light, etc.)"""
@@ -144,6 +164,9 @@ class Brand(db.Model):
 
 class Product(db.Model):
     """Registered products"""
+    __table_args__ = (
+        db.Index('ix_product_status_created_at', 'status', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     serial_number = db.Column(db.String(100), unique=True, nullable=False)
@@ -152,9 +175,12 @@ class Product(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Foreign Keys
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     brand_id = db.Column(db.Integer, db.ForeignKey('brand.id'), nullable=False)
+    # Who first registered the product; set from user_id on insert and never changed by transfers
+    original_owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True,
+                                  default=lambda context: context.get_current_parameters()['user_id'])
     
     # Relationships
     status_history = db.relationship('ProductStatusHistory', backref='product', lazy=True)
@@ -178,20 +204,25 @@ class Product(db.Model):
     
     def can_be_sold(self):
         """Check if this product can be sold based on business logic"""
-        if self.status != 'for_sale':
-            return False
-        
         # Get the product owner
         owner = User.query.get(self.user_id)
         if not owner:
             return False
         
+        return Product.is_sellable(self.status, owner.is_shopkeeper, self.created_at)
+    
+    @staticmethod
+    def is_sellable(status, owner_is_shopkeeper, created_at):
+        """Sale eligibility rule shared by can_be_sold() and the verification lookups"""
+        if status != 'for_sale':
+            return False
+        
         # Shopkeepers can sell immediately
-        if owner.is_shopkeeper:
+        if owner_is_shopkeeper:
             return True
         
         # Regular users must wait 3 days after product registration
-        days_since_registration = (datetime.utcnow() - self.created_at).days
+        days_since_registration = (datetime.utcnow() - created_at).days
         return days_since_registration >= 3
     
     def transfer_ownership(self, new_owner_id, deal_id, transfer_type='sale'):
@@ -212,8 +243,10 @@ class Product(db.Model):
     
     def get_original_owner_id(self):
         """Get the original owner ID of the product (who first registered it)
-        If no ownership history exists, the current owner is the original owner
+        Stored at registration; products the backfill missed fall back to the ownership history
         """
+        if self.original_owner_id is not None:
+            return self.original_owner_id
         first_ownership = OwnershipHistory.query.filter_by(product_id=self.id).order_by(OwnershipHistory.transfer_date.asc()).first()
         if first_ownership and first_ownership.previous_owner_id:
             return first_ownership.previous_owner_id
@@ -243,6 +276,10 @@ class Product(db.Model):
 
 class ProductStatusHistory(db.Model):
     """Track status changes of products"""
+    __table_args__ = (
+        db.Index('ix_product_status_history_product_id_changed_at', 'product_id', 'changed_at'),
+        db.Index('ix_product_status_history_product_id_old_status', 'product_id', 'old_status'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     old_status = db.Column(db.String(20))
@@ -258,6 +295,9 @@ class ProductStatusHistory(db.Model):
 
 class OwnershipHistory(db.Model):
     """Track ownership transfers of products"""
+    __table_args__ = (
+        db.Index('ix_ownership_history_product_id_transfer_date', 'product_id', 'transfer_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     previous_owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
@@ -307,6 +347,9 @@ class OwnershipHistory(db.Model):
 
 class Deal(db.Model):
     """Deals between users"""
+    __table_args__ = (
+        db.Index('ix_deal_status_created_at', 'status', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected, completed, cancelled
     total_amount = db.Column(db.Float, default=0.0)
@@ -328,8 +371,8 @@ class Deal(db.Model):
     completed_at = db.Column(db.DateTime)
     
     # Foreign Keys
-    buyer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    seller_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Nullable for non-registered sellers
+    buyer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    seller_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)  # Nullable for non-registered sellers
     
     # Relationships
     deal_items = db.relationship('DealItem', backref='deal', lazy=True)
@@ -343,8 +386,18 @@ class DealItem(db.Model):
     price = db.Column(db.Float, nullable=False)
     
     # Foreign Keys
-    deal_id = db.Column(db.Integer, db.ForeignKey('deal.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    deal_id = db.Column(db.Integer, db.ForeignKey('deal.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
     
     def __repr__(self):
         return f'<DealItem {self.product.name}: ${self.price}>'
+
+class RegistryStat(db.Model):
+    """Named registry-wide counters maintained incrementally (see counters.py)"""
+    __tablename__ = 'registry_stat'
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<RegistryStat {self.name}={self.value}>'
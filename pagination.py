@@ -0,0 +1,193 @@
+"""
+Keyset Pagination
+Seek-based paging for admin listings. Pages are ordered by (created_at, id)
+newest first by default and addressed with opaque cursors carried in the
+URL, so the database never has to skip over or return more than one page
+of rows.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from flask import request, url_for
+from sqlalchemy import and_, or_
+
+from extensions import db
+
+DEFAULT_PER_PAGE = 25
+MAX_PER_PAGE = 100
+
+
+def encode_cursor(values):
+    """Serialize key values into an opaque URL-safe token"""
+    payload = [['d', v.isoformat()] if isinstance(v, datetime) else ['v', v] for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor(); returns None for a missing or malformed token"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        return [datetime.fromisoformat(v) if tag == 'd' else v for tag, v in json.loads(raw)]
+    except (ValueError, TypeError):
+        return None
+
+
+def seek_condition(keys, values, forward=True):
+    """WHERE clause selecting rows strictly after (forward) or before the given key values
+
+    keys is a list of (column, descending) pairs matching the ORDER BY.
+    """
+    clauses = []
+    for i, (column, descending) in enumerate(keys):
+        equal_prefix = [k == v for (k, _), v in zip(keys[:i], values[:i])]
+        if descending == forward:
+            clauses.append(and_(*equal_prefix, column < values[i]))
+        else:
+            clauses.append(and_(*equal_prefix, column > values[i]))
+    return or_(*clauses)
+
+
+def order_clauses(keys, forward=True):
+    """ORDER BY clauses for the keys, reversed when walking backwards"""
+    return [column.desc() if descending == forward else column.asc()
+            for column, descending in keys]
+
+
+def default_keys(model):
+    """Newest first on (created_at, id)"""
+    return [(model.created_at, True), (model.id, True)]
+
+
+def clamp_per_page(per_page):
+    try:
+        per_page = int(per_page)
+    except (TypeError, ValueError):
+        return DEFAULT_PER_PAGE
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+class KeysetPage:
+    """One page of results plus the cursors needed to move either way"""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, prefix=''):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.prefix = prefix
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def url(self, direction):
+        """URL of the adjacent page for the current request, keeping other query args"""
+        cursor = self.next_cursor if direction == 'next' else self.prev_cursor
+        if cursor is None:
+            return None
+        args = request.args.to_dict(flat=False)
+        args[self.prefix + 'cursor'] = cursor
+        args[self.prefix + 'dir'] = direction
+        args.pop(self.prefix + 'per_page', None)
+        if self.per_page != DEFAULT_PER_PAGE:
+            args[self.prefix + 'per_page'] = self.per_page
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+    @property
+    def next_url(self):
+        return self.url('next')
+
+    @property
+    def prev_url(self):
+        return self.url('prev')
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _keyset_page(fetch, keys, cursor, direction, per_page, prefix):
+    """Shared paging logic; fetch(condition, order_by, limit) returns [(item, key values)]"""
+    per_page = clamp_per_page(per_page)
+    values = decode_cursor(cursor) if cursor else None
+    if values is not None and len(values) != len(keys):
+        values = None
+    # Without a valid cursor there is nothing to walk back from
+    forward = direction != 'prev' or values is None
+
+    condition = seek_condition(keys, values, forward) if values is not None else None
+    rows = fetch(condition, order_clauses(keys, forward), per_page + 1)
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    items = [item for item, _ in rows]
+    first_key = list(rows[0][1]) if rows else None
+    last_key = list(rows[-1][1]) if rows else None
+
+    if forward:
+        next_cursor = encode_cursor(last_key) if has_more else None
+        prev_cursor = encode_cursor(first_key) if values is not None and rows else None
+    else:
+        next_cursor = encode_cursor(last_key) if rows else None
+        prev_cursor = encode_cursor(first_key) if has_more else None
+
+    return KeysetPage(items, per_page, next_cursor, prev_cursor, prefix)
+
+
+def paginate(query, keys=None, cursor=None, direction='next', per_page=DEFAULT_PER_PAGE, prefix=''):
+    """Fetch one keyset page from an ORM query
+
+    keys defaults to (created_at, id) descending on the query's primary entity.
+    cursor is a token from a previous page; direction is 'next' or 'prev'.
+    """
+    if keys is None:
+        keys = default_keys(query.column_descriptions[0]['entity'])
+    query = query.add_columns(*[column for column, _ in keys]).order_by(None)
+
+    def fetch(condition, order_by, limit):
+        page_query = query if condition is None else query.filter(condition)
+        return [(row[0], row[1:]) for row in page_query.order_by(*order_by).limit(limit).all()]
+
+    return _keyset_page(fetch, keys, cursor, direction, per_page, prefix)
+
+
+def paginate_select(stmt, keys, cursor=None, direction='next', per_page=DEFAULT_PER_PAGE, prefix=''):
+    """Fetch one keyset page of result rows from a Core SELECT, e.g. a UNION subquery
+
+    keys are (column, descending) pairs on columns of stmt itself, read back by name.
+    """
+    def fetch(condition, order_by, limit):
+        page_stmt = stmt if condition is None else stmt.where(condition)
+        rows = db.session.execute(page_stmt.order_by(*order_by).limit(limit)).all()
+        return [(row, [row._mapping[column.key] for column, _ in keys]) for row in rows]
+
+    return _keyset_page(fetch, keys, cursor, direction, per_page, prefix)
+
+
+def request_page_args(prefix=''):
+    """cursor, direction, per_page and prefix for paginate() from the current request"""
+    return {
+        'cursor': request.args.get(prefix + 'cursor'),
+        'direction': request.args.get(prefix + 'dir', 'next'),
+        'per_page': request.args.get(prefix + 'per_page', DEFAULT_PER_PAGE),
+        'prefix': prefix
+    }
+
+
+def paginate_request(query, keys=None, prefix=''):
+    """paginate() driven by the cursor, dir and per_page arguments of the current request"""
+    return paginate(query, keys=keys, **request_page_args(prefix))
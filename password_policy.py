@@ -0,0 +1,82 @@
+"""
+Password Hashing Policy
+Hashes and checks passwords with the algorithm and cost configured in
+PASSWORD_HASH_METHOD (any werkzeug method string, e.g.
+'pbkdf2:sha256:600000' or 'scrypt:32768:8:1').
+
+The hashing itself runs on a small thread pool per app, kept in
+app.extensions and sized by PASSWORD_HASH_WORKERS: hashlib releases the
+GIL while it works, so a login burst uses at most that many cores per
+worker process and the rest queue instead of starving other requests. A
+request that cannot get a turn within PASSWORD_HASH_TIMEOUT seconds gets
+PasswordHashingBusy.
+
+A stored hash made with another method is replaced on the next successful
+login, so changing the policy (up or down) takes effect as users sign in.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from functools import lru_cache
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'  # werkzeug's own default
+DEFAULT_SALT_LENGTH = 16
+
+_executor_lock = threading.Lock()
+
+
+class PasswordHashingBusy(RuntimeError):
+    """Every hashing worker stayed busy for longer than PASSWORD_HASH_TIMEOUT"""
+
+
+def _get_executor():
+    app = current_app._get_current_object()
+    with _executor_lock:
+        executor = app.extensions.get('password_hashing')
+        if executor is None:
+            executor = app.extensions['password_hashing'] = ThreadPoolExecutor(
+                max_workers=app.config.get('PASSWORD_HASH_WORKERS', 2), thread_name_prefix='password-hash')
+        return executor
+
+
+def _run(func, *args):
+    future = _get_executor().submit(func, *args)
+    try:
+        return future.result(timeout=current_app.config.get('PASSWORD_HASH_TIMEOUT', 10))
+    except TimeoutError:
+        future.cancel()
+        raise PasswordHashingBusy('Too many password checks at once; please try again in a moment.')
+
+
+def current_method():
+    """The configured werkzeug method string"""
+    return current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+
+
+@lru_cache(maxsize=16)
+def _method_prefix(method):
+    """The prefix a hash made with method starts with, e.g. 'pbkdf2:sha256:600000'"""
+    name = method.split(':', 1)[0]
+    if (name == 'pbkdf2' and method.count(':') == 2) or (name == 'scrypt' and method.count(':') == 3):
+        return method
+    # Parameters left to werkzeug's defaults: hash once to learn them
+    return generate_password_hash('', method, salt_length=1).split('$', 1)[0]
+
+
+def hash_password(password):
+    """Hash password with the configured policy"""
+    return _run(generate_password_hash, password, current_method(),
+                current_app.config.get('PASSWORD_SALT_LENGTH', DEFAULT_SALT_LENGTH))
+
+
+def check_password(pwhash, password):
+    """True if password matches pwhash"""
+    return _run(check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash):
+    """True if pwhash was made with a method other than the configured one"""
+    return pwhash.split('$', 1)[0] != _method_prefix(current_method())
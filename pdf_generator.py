@@ -1,3 +1,5 @@
+import importlib.util
+import threading
 from flask import render_template
 from io import BytesIO
 from datetime import datetime
@@ -24,67 +26,208 @@ def generate_deal_pdf(deal):
         # Fallback to ReportLab if WeasyPrint is not available
         return generate_deal_pdf_reportlab(deal)
 
+def weasyprint_available():
+    """True when WeasyPrint can be imported (checked once per process)"""
+    global _weasyprint_available
+    if _weasyprint_available is None:
+        _weasyprint_available = importlib.util.find_spec('weasyprint') is not None
+    return _weasyprint_available
+
+_weasyprint_available = None
+
+def render_deal_pdf(deal, html=None):
+    """Generate the PDF without touching Flask or the database
+
+    Used by the pdf_queue worker processes. html is the already rendered
+    deal_pdf.html template; when it is missing or WeasyPrint is not
+    installed the ReportLab layout is built from deal, which may be a
+    pdf_queue snapshot.
+    """
+    if html is not None:
+        try:
+            from weasyprint import HTML
+            buffer = BytesIO()
+            HTML(string=html).write_pdf(buffer)
+            return buffer.getvalue()
+        except ImportError:
+            pass
+    return generate_deal_pdf_reportlab(deal)
+
+class _RenderContext:
+    """ReportLab objects shared by every deal document: styles, table styles
+    and the page template. Built once per thread on first use."""
+
+    def __init__(self):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import (BaseDocTemplate, PageTemplate, Frame, Table,
+                                        TableStyle, Paragraph, Spacer, PageBreak)
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import inch
+        from reportlab.lib import colors
+
+        self.BaseDocTemplate = BaseDocTemplate
+        self.Table = Table
+        self.Paragraph = Paragraph
+        self.Spacer = Spacer
+        self.PageBreak = PageBreak
+        self.inch = inch
+
+        self.pagesize = A4
+        self.margins = dict(rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=36)
+        # Same frame SimpleDocTemplate would build for these margins
+        width = A4[0] - self.margins['leftMargin'] - self.margins['rightMargin']
+        height = A4[1] - self.margins['topMargin'] - self.margins['bottomMargin']
+        self.page_template = PageTemplate(id='Deal', pagesize=A4, frames=[
+            Frame(self.margins['leftMargin'], self.margins['bottomMargin'], width, height, id='normal')])
+
+        styles = getSampleStyleSheet()
+        label_background = colors.Color(0.969, 0.976, 0.980)
+        grid_color = colors.Color(0.871, 0.886, 0.902)
+
+        # Paragraph styles
+        self.title_style = ParagraphStyle(
+            'Title',
+            parent=styles['Heading1'],
+            fontSize=18,
+            spaceAfter=10,
+            alignment=1,
+            textColor=colors.Color(0.051, 0.431, 0.992)  # Bootstrap primary blue
+        )
+        self.date_style = ParagraphStyle(
+            'Date',
+            parent=styles['Normal'],
+            fontSize=12,
+            alignment=2,  # Right alignment
+            textColor=colors.grey
+        )
+        self.section_style = ParagraphStyle(
+            'SectionTitle',
+            parent=styles['Heading2'],
+            fontSize=14,
+            spaceAfter=8,
+            textColor=colors.Color(0.286, 0.333, 0.341)
+        )
+        self.description_style = ParagraphStyle(
+            'Description',
+            parent=styles['Normal'],
+            fontSize=11,
+            spaceAfter=15,
+            leftIndent=20,
+            fontName='Helvetica-Oblique'
+        )
+        self.footer_style = ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=10,
+            alignment=1,
+            textColor=colors.Color(0.424, 0.467, 0.514)
+        )
+
+        # Table styles
+        self.header_table_style = TableStyle([
+            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 20),
+        ])
+        # Two-column label/value tables (deal and approval information)
+        self.info_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), label_background),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('PADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 1, grid_color)
+        ])
+        self.parties_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), label_background),
+            ('BACKGROUND', (2, 0), (2, -1), label_background),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('PADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 1, grid_color)
+        ])
+        self.products_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.286, 0.333, 0.341)),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+            ('FONTSIZE', (0, 1), (-1, -1), 10),
+            ('PADDING', (0, 0), (-1, -1), 8),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.Color(0.980, 0.984, 0.988)),
+            ('GRID', (0, 0), (-1, -1), 1, grid_color)
+        ])
+
+    def new_document(self, buffer):
+        """Document writing to buffer, laid out with the shared page template"""
+        return self.BaseDocTemplate(buffer, pagesize=self.pagesize,
+                                    pageTemplates=[self.page_template], **self.margins)
+
+# Page templates keep per-build frame state, so each thread gets its own context
+_render_local = threading.local()
+
+def _render_context():
+    context = getattr(_render_local, 'context', None)
+    if context is None:
+        context = _render_local.context = _RenderContext()
+    return context
+
 def generate_deal_pdf_reportlab(deal):
     """Fallback PDF generation using ReportLab with updated layout (no prices)"""
-    from reportlab.lib.pagesizes import A4
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.lib import colors
+    ctx = _render_context()
     
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4,
-                          rightMargin=72, leftMargin=72,
-                          topMargin=72, bottomMargin=36)
+    doc = ctx.new_document(buffer)
+    
+    # Build PDF
+    doc.build(_deal_elements(ctx, deal))
+    
+    pdf_data = buffer.getvalue()
+    buffer.close()
+    return pdf_data
+
+def generate_deals_pdf_reportlab(deals, output):
+    """One combined document for several deals, each starting on a new page
+
+    Written to the file object output; used for batch statement exports.
+    """
+    ctx = _render_context()
+    doc = ctx.new_document(output)
+    
+    elements = []
+    for i, deal in enumerate(deals):
+        if i:
+            elements.append(ctx.PageBreak())
+        elements.extend(_deal_elements(ctx, deal))
+    
+    doc.build(elements)
+
+def _issue_date(deal):
+    """Date printed on the document: a pdf_queue snapshot's issue date, else today"""
+    issued_on = getattr(deal, 'issued_on', None)
+    return issued_on or utc_to_pakistan(datetime.utcnow()).split(' ')[0]
+
+def _deal_elements(ctx, deal):
+    """Flowables making up one deal's document"""
+    Table, Paragraph, Spacer, inch = ctx.Table, ctx.Paragraph, ctx.Spacer, ctx.inch
     
     elements = []
-    styles = getSampleStyleSheet()
-    
-    # Custom styles
-    title_style = ParagraphStyle(
-        'Title',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=10,
-        alignment=1,
-        textColor=colors.Color(0.051, 0.431, 0.992)  # Bootstrap primary blue
-    )
-    
-    date_style = ParagraphStyle(
-        'Date',
-        parent=styles['Normal'],
-        fontSize=12,
-        alignment=2,  # Right alignment
-        textColor=colors.grey
-    )
-    
-    section_style = ParagraphStyle(
-        'SectionTitle',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=8,
-        textColor=colors.Color(0.286, 0.333, 0.341)
-    )
+    issued_on = _issue_date(deal)
     
     # Header with title and date
     header_data = [[
-        Paragraph("Product Registry Deal Document", title_style),
-        Paragraph(f"Date: {utc_to_pakistan(datetime.utcnow()).split(' ')[0]}", date_style)
+        Paragraph("Product Registry Deal Document", ctx.title_style),
+        Paragraph(f"Date: {issued_on}", ctx.date_style)
     ]]
     
     header_table = Table(header_data, colWidths=[4*inch, 2.5*inch])
-    header_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 20),
-    ]))
+    header_table.setStyle(ctx.header_table_style)
     
     elements.append(header_table)
     elements.append(Spacer(1, 20))
     
     # Deal Information
-    elements.append(Paragraph("Deal Information", section_style))
+    elements.append(Paragraph("Deal Information", ctx.section_style))
     deal_info_data = [
         ['Deal ID:', f"#{deal.id}"],
         ['Status:', deal.status.title()],
@@ -93,19 +236,13 @@ def generate_deal_pdf_reportlab(deal):
     ]
     
     deal_info_table = Table(deal_info_data, colWidths=[2*inch, 4*inch])
-    deal_info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.Color(0.969, 0.976, 0.980)),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('PADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.Color(0.871, 0.886, 0.902))
-    ]))
+    deal_info_table.setStyle(ctx.info_table_style)
     
     elements.append(deal_info_table)
     elements.append(Spacer(1, 20))
     
     # Parties Involved
-    elements.append(Paragraph("Parties Involved", section_style))
+    elements.append(Paragraph("Parties Involved", ctx.section_style))
     
     # Buyer info
     buyer_data = [[
@@ -137,21 +274,13 @@ def generate_deal_pdf_reportlab(deal):
     parties_data = buyer_data + seller_data
     
     parties_table = Table(parties_data, colWidths=[1.5*inch, 2*inch, 1.5*inch, 2*inch])
-    parties_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.Color(0.969, 0.976, 0.980)),
-        ('BACKGROUND', (2, 0), (2, -1), colors.Color(0.969, 0.976, 0.980)),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('PADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.Color(0.871, 0.886, 0.902))
-    ]))
+    parties_table.setStyle(ctx.parties_table_style)
     
     elements.append(parties_table)
     elements.append(Spacer(1, 20))
     
     # Products Involved (NO PRICES)
-    elements.append(Paragraph(f"Products Involved ({len(deal.deal_items)} items)", section_style))
+    elements.append(Paragraph(f"Products Involved ({len(deal.deal_items)} items)", ctx.section_style))
     
     products_data = [['Product Name', 'Serial Number', 'Brand', 'Category']]
     
@@ -164,37 +293,20 @@ def generate_deal_pdf_reportlab(deal):
         ])
     
     products_table = Table(products_data, colWidths=[2.2*inch, 1.8*inch, 1.5*inch, 1.5*inch])
-    products_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.286, 0.333, 0.341)),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('PADDING', (0, 0), (-1, -1), 8),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.Color(0.980, 0.984, 0.988)),
-        ('GRID', (0, 0), (-1, -1), 1, colors.Color(0.871, 0.886, 0.902))
-    ]))
+    products_table.setStyle(ctx.products_table_style)
     
     elements.append(products_table)
     elements.append(Spacer(1, 20))
     
     # Deal Description
     if deal.description:
-        elements.append(Paragraph("Deal Description", section_style))
-        desc_style = ParagraphStyle(
-            'Description',
-            parent=styles['Normal'],
-            fontSize=11,
-            spaceAfter=15,
-            leftIndent=20,
-            fontName='Helvetica-Oblique'
-        )
-        elements.append(Paragraph(deal.description, desc_style))
+        elements.append(Paragraph("Deal Description", ctx.section_style))
+        elements.append(Paragraph(deal.description, ctx.description_style))
         elements.append(Spacer(1, 20))
     
     # Approval Information
     if deal.approved_by:
-        elements.append(Paragraph("Approval Information", section_style))
+        elements.append(Paragraph("Approval Information", ctx.section_style))
         approval_data = [
             ['Approved By:', 'Admin'],
             ['Approved On:', utc_to_pakistan(deal.approved_at) if deal.approved_at else 'N/A']
@@ -203,33 +315,14 @@ def generate_deal_pdf_reportlab(deal):
             approval_data.append(['Approval Notes:', deal.approval_notes])
         
         approval_table = Table(approval_data, colWidths=[2*inch, 4*inch])
-        approval_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.Color(0.969, 0.976, 0.980)),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('PADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.Color(0.871, 0.886, 0.902))
-        ]))
+        approval_table.setStyle(ctx.info_table_style)
         
         elements.append(approval_table)
         elements.append(Spacer(1, 20))
     
     # Footer
     elements.append(Spacer(1, 30))
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=1,
-        textColor=colors.Color(0.424, 0.467, 0.514)
-    )
-    
-    elements.append(Paragraph(f"Document generated on: {utc_to_pakistan(datetime.utcnow())}", footer_style))
-    elements.append(Paragraph("For verification, please contact our support team", footer_style))
-    
-    # Build PDF
-    doc.build(elements)
+    elements.append(Paragraph(f"Document generated on: {issued_on}", ctx.footer_style))
+    elements.append(Paragraph("For verification, please contact our support team", ctx.footer_style))
     
-    pdf_data = buffer.getvalue()
-    buffer.close()
-    return pdf_data
+    return elements
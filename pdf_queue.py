@@ -0,0 +1,315 @@
+"""
+PDF Rendering Queue
+Renders deal documents in a pool of worker processes instead of the
+request thread and keeps the results on disk.
+
+A document is stored as <PDF_CACHE_DIR>/deal_<id>_<key>.pdf, where key is
+a hash of everything the document shows (deal, parties, items, products,
+and the issue date printed on it). Any change to that state, or a new day,
+produces a new key, so a stale file is never served; files of deals changed through the ORM are also removed on commit,
+and the directory is pruned to PDF_CACHE_MAX_FILES documents no older than
+PDF_CACHE_MAX_AGE seconds.
+The request process only takes a plain snapshot of the deal (and renders
+the HTML template when WeasyPrint is in use); the worker does the slow part
+and writes the file, which the route then streams with send_file().
+
+A pool broken by a crashed worker is replaced and the job submitted again
+once.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from types import SimpleNamespace
+
+from flask import current_app, has_app_context, render_template
+from sqlalchemy import event
+
+from extensions import db
+from models import Deal, DealItem, utc_to_pakistan
+from pdf_generator import render_deal_pdf, generate_deals_pdf_reportlab, weasyprint_available
+
+_executor = None
+_executor_lock = threading.Lock()
+# cache path -> Future of the job writing it, so concurrent requests share one render
+_pending = {}
+_pending_lock = threading.Lock()
+# time.monotonic() of this process's last cache prune
+_last_prune = None
+_prune_lock = threading.Lock()
+
+
+def _party(user):
+    if user is None:
+        return None
+    return SimpleNamespace(username=user.username, email=user.email, mobile_number=user.mobile_number)
+
+
+def issue_date():
+    """Today's date in Pakistan time, as printed on documents"""
+    return utc_to_pakistan(datetime.utcnow()).split(' ')[0]
+
+
+def deal_snapshot(deal):
+    """Picklable copy of everything the deal document shows
+
+    Has the same attribute shape as a Deal, so the PDF renderers accept it.
+    issued_on is part of the snapshot so a stored document is only reused
+    on the day it was issued.
+    """
+    return SimpleNamespace(
+        id=deal.id,
+        issued_on=issue_date(),
+        status=deal.status,
+        deal_type=deal.deal_type,
+        total_amount=deal.total_amount,
+        description=deal.description,
+        created_at=deal.created_at,
+        approved_by=deal.approved_by,
+        approved_at=deal.approved_at,
+        approval_notes=deal.approval_notes,
+        buyer=_party(deal.buyer),
+        seller=_party(deal.seller),
+        seller_name=deal.seller_name,
+        seller_mobile=deal.seller_mobile,
+        seller_id_card=deal.seller_id_card,
+        deal_items=[SimpleNamespace(
+            price=item.price,
+            product=SimpleNamespace(
+                name=item.product.name,
+                serial_number=item.product.serial_number,
+                brand=SimpleNamespace(name=item.product.brand.name),
+                category=SimpleNamespace(name=item.product.category.name)
+            )
+        ) for item in deal.deal_items]
+    )
+
+
+def document_key(snapshot):
+    """Stable hash of a deal snapshot"""
+    def plain(value):
+        if isinstance(value, SimpleNamespace):
+            return {k: plain(v) for k, v in sorted(vars(value).items())}
+        if isinstance(value, list):
+            return [plain(v) for v in value]
+        return value
+
+    payload = json.dumps(plain(snapshot), default=str, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:20]
+
+
+def cache_dir():
+    path = current_app.config['PDF_CACHE_DIR']
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def cache_path(deal_id, key):
+    return os.path.join(cache_dir(), f'deal_{deal_id}_{key}.pdf')
+
+
+def purge_deal(deal_id, keep=None):
+    """Delete the stored documents of a deal, except the path in keep"""
+    for path in glob.glob(os.path.join(cache_dir(), f'deal_{deal_id}_*.pdf')):
+        if path != keep:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def prune_cache():
+    """Delete stored documents past PDF_CACHE_MAX_AGE, then the oldest beyond PDF_CACHE_MAX_FILES"""
+    files = []
+    for path in glob.glob(os.path.join(cache_dir(), 'deal_*.pdf')):
+        try:
+            files.append((os.path.getmtime(path), path))
+        except FileNotFoundError:
+            pass
+    files.sort()
+    cutoff = time.time() - current_app.config['PDF_CACHE_MAX_AGE']
+    excess = len(files) - current_app.config['PDF_CACHE_MAX_FILES']
+    for i, (mtime, path) in enumerate(files):
+        if mtime >= cutoff and i >= excess:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # removed by another worker
+
+
+def _maybe_prune():
+    # At most once per PDF_CACHE_PRUNE_INTERVAL per process: listing the directory is not free
+    global _last_prune
+    with _prune_lock:
+        now = time.monotonic()
+        if _last_prune is not None and now - _last_prune < current_app.config['PDF_CACHE_PRUNE_INTERVAL']:
+            return
+        _last_prune = now
+    prune_cache()
+
+
+def _render_to_file(snapshot, html, path):
+    """Worker process entry point: render and atomically publish the file"""
+    pdf_data = render_deal_pdf(snapshot, html)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(pdf_data)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=current_app.config['PDF_WORKERS'])
+        return _executor
+
+
+def _reset_executor(broken):
+    """Drop the broken pool so the next job starts a new one"""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def _submit(func, *args):
+    executor = _get_executor()
+    try:
+        return executor.submit(func, *args)
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        return _get_executor().submit(func, *args)
+
+
+def request_pdf(deal):
+    """Path of the deal's document and the Future rendering it (None when already stored)"""
+    snapshot = deal_snapshot(deal)
+    path = cache_path(deal.id, document_key(snapshot))
+    if os.path.exists(path):
+        return path, None
+
+    with _pending_lock:
+        future = _pending.get(path)
+        # A finished job whose file is missing failed; its callback may not have run yet
+        if future is None or future.done():
+            html = render_template('deal_pdf.html', deal=deal) if weasyprint_available() else None
+            future = _submit(_render_to_file, snapshot, html, path)
+            _pending[path] = future
+            future.add_done_callback(lambda f: _forget(path))
+            # A new version supersedes whatever was stored for this deal
+            purge_deal(deal.id, keep=path)
+    _maybe_prune()
+    return path, future
+
+
+def _forget(path):
+    with _pending_lock:
+        _pending.pop(path, None)
+
+
+def get_pdf(deal, timeout=None):
+    """Path of the rendered document, waiting up to timeout seconds
+
+    Returns None if it is still rendering; rendering errors are raised.
+    """
+    path, future = request_pdf(deal)
+    if future is None:
+        return path
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        return None
+    except BrokenProcessPool:
+        # A worker died mid-render; submitting again replaces the pool
+        path, future = request_pdf(deal)
+        try:
+            return future.result(timeout=timeout) if future is not None else path
+        except TimeoutError:
+            return None
+
+
+def render_documents(deals):
+    """Yield the stored document path of each deal, in order
+
+    Every missing document is queued up front so the pool renders them in
+    parallel; the results land in the document cache as usual.
+    """
+    jobs = [(deal, request_pdf(deal)) for deal in deals]
+    for deal, (path, future) in jobs:
+        if future is not None:
+            try:
+                future.result()
+            except BrokenProcessPool:
+                path, future = request_pdf(deal)
+                if future is not None:
+                    future.result()
+        yield path
+
+
+def _render_statement_to_file(snapshots, path):
+    """Worker process entry point for a combined multi-deal document"""
+    with open(path, 'wb') as f:
+        generate_deals_pdf_reportlab(snapshots, f)
+    return path
+
+
+def render_statement(snapshots):
+    """Render one combined document for deal snapshots in the pool; returns a temporary file path
+
+    The caller owns the file and must remove it.
+    """
+    fd, path = tempfile.mkstemp(prefix='statement_', suffix='.pdf', dir=cache_dir())
+    os.close(fd)
+    try:
+        try:
+            return _submit(_render_statement_to_file, snapshots, path).result()
+        except BrokenProcessPool:
+            # A worker died mid-render; submitting again replaces the pool
+            return _submit(_render_statement_to_file, snapshots, path).result()
+    except Exception:
+        os.remove(path)
+        raise
+
+
+# Cache invalidation
+# Deals and deal items changed through the ORM have their stored documents
+# removed once the change commits. The content key already keeps stale
+# files from being served; this keeps them from piling up on disk.
+_STALE_KEY = 'pdf_stale_deal_ids'
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changed_deals(session, flush_context):
+    deal_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Deal):
+            deal_ids.add(obj.id)
+        elif isinstance(obj, DealItem):
+            deal_ids.add(obj.deal_id)
+    deal_ids.discard(None)
+    if deal_ids:
+        session.info.setdefault(_STALE_KEY, set()).update(deal_ids)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _purge_changed_deals(session):
+    deal_ids = session.info.pop(_STALE_KEY, None)
+    if deal_ids and has_app_context():
+        for deal_id in deal_ids:
+            purge_deal(deal_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_changed_deals(session):
+    session.info.pop(_STALE_KEY, None)
@@ -0,0 +1,170 @@
+"""
+Session Principal
+The logged-in user as Flask-Login sees it on every request: a small
+__slots__ object with the identity, role flags and approval/subscription
+state, loaded with one narrow SELECT and then kept in a bounded per-process
+LRU with a TTL, so most requests resolve current_user without touching the
+database.
+
+Any flushed change to a cached column of a User (edit_user,
+approve_shopkeeper, an admin demotion) or a deletion evicts that user here
+and, once the transaction commits, bumps the principal version stamp
+(PRINCIPAL_VERSION_FILE), so every other worker drops its cached users on
+its next request. PRINCIPAL_CACHE_TTL only bounds how long an entry lives
+when nothing changes.
+
+product_count changes with every registration and deal, so it is not cached:
+it is read on first use, once per request. Views that need the rest of the
+row (email, reset token, relationships) load the User by current_user.id.
+"""
+
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+
+from extensions import db
+from local_cache import EngineCaches
+from models import User, ProductQuotaMixin
+from version_stamp import read_stamp, bump_stamp
+
+# Columns cached per user, in the order they are selected
+PrincipalRow = namedtuple('PrincipalRow', [
+    'id', 'username', 'is_admin', 'is_shopkeeper', 'can_create_admins',
+    'shopkeeper_approved', 'has_subscription'])
+
+_NOT_LOADED = object()
+
+
+class Principal(ProductQuotaMixin):
+    """The current user's identity and permissions; quacks like User for the common checks"""
+    __slots__ = PrincipalRow._fields + ('_product_count',)
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, row):
+        for name, value in zip(PrincipalRow._fields, row):
+            setattr(self, name, value)
+        self._product_count = _NOT_LOADED
+
+    def get_id(self):
+        return str(self.id)
+
+    @property
+    def product_count(self):
+        if self._product_count is _NOT_LOADED:
+            self._product_count = db.session.scalar(
+                select(User.product_count).where(User.id == self.id)) or 0
+        return self._product_count
+
+    def __eq__(self, other):
+        if isinstance(other, (Principal, User)):
+            return self.get_id() == other.get_id()
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f'<Principal {self.username}>'
+
+
+# user id -> PrincipalRow
+_caches = EngineCaches()
+
+
+def _cache():
+    return _caches.get()
+
+
+def _version_file():
+    return current_app.config['PRINCIPAL_VERSION_FILE']
+
+
+def fetch_principal_row(user_id):
+    """Load a PrincipalRow straight from the database (no cache), or None"""
+    row = db.session.execute(
+        select(*[getattr(User, name) for name in PrincipalRow._fields])
+        .where(User.id == user_id)).first()
+    return PrincipalRow(*row) if row is not None else None
+
+
+def load_principal(user_id):
+    """Principal for a session's user id, or None if the user no longer exists"""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    # Read the stamp before querying: a change committed meanwhile is not cached
+    version = read_stamp(_version_file())
+    cache = _cache()
+    found, row = cache.get(user_id, version)
+    if not found:
+        row = fetch_principal_row(user_id)
+        if row is None:
+            return None
+        cache.set(user_id, row, version,
+                  current_app.config.get('PRINCIPAL_CACHE_TTL', 60),
+                  current_app.config.get('PRINCIPAL_CACHE_SIZE', 10000))
+    # A fresh object per request: product_count is memoised on it
+    return Principal(row)
+
+
+def invalidate_principals(user_ids):
+    """Drop cached users everywhere, e.g. after a bulk UPDATE that bypasses the ORM"""
+    _cache().discard(user_ids)
+    bump_stamp(_version_file())
+
+
+def clear_principal_cache():
+    """Empty this database's principal cache in this process"""
+    _cache().clear()
+
+
+# Cache invalidation
+# Users deleted, or changed in a column the principal holds, are evicted at
+# flush; once the transaction commits the version stamp is bumped so every
+# other process drops its cached users too. Changes to other columns (a
+# rehashed password, a reset token) leave the cache alone.
+_PENDING_KEY = 'principal_stale_users'
+_CACHED_COLUMNS = PrincipalRow._fields[1:]
+
+
+def _principal_changed(user):
+    state = inspect(user)
+    return any(state.attrs[name].history.has_changes() for name in _CACHED_COLUMNS)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_stale_users(session, flush_context):
+    user_ids = {obj.id for obj in session.deleted if isinstance(obj, User)}
+    user_ids.update(obj.id for obj in session.dirty if isinstance(obj, User) and _principal_changed(obj))
+    user_ids.discard(None)
+    if user_ids:
+        session.info.setdefault(_PENDING_KEY, set()).update(user_ids)
+        if has_app_context():
+            _cache().discard(user_ids)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _evict_stale_users(session):
+    user_ids = session.info.pop(_PENDING_KEY, None)
+    if user_ids and has_app_context():
+        _cache().discard(user_ids)
+        # The commit already succeeded; a failed bump must not fail the request
+        try:
+            bump_stamp(_version_file())
+        except OSError:
+            current_app.logger.exception('Could not bump the principal version stamp')
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_stale_users(session):
+    session.info.pop(_PENDING_KEY, None)
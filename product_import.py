@@ -0,0 +1,216 @@
+"""
+Bulk Product Import
+Registers many products from an uploaded CSV or XLSX file.
+
+The whole file is validated up front: serial numbers are checked against
+the registry with one set-based query, brand and category names are
+resolved from the cached reference data maps, and the owner's quota is
+applied to the file as a whole. Valid rows are then inserted in chunks,
+each chunk as one multi-row INSERT for the products and one for their
+initial status history, all in a single transaction. Rows that cannot be
+imported are returned in a per-row error report.
+"""
+
+import csv
+import io
+import os
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import String, insert, literal, select
+from sqlalchemy.exc import IntegrityError
+
+from counters import adjust_counters, adjust_product_counts, TOTAL_PRODUCTS
+from extensions import db
+from models import Product, ProductStatusHistory
+from reference_data import category_ids_by_name, brand_ids_by_name
+from verification import invalidate_serials
+
+IMPORT_FORMATS = ('csv', 'xlsx')
+
+# Products inserted per statement
+CHUNK_SIZE = 500
+
+# Serial numbers per IN (...) lookup
+LOOKUP_BATCH_SIZE = 500
+
+# Header spellings accepted for each column
+COLUMN_ALIASES = {
+    'name': ('name', 'product', 'product name'),
+    'serial_number': ('serial_number', 'serial number', 'serial', 'serial no'),
+    'brand': ('brand', 'brand name'),
+    'category': ('category', 'category name'),
+}
+
+# row is the line in the file (the header is row 1)
+RowError = namedtuple('RowError', ['row', 'serial_number', 'message'])
+ImportResult = namedtuple('ImportResult', ['imported', 'errors'])
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # Spreadsheets store numeric serials as floats
+        value = int(value)
+    return str(value).strip()
+
+
+def _read_csv(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+
+def _read_xlsx(stream):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError('XLSX import is not available on this server; upload a CSV file instead.')
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_rows(stream, filename, max_rows):
+    """[(row number, {column: text})] from an uploaded file
+
+    Raises ValueError when the file type, header or size is unusable.
+    """
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension not in IMPORT_FORMATS:
+        raise ValueError('Upload a .csv or .xlsx file.')
+    reader = _read_csv(stream) if extension == 'csv' else _read_xlsx(stream)
+
+    header = next(reader, None)
+    if header is None:
+        raise ValueError('The file is empty.')
+    labels = [_text(label).lower().replace('_', ' ') for label in header]
+    positions = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias.replace('_', ' ') in labels:
+                positions[column] = labels.index(alias.replace('_', ' '))
+                break
+    missing = [column for column in COLUMN_ALIASES if column not in positions]
+    if missing:
+        raise ValueError(f'Missing column(s): {", ".join(missing)}. '
+                         f'Expected a header row with {", ".join(COLUMN_ALIASES)}.')
+
+    rows = []
+    for number, values in enumerate(reader, start=2):
+        values = list(values or ())
+        record = {column: _text(values[pos]) if pos < len(values) else ''
+                  for column, pos in positions.items()}
+        if not any(record.values()):
+            continue  # blank line
+        if len(rows) == max_rows:
+            raise ValueError(f'The file has more than {max_rows} products; split it into smaller files.')
+        rows.append((number, record))
+    return rows
+
+
+def _registered_serials(serials):
+    """The subset of serials already in the registry"""
+    serials = list(serials)
+    found = set()
+    for start in range(0, len(serials), LOOKUP_BATCH_SIZE):
+        batch = serials[start:start + LOOKUP_BATCH_SIZE]
+        found.update(db.session.scalars(select(Product.serial_number)
+                                        .where(Product.serial_number.in_(batch))))
+    return found
+
+
+def validate_rows(rows, user):
+    """Split rows into product values ready to insert and [RowError]"""
+    categories = category_ids_by_name()
+    brands = brand_ids_by_name()
+    errors = []
+    candidates = []
+    seen = {}
+
+    for number, record in rows:
+        serial = record['serial_number']
+        problems = []
+        if not 2 <= len(record['name']) <= 100:
+            problems.append('Product name must be 2 to 100 characters.')
+        if not 3 <= len(serial) <= 100:
+            problems.append('Serial number must be 3 to 100 characters.')
+        elif serial in seen:
+            problems.append(f'Serial number repeats row {seen[serial]}.')
+        brand_id = brands.get(record['brand'].lower())
+        if brand_id is None:
+            problems.append(f'Unknown brand "{record["brand"]}".')
+        category_id = categories.get(record['category'].lower())
+        if category_id is None:
+            problems.append(f'Unknown category "{record["category"]}".')
+
+        seen.setdefault(serial, number)
+        if problems:
+            errors.append(RowError(number, serial, ' '.join(problems)))
+        else:
+            candidates.append((number, {
+                'name': record['name'],
+                'serial_number': serial,
+                'brand_id': brand_id,
+                'category_id': category_id,
+            }))
+
+    registered = _registered_serials(values['serial_number'] for _, values in candidates)
+    remaining = user.remaining_product_quota()
+    accepted = []
+    for number, values in candidates:
+        if values['serial_number'] in registered:
+            errors.append(RowError(number, values['serial_number'], 'This serial number is already registered.'))
+        elif remaining is not None and len(accepted) >= remaining:
+            errors.append(RowError(number, values['serial_number'],
+                                   'Product limit reached; subscribe to register more.'))
+        else:
+            accepted.append(values)
+
+    errors.sort(key=lambda error: error.row)
+    return accepted, errors
+
+
+def _insert_products(user_id, products):
+    now = datetime.utcnow()
+    for start in range(0, len(products), CHUNK_SIZE):
+        chunk = products[start:start + CHUNK_SIZE]
+        db.session.execute(insert(Product), [
+            dict(values, user_id=user_id, status='for_sale', created_at=now, updated_at=now)
+            for values in chunk])
+        # Same initial entry Product.create_initial_history() writes, taken
+        # straight from the rows just inserted
+        db.session.execute(insert(ProductStatusHistory).from_select(
+            ['product_id', 'old_status', 'new_status', 'changed_at', 'changed_by'],
+            select(Product.id, literal(None, String), Product.status, Product.created_at, Product.user_id)
+            .where(Product.serial_number.in_([values['serial_number'] for values in chunk]))))
+
+
+def import_products(user, rows):
+    """Validate rows and register the valid ones to user; returns an ImportResult"""
+    products, errors = validate_rows(rows, user)
+    if not products:
+        return ImportResult(0, errors)
+
+    try:
+        _insert_products(user.id, products)
+        # The inserts bypass the ORM flush, so keep the counters in step here
+        connection = db.session.connection()
+        adjust_product_counts(connection, {user.id: len(products)})
+        adjust_counters(connection, {TOTAL_PRODUCTS: len(products)})
+        db.session.commit()
+    except IntegrityError:
+        # Another registration took one of the serials after validation
+        db.session.rollback()
+        return ImportResult(0, errors + [RowError(None, '', 'Some serial numbers were registered by someone '
+                                                            'else while importing; nothing was imported. '
+                                                            'Please upload the file again.')])
+
+    # A serial may be cached as "not registered"
+    invalidate_serials([values['serial_number'] for values in products])
+    return ImportResult(len(products), errors)
@@ -0,0 +1,129 @@
+"""
+Request Profiling
+Opt-in cProfile sampling for the Flask app (PROFILING_ENABLED).
+
+A request is profiled when it is picked by PROFILE_SAMPLE_RATE (0.0 - 1.0)
+or when a logged-in admin sends the PROFILE_HEADER header. Each profile is
+written as a pstats file under PROFILE_DIR/<endpoint>/, and only the newest
+PROFILE_KEEP files per endpoint are kept. The files open in any pstats
+viewer (python -m pstats, snakeviz); the admin profiles page merges them
+into the most expensive functions per endpoint.
+"""
+
+import cProfile
+import glob
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+from flask import current_app, g, request
+from flask_login import current_user
+
+# Functions listed per endpoint on the admin page
+TOP_FUNCTIONS = 15
+
+_rotate_lock = threading.Lock()
+
+
+def profile_dir():
+    return current_app.config['PROFILE_DIR']
+
+
+def _endpoint_dir(endpoint):
+    # Endpoint names are 'blueprint.view'; keep them filesystem-safe anyway
+    return os.path.join(profile_dir(), re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint))
+
+
+def _wants_profile():
+    if request.endpoint is None or request.endpoint == 'static':
+        return False
+    if request.headers.get(current_app.config['PROFILE_HEADER']):
+        # Checked only when the header is sent, so other requests never load the user for this
+        return current_user.is_authenticated and current_user.is_admin
+    rate = current_app.config['PROFILE_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+
+def _start_profile():
+    if not _wants_profile():
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return  # another profiler is already active in this interpreter
+    g._profiler = profiler
+
+
+def _stop_profile(exc):
+    profiler = g.pop('_profiler', None)
+    if profiler is None:
+        return
+    profiler.disable()
+
+    directory = _endpoint_dir(request.endpoint)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{time.time_ns()}-{os.getpid()}.pstats')
+    # Written aside and renamed so the admin page never reads a partial file
+    profiler.dump_stats(f'{path}.tmp')
+    os.replace(f'{path}.tmp', path)
+    _rotate(directory, current_app.config['PROFILE_KEEP'])
+
+
+def _rotate(directory, keep):
+    with _rotate_lock:
+        files = sorted(glob.glob(os.path.join(directory, '*.pstats')))
+        for path in files[:-keep] if keep > 0 else files:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # removed by another worker
+
+
+def init_profiling(app):
+    """Profile sampled requests of app; call from create_app when PROFILING_ENABLED"""
+    app.before_request(_start_profile)
+    app.teardown_request(_stop_profile)
+
+
+def profiled_endpoints():
+    """{endpoint: [pstats file paths]} for every endpoint with stored profiles"""
+    root = profile_dir()
+    if not os.path.isdir(root):
+        return {}
+    endpoints = {}
+    for name in sorted(os.listdir(root)):
+        files = sorted(glob.glob(os.path.join(root, name, '*.pstats')))
+        if files:
+            endpoints[name] = files
+    return endpoints
+
+
+def top_functions(files, limit=TOP_FUNCTIONS, sort='cumulative'):
+    """The limit most expensive functions across files, as dicts for a table"""
+    stats = None
+    loaded = 0
+    for path in files:
+        try:
+            if stats is None:
+                stats = pstats.Stats(path)
+            else:
+                stats.add(path)
+        except (OSError, EOFError, TypeError, ValueError):
+            continue  # rotated away or half-written by another worker
+        loaded += 1
+    if stats is None:
+        return []
+
+    key = 3 if sort == 'cumulative' else 2  # index of cumtime / tottime in the stats tuple
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][key], reverse=True)[:limit]
+    return [{
+        'function': f'{os.path.basename(filename)}:{line}({name})' if line else name,
+        'calls': f'{ncalls}/{primitive}' if ncalls != primitive else str(ncalls),
+        'tottime_ms': round(tottime * 1000, 2),
+        'cumtime_ms': round(cumtime * 1000, 2),
+        'per_request_ms': round(cumtime * 1000 / loaded, 2)
+    } for (filename, line, name), (primitive, ncalls, tottime, cumtime, _) in rows]
@@ -0,0 +1,57 @@
+"""
+Query Loader Presets
+Named eager-loading strategies for list pages. Every relationship in
+models.py is lazy, so a template that walks product.category/brand/owner
+or deal.buyer/seller issues one query per row unless the view asks for
+the related rows up front.
+"""
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import Product, Deal, DealItem
+
+
+def product_listing():
+    """Products rendered with their category, brand and owner
+
+    All three are non-nullable many-to-one keys, so they are joined inline.
+    """
+    return (
+        joinedload(Product.category, innerjoin=True),
+        joinedload(Product.brand, innerjoin=True),
+        joinedload(Product.owner, innerjoin=True)
+    )
+
+
+def deal_listing():
+    """Deals rendered with buyer, optional seller and their item count"""
+    return (
+        joinedload(Deal.buyer, innerjoin=True),
+        joinedload(Deal.seller),
+        selectinload(Deal.deal_items)
+    )
+
+
+def deal_document():
+    """Deals rendered as full documents: parties plus every item's product,
+    brand and category, in two statements however many deals are loaded"""
+    return (
+        joinedload(Deal.buyer, innerjoin=True),
+        joinedload(Deal.seller),
+        selectinload(Deal.deal_items)
+        .joinedload(DealItem.product, innerjoin=True)
+        .options(joinedload(Product.brand, innerjoin=True),
+                 joinedload(Product.category, innerjoin=True))
+    )
+
+
+LOADER_PRESETS = {
+    'product_listing': product_listing,
+    'deal_listing': deal_listing,
+    'deal_document': deal_document
+}
+
+
+def with_loaders(query, preset):
+    """Apply a named loader preset to a query"""
+    return query.options(*LOADER_PRESETS[preset]())
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Script to install the search index on an existing database and backfill it
+from the current products, users and deals.
+"""
+
+from app import create_app
+from models import db
+from search import install_search_index, rebuild_search_index
+
+def rebuild_index():
+    """Create the search index structures if missing and repopulate them"""
+    app = create_app()
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            if not install_search_index(connection):
+                print(f"Search index not supported on {connection.dialect.name}; searches will use ILIKE.")
+                return
+
+            rebuilt = rebuild_search_index(connection)
+
+        if rebuilt:
+            print(f"Rebuilt search tables: {', '.join(rebuilt)}")
+        else:
+            print("Trigram indexes are in place; no backfill needed.")
+
+if __name__ == "__main__":
+    rebuild_index()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Script to recount the admin dashboard counters and the per-user product
+counts used by the registration quota, repairing any drift.
+Run it periodically (e.g. from cron), or with --interval to keep it running.
+"""
+
+import argparse
+import time
+
+from app import create_app
+from counters import reconcile_counters, reconcile_product_counts
+
+def reconcile_once(app):
+    """Recount all counters and report the ones that were corrected"""
+    with app.app_context():
+        drift = reconcile_counters()
+        user_drift = reconcile_product_counts()
+
+    if drift:
+        for name, (stored, actual) in sorted(drift.items()):
+            print(f"Corrected {name}: {stored} -> {actual}")
+    else:
+        print("All counters are consistent.")
+
+    if user_drift:
+        for user_id, (stored, actual) in sorted(user_drift.items()):
+            print(f"Corrected product count for user {user_id}: {stored} -> {actual}")
+        print(f"Repaired product counts for {len(user_drift)} users.")
+    else:
+        print("All user product counts are consistent.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--interval', type=int, default=0,
+                        help='Seconds between runs; 0 runs once and exits')
+    args = parser.parse_args()
+
+    app = create_app()
+    reconcile_once(app)
+    while args.interval > 0:
+        time.sleep(args.interval)
+        reconcile_once(app)
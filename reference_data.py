@@ -0,0 +1,115 @@
+"""
+Reference Data Cache
+Keeps the category and brand lists in memory so forms can build their
+choices without querying the database.
+
+Each process caches the lists together with a version stamp kept in a
+small file (REFERENCE_DATA_VERSION_FILE, see version_stamp.py) that every
+gunicorn worker on the host can see. Committing a change to a Category or
+Brand through the ORM bumps the stamp, so every worker reloads the lists on
+its next read; bulk statements that bypass the ORM call
+invalidate_reference_data() themselves.
+"""
+
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+
+from extensions import db
+from local_cache import EngineCaches
+from models import Category, Brand
+from version_stamp import read_stamp, bump_stamp
+
+# Lists of (id, name) in id order
+ReferenceData = namedtuple('ReferenceData', ['categories', 'brands'])
+
+# The one ReferenceData of each engine, under this key
+_caches = EngineCaches()
+_KEY = 'lists'
+
+
+def _version_file():
+    return current_app.config['REFERENCE_DATA_VERSION_FILE']
+
+
+def _current_version():
+    return read_stamp(_version_file())
+
+
+def _load():
+    return ReferenceData(
+        categories=[tuple(row) for row in db.session.execute(
+            select(Category.id, Category.name).order_by(Category.id))],
+        brands=[tuple(row) for row in db.session.execute(
+            select(Brand.id, Brand.name).order_by(Brand.id))]
+    )
+
+
+def reference_data():
+    """The cached category and brand lists, reloaded when another process changed them"""
+    # Read the stamp before loading: a change committed mid-load makes the next call reload
+    version = _current_version()
+    cache = _caches.get()
+    found, data = cache.get(_KEY, version)
+    if found:
+        return data
+
+    data = _load()
+    cache.set(_KEY, data, version)
+    return data
+
+
+def category_choices():
+    """[(id, name)] for a category SelectField"""
+    return list(reference_data().categories)
+
+
+def brand_choices():
+    """[(id, name)] for a brand SelectField"""
+    return list(reference_data().brands)
+
+
+def category_ids_by_name():
+    """{lowercased name: id}"""
+    return {name.lower(): id_ for id_, name in reference_data().categories}
+
+
+def brand_ids_by_name():
+    """{lowercased name: id}"""
+    return {name.lower(): id_ for id_, name in reference_data().brands}
+
+
+def invalidate_reference_data():
+    """Drop this process's lists and tell every other process to reload theirs"""
+    _caches.get().clear()
+    bump_stamp(_version_file())
+
+
+# Cache invalidation
+# Categories and brands changed through the ORM (the manage, edit and delete
+# pages) bump the version once the change commits.
+_PENDING_KEY = 'reference_data_changed'
+
+
+@event.listens_for(db.session, 'after_flush')
+def _note_reference_changes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Category, Brand)):
+            session.info[_PENDING_KEY] = True
+            return
+
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_version(session):
+    if session.info.pop(_PENDING_KEY, False) and has_app_context():
+        # The commit already succeeded; a failed bump must not fail the request
+        try:
+            invalidate_reference_data()
+        except OSError:
+            current_app.logger.exception('Could not bump the reference data version stamp')
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_reference_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,294 @@
+"""
+Registry Data Export
+Streams products, users, deals, ownership history and status history as
+CSV or XLSX for admins.
+
+Each dataset is one flat SELECT (names joined in, no ORM objects) executed
+with yield_per, which fetches rows in batches and uses a server-side cursor
+on PostgreSQL, so an export of any size never sits in memory. CSV is
+encoded and yielded as it is read. XLSX is written by xlsxwriter in
+constant_memory mode, which flushes each row to a temporary file; the
+finished workbook is then streamed from disk in blocks.
+
+Cells are always exported as values: XLSX strings are never turned into
+formulas, and CSV text starting with a formula character is prefixed with
+an apostrophe.
+"""
+
+import csv
+import io
+import os
+import tempfile
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models import User, Category, Brand, Product, Deal, DealItem, ProductStatusHistory, OwnershipHistory
+
+# Rows fetched from the database per round trip
+FETCH_SIZE = 2000
+
+# CSV rows encoded per yielded chunk
+CSV_ROWS_PER_CHUNK = 500
+
+# Bytes per chunk when streaming a finished workbook
+READ_BLOCK_SIZE = 64 * 1024
+
+# An XLSX sheet holds 1,048,576 rows including the header
+XLSX_MAX_ROWS = 1048575
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Filters export_statement() knows how to apply
+FILTERS = ('date_from', 'date_to', 'status')
+
+# columns: [(header, column expression)]; date_column and status_column are
+# what the date range and status filters apply to (None: not filterable)
+Dataset = namedtuple('Dataset', ['title', 'columns', 'joins', 'date_column', 'status_column'])
+
+
+def _datasets():
+    owner = aliased(User)
+    buyer = aliased(User)
+    seller = aliased(User)
+    previous_owner = aliased(User)
+    new_owner = aliased(User)
+    changed_by = aliased(User)
+    item_count = (select(db.func.count(DealItem.id))
+                  .where(DealItem.deal_id == Deal.id)
+                  .correlate(Deal).scalar_subquery())
+
+    return {
+        'products': Dataset('Products', [
+            ('ID', Product.id),
+            ('Serial Number', Product.serial_number),
+            ('Name', Product.name),
+            ('Brand', Brand.name),
+            ('Category', Category.name),
+            ('Status', Product.status),
+            ('Owner', owner.username),
+            ('Registered', Product.created_at),
+            ('Updated', Product.updated_at),
+        ], [
+            (Brand, Brand.id == Product.brand_id),
+            (Category, Category.id == Product.category_id),
+            (owner, owner.id == Product.user_id),
+        ], Product.created_at, Product.status),
+
+        'users': Dataset('Users', [
+            ('ID', User.id),
+            ('Username', User.username),
+            ('Email', User.email),
+            ('Mobile Number', User.mobile_number),
+            ('ID Card Number', User.id_card_number),
+            ('Shop Name', User.shop_name),
+            ('Admin', User.is_admin),
+            ('Shopkeeper', User.is_shopkeeper),
+            ('Shopkeeper Approved', User.shopkeeper_approved),
+            ('Products', User.product_count),
+            ('Joined', User.created_at),
+        ], [], User.created_at, None),
+
+        'deals': Dataset('Deals', [
+            ('ID', Deal.id),
+            ('Status', Deal.status),
+            ('Type', Deal.deal_type),
+            ('Buyer', buyer.username),
+            ('Seller', db.func.coalesce(seller.username, Deal.seller_name)),
+            ('Seller Mobile', Deal.seller_mobile),
+            ('Items', item_count),
+            ('Total Amount', Deal.total_amount),
+            ('Created', Deal.created_at),
+            ('Approved', Deal.approved_at),
+            ('Completed', Deal.completed_at),
+        ], [
+            (buyer, buyer.id == Deal.buyer_id),
+            (seller, seller.id == Deal.seller_id),
+        ], Deal.created_at, Deal.status),
+
+        'ownership_history': Dataset('Ownership History', [
+            ('ID', OwnershipHistory.id),
+            ('Serial Number', Product.serial_number),
+            ('Product', Product.name),
+            ('Previous Owner', previous_owner.username),
+            ('New Owner', new_owner.username),
+            ('Deal', OwnershipHistory.deal_id),
+            ('Transfer Type', OwnershipHistory.transfer_type),
+            ('Transfer Date', OwnershipHistory.transfer_date),
+        ], [
+            (Product, Product.id == OwnershipHistory.product_id),
+            (previous_owner, previous_owner.id == OwnershipHistory.previous_owner_id),
+            (new_owner, new_owner.id == OwnershipHistory.new_owner_id),
+        ], OwnershipHistory.transfer_date, OwnershipHistory.transfer_type),
+
+        'status_history': Dataset('Status History', [
+            ('ID', ProductStatusHistory.id),
+            ('Serial Number', Product.serial_number),
+            ('Product', Product.name),
+            ('Old Status', ProductStatusHistory.old_status),
+            ('New Status', ProductStatusHistory.new_status),
+            ('Changed By', changed_by.username),
+            ('Changed At', ProductStatusHistory.changed_at),
+        ], [
+            (Product, Product.id == ProductStatusHistory.product_id),
+            (changed_by, changed_by.id == ProductStatusHistory.changed_by),
+        ], ProductStatusHistory.changed_at, ProductStatusHistory.new_status),
+    }
+
+
+DATASETS = _datasets()
+
+
+def export_statement(name, filters):
+    """SELECT for a dataset with the date range and status filters applied
+
+    Raises ValueError for an unknown dataset or a filter it does not support.
+    """
+    dataset = DATASETS.get(name)
+    if dataset is None:
+        raise ValueError(f'Unknown export "{name}".')
+    unsupported = sorted(set(filters) - set(FILTERS))
+    if unsupported:
+        raise ValueError(f'{dataset.title} cannot be filtered by {", ".join(unsupported)}.')
+
+    first_table = dataset.columns[0][1].table
+    stmt = select(*[column.label(f'c{i}') for i, (_, column) in enumerate(dataset.columns)])
+    stmt = stmt.select_from(first_table)
+    for target, onclause in dataset.joins:
+        stmt = stmt.outerjoin(target, onclause)
+
+    if 'date_from' in filters:
+        stmt = stmt.where(dataset.date_column >= filters['date_from'])
+    if 'date_to' in filters:
+        stmt = stmt.where(dataset.date_column < filters['date_to'])
+    if 'status' in filters:
+        if dataset.status_column is None:
+            raise ValueError(f'{dataset.title} cannot be filtered by status.')
+        stmt = stmt.where(dataset.status_column == filters['status'])
+
+    # Primary key order: deterministic, and served by the table itself
+    return stmt.order_by(dataset.columns[0][1])
+
+
+def iter_rows(stmt):
+    """Result rows of stmt, fetched FETCH_SIZE at a time"""
+    result = db.session.execute(stmt.execution_options(yield_per=FETCH_SIZE))
+    try:
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        result.close()
+
+
+# Leading characters that make spreadsheet programs evaluate a CSV cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # User-entered text such as a product named '=HYPERLINK(...)' stays text
+        return "'" + value
+    return value
+
+
+def stream_csv(name, filters):
+    """Yield the dataset as UTF-8 CSV in chunks of CSV_ROWS_PER_CHUNK rows"""
+    stmt = export_statement(name, filters)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # Byte order mark so spreadsheet programs detect UTF-8
+    writer.writerow([header for header, _ in DATASETS[name].columns])
+    yield '\ufeff'.encode() + buffer.getvalue().encode()
+
+    pending = 0
+    for row in iter_rows(stmt):
+        if pending == 0:
+            buffer.seek(0)
+            buffer.truncate()
+        writer.writerow([_cell(value) for value in row])
+        pending += 1
+        if pending == CSV_ROWS_PER_CHUNK:
+            yield buffer.getvalue().encode()
+            pending = 0
+    if pending:
+        yield buffer.getvalue().encode()
+
+
+def write_xlsx(name, filters, path):
+    """Write the dataset to an XLSX workbook at path; returns the number of rows
+
+    Raises ValueError when the dataset has more rows than a sheet can hold.
+    """
+    import xlsxwriter
+
+    dataset = DATASETS[name]
+    stmt = export_statement(name, filters)
+    # Strings are always written as text, never as formulas or links
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'remove_timezone': True,
+                                          'strings_to_formulas': False, 'strings_to_urls': False})
+    try:
+        sheet = workbook.add_worksheet(dataset.title)
+        header_format = workbook.add_format({'bold': True})
+        date_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+        for col, (header, _) in enumerate(dataset.columns):
+            sheet.write_string(0, col, header, header_format)
+            sheet.set_column(col, col, max(12, len(header) + 2))
+
+        count = 0
+        for count, row in enumerate(iter_rows(stmt), start=1):
+            if count > XLSX_MAX_ROWS:
+                raise ValueError(f'{dataset.title} has more rows than one XLSX sheet holds; '
+                                 'narrow the filters or export CSV.')
+            for col, value in enumerate(row):
+                if isinstance(value, datetime):
+                    sheet.write_datetime(count, col, value, date_format)
+                elif value is not None:
+                    sheet.write(count, col, value)
+    finally:
+        workbook.close()
+    return count
+
+
+def stream_xlsx(name, filters):
+    """Yield the dataset as an XLSX workbook, built in a temporary file"""
+    fd, path = tempfile.mkstemp(prefix='export_', suffix='.xlsx')
+    os.close(fd)
+    try:
+        write_xlsx(name, filters, path)
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+    finally:
+        os.remove(path)
+
+
+def stream_export(name, filters, export_format):
+    """(chunk generator, download name, mimetype) for a dataset export
+
+    The dataset, filters and (for XLSX) the row count are checked before
+    anything is generated, so errors surface as ValueError rather than in
+    the middle of a download.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format "{export_format}".')
+    stmt = export_statement(name, filters)
+    if export_format == 'xlsx':
+        rows = db.session.scalar(select(db.func.count()).select_from(stmt.order_by(None).subquery()))
+        if rows > XLSX_MAX_ROWS:
+            raise ValueError(f'{DATASETS[name].title} has {rows} rows, more than one XLSX sheet holds; '
+                             'narrow the filters or export CSV.')
+
+    stream = stream_csv if export_format == 'csv' else stream_xlsx
+    stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    return stream(name, filters), f'{name}_{stamp}.{export_format}', EXPORT_FORMATS[export_format]
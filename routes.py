@@ -1,4 +1,5 @@
-from flask import render_template, flash, redirect, url_for, request, current_app, Blueprint
+from flask import (render_template, flash, redirect, url_for, request, current_app, Blueprint, send_file,
+                   Response, stream_with_context, jsonify)
 from flask_login import login_user, logout_user, login_required, current_user
 from extensions import db
 from sqlalchemy import or_
@@ -7,8 +8,25 @@ from forms import (LoginForm, UserRegistrationForm, ProductRegistrationForm,
                   CategoryForm, BrandForm, DealForm, DealItemForm, SearchForm, 
                   ProductStatusForm, EnhancedDealForm, ProductVerificationForm, ContactForm,
                   PasswordResetRequestForm, PasswordResetForm, EnhancedSearchForm,
-                  UnifiedDealForm, ShopkeeperApprovalForm, CreateAdminForm)
+                  UnifiedDealForm, ShopkeeperApprovalForm, CreateAdminForm, ProductImportForm)
+from counters import get_counters, TOTAL_USERS, TOTAL_PRODUCTS, TOTAL_DEALS, STOLEN_PRODUCTS
+from deal_approval import approve_deals, complete_deals, parse_deal_ids, BULK_APPROVAL_LIMIT
+from deal_export import parse_export_filters, build_export
+from deal_search import search_deals
+from instrumentation import request_log, endpoint_summary
+from pagination import paginate_request, request_page_args
+from password_policy import PasswordHashingBusy
+from pdf_queue import get_pdf
+from product_import import read_rows, import_products
+from profiling import profiled_endpoints, top_functions
+from query_options import with_loaders
+from registry_export import stream_export
+from search import matching_ids
+from timeline import timeline_page, parse_kinds, EVENT_KINDS, OWNERSHIP_TRANSFER
+from verification import (lookup_serial, verify_serials, parse_serial_numbers,
+                          describe_rejections, VERDICT_OK, VERDICT_MESSAGES)
 from datetime import datetime
+from types import SimpleNamespace
 from urllib.parse import urlparse as url_parse
 
 # Create Blueprint
@@ -18,7 +36,10 @@ bp = Blueprint('main', __name__)
 @bp.route('/index')
 def index():
     """Home page"""
-    return render_template('index.html', title='Product Registry')
+    total_users = None
+    if current_user.is_authenticated and current_user.is_admin:
+        total_users = get_counters()[TOTAL_USERS]
+    return render_template('index.html', title='Product Registry', total_users=total_users)
 
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -31,8 +52,14 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user and user.check_password(form.password.data):
+        try:
+            password_ok = user is not None and user.check_password(form.password.data)
+        except PasswordHashingBusy as e:
+            flash(str(e), 'warning')
+            return render_template('login.html', title='Login', form=form)
+        if password_ok:
             login_user(user, remember=form.remember_me.data)
+            db.session.commit()  # keeps a password rehashed under the current policy
             next_page = request.args.get('next')
             if not next_page or url_parse(next_page).netloc != '':
                 if user.is_admin:
@@ -68,7 +95,11 @@ def register():
             is_shopkeeper=is_shopkeeper,
             shopkeeper_approved=False if is_shopkeeper else True  # Regular users are auto-approved
         )
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except PasswordHashingBusy as e:
+            flash(str(e), 'warning')
+            return render_template('register.html', title='Register', form=form)
         db.session.add(user)
         db.session.commit()
         
@@ -87,15 +118,18 @@ def user_dashboard():
     if current_user.is_admin:
         return redirect(url_for('main.admin_dashboard'))
     
-    products = Product.query.filter_by(user_id=current_user.id).all()
+    products = with_loaders(Product.query.filter_by(user_id=current_user.id), 'product_listing').all()
     product_count = len(products)
     can_register = current_user.can_register_product()
+    deal_count = Deal.query.filter(
+        or_(Deal.buyer_id == current_user.id, Deal.seller_id == current_user.id)).count()
     
     return render_template('user_dashboard.html', 
                          title='User Dashboard',
                          products=products,
                          product_count=product_count,
-                         can_register=can_register)
+                         can_register=can_register,
+                         deal_count=deal_count)
 
 @bp.route('/register_product', methods=['GET', 'POST'])
 @login_required
@@ -111,7 +145,6 @@ def register_product():
         else:
             limit = 25 if current_user.is_shopkeeper else 3
             user_type = 'shopkeeper' if current_user.is_shopkeeper else 'regular user'
-            product_count = Product.query.filter_by(user_id=current_user.id).count()
             flash(f'You have reached the limit of {limit} free products for {user_type}. Please subscribe to register more.', 'warning')
         return redirect(url_for('main.user_dashboard'))
     
@@ -136,6 +169,42 @@ def register_product():
     
     return render_template('register_product.html', title='Register Product', form=form)
 
+@bp.route('/import_products', methods=['GET', 'POST'])
+@login_required
+def import_products_upload():
+    """Register products in bulk from a CSV or XLSX file"""
+    if current_user.is_admin:
+        flash('Admins cannot register products', 'warning')
+        return redirect(url_for('main.admin_dashboard'))
+    
+    if not current_user.can_register_product():
+        if current_user.is_shopkeeper and not current_user.shopkeeper_approved:
+            flash('Your shopkeeper account is pending admin approval. You cannot register products until your account is approved.', 'warning')
+        else:
+            flash('You have reached your free product limit. Please subscribe to register more.', 'warning')
+        return redirect(url_for('main.user_dashboard'))
+    
+    form = ProductImportForm()
+    result = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            rows = read_rows(upload.stream, upload.filename, current_app.config['PRODUCT_IMPORT_MAX_ROWS'])
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('main.import_products_upload'))
+        
+        result = import_products(current_user, rows)
+        if result.imported:
+            flash(f'{result.imported} product(s) registered successfully!', 'success')
+        if result.errors:
+            flash(f'{len(result.errors)} row(s) could not be imported; see the report below.', 'warning')
+        elif not result.imported:
+            flash('The file has no products to import.', 'info')
+    
+    return render_template('import_products.html', title='Import Products', form=form,
+                           result=result, remaining=current_user.remaining_product_quota())
+
 @bp.route('/update_product_status/<int:product_id>', methods=['GET', 'POST'])
 @login_required
 def update_product_status(product_id):
@@ -159,8 +228,7 @@ def update_product_status(product_id):
 
             # Restriction: Only original owner can change status from 'Stolen' to any other status
             if product.status == 'stolen' and form.status.data != 'stolen':
-                original_owner_id = product.get_original_owner_id()
-                if current_user.id != original_owner_id:
+                if current_user.id != product.get_original_owner_id():
                     flash('Only the original owner can change product status from Stolen to any other status.', 'danger')
                     return redirect(url_for('main.admin_search'))
         product.update_status(form.status.data, current_user.id)
@@ -295,8 +363,8 @@ def user_deals():
     if current_user.is_admin:
         return redirect(url_for('main.admin_dashboard'))
     
-    buyer_deals = Deal.query.filter_by(buyer_id=current_user.id).all()
-    seller_deals = Deal.query.filter_by(seller_id=current_user.id).all()
+    buyer_deals = with_loaders(Deal.query.filter_by(buyer_id=current_user.id), 'deal_listing').all()
+    seller_deals = with_loaders(Deal.query.filter_by(seller_id=current_user.id), 'deal_listing').all()
     
     return render_template('user_deals.html', 
                          title='My Deals',
@@ -312,17 +380,14 @@ def admin_dashboard():
         flash('Access denied. Admin privileges required.', 'danger')
         return redirect(url_for('main.user_dashboard'))
     
-    total_users = User.query.filter_by(is_admin=False).count()
-    total_products = Product.query.count()
-    total_deals = Deal.query.count()
-    stolen_products = Product.query.filter_by(status='stolen').count()
+    counters = get_counters()
     
     return render_template('admin_dashboard.html',
                          title='Admin Dashboard',
-                         total_users=total_users,
-                         total_products=total_products,
-                         total_deals=total_deals,
-                         stolen_products=stolen_products)
+                         total_users=counters[TOTAL_USERS],
+                         total_products=counters[TOTAL_PRODUCTS],
+                         total_deals=counters[TOTAL_DEALS],
+                         stolen_products=counters[STOLEN_PRODUCTS])
 
 @bp.route('/admin/manage_categories', methods=['GET', 'POST'])
 @login_required
@@ -362,11 +427,13 @@ def manage_brands():
         flash('Brand added successfully!', 'success')
         return redirect(url_for('main.manage_brands'))
     
-    brands = Brand.query.all()
+    page = paginate_request(Brand.query)
     return render_template('manage_brands.html',
                          title='Manage Brands',
                          form=form,
-                         brands=brands)
+                         brands=page.items,
+                         page=page,
+                         total_brands=Brand.query.count())
 
 @bp.route('/admin/deal_history', methods=['GET'])
 @login_required
@@ -378,21 +445,23 @@ def admin_deal_history():
 
     search_query = request.args.get('search', '').strip()
     history_results = []
+    page = None
     
     if search_query:
         # Search for products by serial, mobile, ID card, or name
-        history_results = Product.query.join(User).filter(
+        page = paginate_request(with_loaders(Product.query, 'product_listing').filter(
             or_(
-                Product.serial_number.ilike(f'%{search_query}%'),
-                User.mobile_number.ilike(f'%{search_query}%'),
-                User.id_card_number.ilike(f'%{search_query}%'),
-                User.username.ilike(f'%{search_query}%')
+                Product.id.in_(matching_ids('product', search_query)),
+                Product.user_id.in_(matching_ids(
+                    'user', search_query, ('mobile_number', 'id_card_number', 'username')))
             )
-        ).all()
+        ))
+        history_results = page.items
 
     return render_template('admin_deal_history.html',
                            title='Admin Deal History',
                            history_results=history_results,
+                           page=page,
                            search_query=search_query)
 
 @bp.route('/admin/product_deal_history/<int:product_id>', methods=['GET'])
@@ -434,42 +503,16 @@ def admin_deal_approval():
     search_query = request.args.get('search', '').strip()
     
     # Base query
-    query = Deal.query.filter_by(status=status_filter)
+    query = with_loaders(Deal.query.filter_by(status=status_filter), 'deal_listing')
     
     # Apply search filter if search query exists
-    deals = []
+    keys = None
     if search_query:
-        # Search by seller name (registered or non-registered)
-        seller_name_deals = query.join(User, Deal.seller_id == User.id, isouter=True).filter(
-            or_(
-                User.username.ilike(f'%{search_query}%'),
-                Deal.seller_name.ilike(f'%{search_query}%')
-            )
-        ).all()
-        
-        # Search by buyer name
-        buyer_name_deals = query.join(User, Deal.buyer_id == User.id).filter(
-            User.username.ilike(f'%{search_query}%')
-        ).all()
-        
-        # Search by mobile number (buyer or seller)
-        mobile_deals = query.join(User, Deal.buyer_id == User.id, isouter=True).filter(
-            or_(
-                User.mobile_number.ilike(f'%{search_query}%'),
-                Deal.seller_mobile.ilike(f'%{search_query}%')
-            )
-        ).all()
-        
-        # Search by serial number (through deal items)
-        serial_deals = query.join(DealItem).join(Product).filter(
-            Product.serial_number.ilike(f'%{search_query}%')
-        ).all()
-        
-        # Combine all results and remove duplicates
-        all_deals = seller_name_deals + buyer_name_deals + mobile_deals + serial_deals
-        deals = list({deal.id: deal for deal in all_deals}.values())
-    else:
-        deals = query.all()
+        # One ranked statement covering seller, buyer, mobile and serial matches
+        query, keys = search_deals(query, search_query)
+    
+    page = paginate_request(query, keys=keys)
+    deals = page.items
 
     if request.method == 'POST':
         # Update deal status
@@ -478,45 +521,97 @@ def admin_deal_approval():
         notes = request.form.get('approval_notes', '').strip()
         deal = Deal.query.get(deal_id)
 
-        if deal:
+        if not deal:
+            flash('Deal not found.', 'danger')
+        elif new_status == 'approved':
+            # Automatically transfer ownership when deal is approved
+            result = approve_deals([deal.id], current_user.id, notes)
+            if result.succeeded:
+                flash('Deal approved successfully! Ownership has been transferred.', 'success')
+            else:
+                flash(result.errors[deal.id], 'danger')
+        else:
             deal.status = new_status
             deal.approved_by = current_user.id
             deal.approved_at = datetime.utcnow()
             deal.approval_notes = notes
-            
-            # Automatically transfer ownership when deal is approved
-            if new_status == 'approved':
-                for deal_item in deal.deal_items:
-                    product = deal_item.product
-                    
-                    # Record ownership history
-                    ownership_record = OwnershipHistory(
-                        product_id=product.id,
-                        previous_owner_id=product.user_id,
-                        new_owner_id=deal.buyer_id,
-                        deal_id=deal.id,
-                        transfer_type='sale'
-                    )
-                    db.session.add(ownership_record)
-                    
-                    # Transfer ownership
-                    product.user_id = deal.buyer_id
-                
-                flash('Deal approved successfully! Ownership has been transferred.', 'success')
-            else:
-                flash('Deal status updated successfully!', 'success')
-            
             db.session.commit()
-        else:
-            flash('Deal not found.', 'danger')
+            flash('Deal status updated successfully!', 'success')
 
         return redirect(url_for('main.admin_deal_approval', status=status_filter))
 
     return render_template('admin_deals.html',
                          title='Admin Deal Approval',
                          deals=deals,
+                         page=page,
                          status_filter=status_filter)
 
+@bp.route('/admin/deals/bulk_approve', methods=['POST'])
+@login_required
+def admin_bulk_approve_deals():
+    """Approve the selected pending deals in one transaction"""
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', 'danger')
+        return redirect(url_for('main.user_dashboard'))
+
+    status_filter = request.form.get('status_filter', 'pending')
+    deal_ids = parse_deal_ids(request.form.getlist('deal_ids'))
+    if not deal_ids:
+        flash('Select at least one deal to approve.', 'warning')
+        return redirect(url_for('main.admin_deal_approval', status=status_filter))
+
+    limit = current_app.config.get('DEAL_BULK_APPROVAL_LIMIT', BULK_APPROVAL_LIMIT)
+    if len(deal_ids) > limit:
+        flash(f'You can approve at most {limit} deals at a time.', 'warning')
+        return redirect(url_for('main.admin_deal_approval', status=status_filter))
+
+    notes = request.form.get('approval_notes', '').strip()
+    result = approve_deals(deal_ids, current_user.id, notes)
+
+    if result.succeeded:
+        flash(f'{len(result.succeeded)} deal(s) approved. Ownership has been transferred.', 'success')
+    for deal_id in deal_ids:
+        if deal_id in result.errors:
+            flash(result.errors[deal_id], 'danger')
+
+    return redirect(url_for('main.admin_deal_approval', status=status_filter))
+
+@bp.route('/admin/deals/export')
+@login_required
+def admin_export_deals():
+    """Export the filtered deals as one combined PDF or a ZIP of deal PDFs"""
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', 'danger')
+        return redirect(url_for('main.user_dashboard'))
+
+    try:
+        filters = parse_export_filters(request.args)
+        output, filename, mimetype = build_export(filters, request.args.get('format', 'zip'))
+    except ValueError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('main.admin_deal_approval', status=request.args.get('status', 'pending')))
+
+    return send_file(output, mimetype=mimetype, as_attachment=True, download_name=filename)
+
+@bp.route('/admin/export')
+@login_required
+def admin_export():
+    """Stream a registry dataset as CSV or XLSX"""
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', 'danger')
+        return redirect(url_for('main.user_dashboard'))
+
+    try:
+        filters = parse_export_filters(request.args)
+        chunks, filename, mimetype = stream_export(request.args.get('dataset', 'products'), filters,
+                                                   request.args.get('format', 'csv'))
+    except ValueError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('main.admin_dashboard'))
+
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
 @bp.route('/admin/search', methods=['GET', 'POST'])
 @login_required
 def admin_search():
@@ -551,7 +646,7 @@ def admin_search():
             if user:
                 results = [user]
         elif search_type == 'shop_name':
-            results = User.query.filter(User.shop_name.ilike(f'%{search_query}%')).all()
+            results = User.query.filter(User.id.in_(matching_ids('user', search_query, ('shop_name',)))).all()
     
     return render_template('admin_search.html',
                          title='Search Products & Users',
@@ -568,7 +663,13 @@ def shopkeeper_login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data, is_shopkeeper=True).first()
-        if user and user.check_password(form.password.data):
+        try:
+            password_ok = user is not None and user.check_password(form.password.data)
+        except PasswordHashingBusy as e:
+            flash(str(e), 'warning')
+            return render_template('shopkeeper_login.html', title='Shopkeeper Login', form=form)
+        if password_ok:
+            db.session.commit()  # keeps a password rehashed under the current policy
             if not user.shopkeeper_approved:
                 flash('Your shopkeeper account has not been approved by the admin yet.', 'warning')
                 return redirect(url_for('main.shopkeeper_login'))
@@ -586,7 +687,7 @@ def shopkeeper_dashboard():
         flash('Access denied. Shopkeeper account required.', 'danger')
         return redirect(url_for('main.user_dashboard'))
     
-    products = Product.query.filter_by(user_id=current_user.id).all()
+    products = with_loaders(Product.query.filter_by(user_id=current_user.id), 'product_listing').all()
     product_count = len(products)
     
     return render_template('shopkeeper_dashboard.html', 
@@ -675,25 +776,21 @@ def admin_users():
     query = User.query.filter_by(is_admin=False)
     
     if search_query:
-        query = query.filter(
-            or_(
-                User.username.contains(search_query),
-                User.mobile_number.contains(search_query),
-                User.email.contains(search_query)
-            )
-        )
+        query = query.filter(User.id.in_(
+            matching_ids('user', search_query, ('username', 'mobile_number', 'email'))))
     
     if user_type_filter == 'shopkeeper':
         query = query.filter_by(is_shopkeeper=True)
     elif user_type_filter == 'user':
         query = query.filter_by(is_shopkeeper=False)
     
-    users = query.all()
+    page = paginate_request(query)
     total_users = User.query.filter_by(is_admin=False).count()
     
     return render_template('admin_users.html', 
                          title='User Management', 
-                         users=users, 
+                         users=page.items, 
+                         page=page,
                          total_users=total_users,
                          search_query=search_query,
                          user_type_filter=user_type_filter)
@@ -706,13 +803,17 @@ def shopkeeper_approvals():
         flash('Access denied. Admin privileges required.', 'danger')
         return redirect(url_for('main.user_dashboard'))
     
-    pending_shopkeepers = User.query.filter_by(is_shopkeeper=True, shopkeeper_approved=False).all()
-    approved_shopkeepers = User.query.filter_by(is_shopkeeper=True, shopkeeper_approved=True).all()
+    pending_page = paginate_request(
+        User.query.filter_by(is_shopkeeper=True, shopkeeper_approved=False), prefix='pending_')
+    approved_page = paginate_request(
+        User.query.filter_by(is_shopkeeper=True, shopkeeper_approved=True), prefix='approved_')
     
     return render_template('admin_shopkeeper_approvals.html',
                          title='Shopkeeper Approvals',
-                         pending_shopkeepers=pending_shopkeepers,
-                         approved_shopkeepers=approved_shopkeepers)
+                         pending_shopkeepers=pending_page.items,
+                         approved_shopkeepers=approved_page.items,
+                         pending_page=pending_page,
+                         approved_page=approved_page)
 
 @bp.route('/admin/approve_shopkeeper/<int:user_id>', methods=['POST'])
 @login_required
@@ -756,7 +857,11 @@ def create_admin():
             can_create_admins=(form.role.data == 'full'),
             shopkeeper_approved=True  # Not applicable but set to True
         )
-        admin.set_password(form.password.data)
+        try:
+            admin.set_password(form.password.data)
+        except PasswordHashingBusy as e:
+            flash(str(e), 'warning')
+            return render_template('create_admin.html', title='Create New Admin', form=form)
         db.session.add(admin)
         db.session.commit()
         
@@ -801,10 +906,50 @@ def stolen_report():
         flash('Access denied. Admin privileges required.', 'danger')
         return redirect(url_for('main.user_dashboard'))
     
-    stolen_products = Product.query.filter_by(status='stolen').all()
+    page = paginate_request(with_loaders(Product.query.filter_by(status='stolen'), 'product_listing'))
     return render_template('stolen_report.html',
                          title='Stolen Products Report',
-                         stolen_products=stolen_products)
+                         stolen_products=page.items,
+                         page=page,
+                         total_stolen=get_counters()[STOLEN_PRODUCTS])
+
+@bp.route('/admin/performance')
+@login_required
+def admin_performance():
+    """Per-endpoint latency and query percentiles from recent requests"""
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', 'danger')
+        return redirect(url_for('main.user_dashboard'))
+    
+    log = request_log()
+    samples = log.samples() if log is not None else []
+    return render_template('admin_performance.html',
+                         title='Request Performance',
+                         enabled=log is not None,
+                         sample_count=len(samples),
+                         endpoints=endpoint_summary(samples),
+                         slow_query_ms=current_app.config.get('SLOW_QUERY_THRESHOLD_MS'))
+
+@bp.route('/admin/profiles')
+@login_required
+def admin_profiles():
+    """Most expensive functions per endpoint from the stored request profiles"""
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', 'danger')
+        return redirect(url_for('main.user_dashboard'))
+    
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime'):
+        sort = 'cumulative'
+    profiles = [(endpoint, len(files), top_functions(files, sort=sort))
+                for endpoint, files in profiled_endpoints().items()]
+    return render_template('admin_profiles.html',
+                         title='Request Profiles',
+                         profiles=profiles,
+                         sort=sort,
+                         enabled=current_app.config.get('PROFILING_ENABLED'),
+                         sample_rate=current_app.config.get('PROFILE_SAMPLE_RATE'),
+                         header=current_app.config.get('PROFILE_HEADER'))
 
 @bp.route('/product_history/<int:product_id>')
 @login_required
@@ -819,24 +964,59 @@ def product_history(product_id):
     
     history = ProductStatusHistory.query.filter_by(product_id=product_id).order_by(
         ProductStatusHistory.changed_at.desc()).all()
-    # Add initial registration entry if not present
+    # Products registered before status history existed have no initial entry
+    # until create_initial_history.py backfills it; show one without writing
     if not history or history[-1].old_status is not None:
-        initial_history = ProductStatusHistory(
-            product_id=product.id,
+        history.append(SimpleNamespace(
             old_status=None,
             new_status=product.status,
             changed_at=product.created_at,
-            changed_by=product.user_id
-        )
-        db.session.add(initial_history)
-        db.session.commit()
-        history.append(initial_history)
+            changed_by_user=db.session.get(User, product.get_original_owner_id())
+        ))
 
     return render_template('product_history.html',
                          title='Product History',
                          product=product,
                          history=history)
 
+@bp.route('/product_timeline/<int:product_id>')
+@login_required
+def product_timeline(product_id):
+    """Status changes, ownership transfers and deals of a product in one stream (HTML or JSON)"""
+    product = Product.query.get_or_404(product_id)
+    as_json = request.args.get('format') == 'json'
+    
+    if product.user_id != current_user.id and not current_user.is_admin:
+        if as_json:
+            return jsonify({'error': 'You can only view history of your own products'}), 403
+        flash('You can only view history of your own products', 'danger')
+        return redirect(url_for('main.user_dashboard'))
+    
+    try:
+        kinds = parse_kinds(request.args.get('kinds'))
+    except ValueError as e:
+        if as_json:
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), 'warning')
+        kinds = EVENT_KINDS
+    
+    page = timeline_page(product.id, kinds, **request_page_args())
+    
+    if as_json:
+        return jsonify({
+            'product': {'id': product.id, 'serial_number': product.serial_number,
+                        'name': product.name, 'status': product.status},
+            'events': [event.to_dict() for event in page],
+            'next_cursor': page.next_cursor,
+            'prev_cursor': page.prev_cursor
+        })
+    
+    return render_template('product_timeline.html',
+                         title=f'Timeline - {product.serial_number}',
+                         product=product,
+                         page=page,
+                         kinds=kinds)
+
 # Enhanced Deal Creation Route
 @bp.route('/user_create_deal', methods=['GET', 'POST'])
 @login_required
@@ -858,46 +1038,10 @@ def user_create_deal():
         # Debug: Log form data
         print(f"Form validated. Seller: {seller_name}, Serial Numbers: {form.serial_numbers.data}")
 
-        # Process serial numbers and get product details
-        serial_numbers = [sn.strip() for sn in form.serial_numbers.data.split(',') if sn.strip()]
-        valid_products = []
-        invalid_products = []
-        product_details = []
-
-        for serial_number in serial_numbers:
-            product = Product.query.filter_by(serial_number=serial_number).first()
-            
-            # Debug logging
-            print(f"Processing product {serial_number}:")
-            if product:
-                print(f"  - Found: {product.name}")
-                print(f"  - Status: {product.status}")
-                print(f"  - Owner: {product.owner.username if product.owner else 'None'}")
-                print(f"  - Can be sold: {product.can_be_sold()}")
-                print(f"  - Current user is shopkeeper: {current_user.is_shopkeeper}")
-            else:
-                print(f"  - Not found in database")
-            
-            if not product:
-                invalid_products.append(f"{serial_number} (not found)")
-            elif product.status == 'locked':
-                invalid_products.append(f"{serial_number} (locked)")
-            elif product.status == 'stolen':
-                invalid_products.append(f"{serial_number} (stolen/snatched)")
-            elif product.status != 'for_sale':
-                invalid_products.append(f"{serial_number} (not for sale)")
-            elif not product.can_be_sold():
-                invalid_products.append(f"{serial_number} (not eligible for sale - holding period not met)")
-            else:
-                valid_products.append(product)
-                product_details.append({
-                    'product': product,
-                    'brand': product.brand.name,
-                    'category': product.category.name,
-                    'name': product.name,
-                    'serial': product.serial_number
-                })
-                print(f"  - Added to valid products")
+        # Verify all serial numbers with one batched query
+        results = verify_serials(parse_serial_numbers(form.serial_numbers.data))
+        invalid_products = describe_rejections(results)
+        valid_products = [product for _, verdict, product in results if verdict == VERDICT_OK]
 
         if invalid_products:
             flash(f'Cannot process: {", ".join(invalid_products)}', 'danger')
@@ -952,27 +1096,17 @@ def verify_product_ajax():
                 'message': 'Serial number is required'
             })
         
-        product = Product.query.filter_by(serial_number=serial_number).first()
+        record = lookup_serial(serial_number)
         
-        if not product:
+        if not record:
             return jsonify({
                 'success': False,
                 'message': 'Product not found in database'
             })
         
-        # Check if the product can be sold based on business logic
-        can_sell = product.can_be_sold()
-        
         return jsonify({
             'success': True,
-            'product': {
-                'name': product.name,
-                'serial_number': product.serial_number,
-                'brand': product.brand.name,
-                'category': product.category.name,
-                'status': product.status,
-                'can_sell': can_sell
-            }
+            'product': record.to_dict()
         })
         
     except Exception as e:
@@ -981,6 +1115,57 @@ def verify_product_ajax():
             'message': 'Error verifying product'
         })
 
+# AJAX Batch Verification Route
+@bp.route('/verify_products_batch', methods=['POST'])
+@login_required
+def verify_products_batch():
+    """AJAX endpoint verifying a whole list of serial numbers in one request"""
+    from flask import jsonify
+    
+    data = request.get_json(silent=True) or {}
+    serial_numbers = data.get('serial_numbers', [])
+    if isinstance(serial_numbers, str):
+        serial_numbers = parse_serial_numbers(serial_numbers)
+    else:
+        serial_numbers = parse_serial_numbers(','.join(str(sn) for sn in serial_numbers))
+    
+    if not serial_numbers:
+        return jsonify({
+            'success': False,
+            'message': 'At least one serial number is required'
+        })
+    
+    max_serials = current_app.config['VERIFICATION_BATCH_LIMIT']
+    if len(serial_numbers) > max_serials:
+        return jsonify({
+            'success': False,
+            'message': f'A maximum of {max_serials} serial numbers can be verified at once'
+        })
+    
+    results = []
+    for serial_number, verdict, product in verify_serials(serial_numbers):
+        result = {
+            'serial_number': serial_number,
+            'verdict': verdict,
+            'message': VERDICT_MESSAGES[verdict],
+            'product': None
+        }
+        if product:
+            result['product'] = {
+                'name': product.name,
+                'serial_number': product.serial_number,
+                'brand': product.brand.name,
+                'category': product.category.name,
+                'status': product.status,
+                'can_sell': verdict == VERDICT_OK
+            }
+        results.append(result)
+    
+    return jsonify({
+        'success': True,
+        'results': results
+    })
+
 # Product Verification Route
 @bp.route('/verify_product', methods=['GET', 'POST'])
 def verify_product():
@@ -989,7 +1174,7 @@ def verify_product():
     product = None
     
     if form.validate_on_submit():
-        product = Product.query.filter_by(serial_number=form.serial_number.data).first()
+        product = lookup_serial(form.serial_number.data.strip())
         if not product:
             flash('Product with this serial number not found in our database.', 'warning')
     
@@ -1016,21 +1201,13 @@ def transfer_ownership():
         seller_id_card = form.seller_id_card.data.strip()
         seller_address = form.seller_address.data.strip()
 
-        # Process serial numbers
-        serial_numbers = [sn.strip() for sn in form.serial_numbers.data.split(',') if sn.strip()]
-        valid_products = []
-        invalid_products = []
-
-        for serial_number in serial_numbers:
-            product = Product.query.filter_by(serial_number=serial_number).first()
-            if not product:
-                invalid_products.append(f"{serial_number} (not found)")
-            elif product.status == 'locked':
-                invalid_products.append(f"{serial_number} (locked)")
-            elif product.status == 'stolen':
-                invalid_products.append(f"{serial_number} (stolen/snatched)")
-            else:
-                valid_products.append(product)
+        # Verify all serial numbers with one batched query; transfers are not
+        # subject to the sale holding period
+        results = verify_serials(parse_serial_numbers(form.serial_numbers.data))
+        invalid_products = describe_rejections(
+            results, allowed=(VERDICT_OK, 'not_for_sale', 'holding_period'))
+        valid_products = [product for _, verdict, product in results
+                          if verdict not in ('not_found', 'locked', 'stolen')]
 
         if invalid_products:
             flash(f'Cannot transfer: {", ".join(invalid_products)}', 'danger')
@@ -1094,13 +1271,13 @@ def admin_ownership_history(product_id):
         return redirect(url_for('main.user_dashboard'))
 
     product = Product.query.get_or_404(product_id)
-    ownership_history = OwnershipHistory.query.filter_by(product_id=product_id).order_by(
-        OwnershipHistory.transfer_date.desc()).all()
+    page = timeline_page(product.id, (OWNERSHIP_TRANSFER,), **request_page_args())
 
-    return render_template('admin_ownership_history.html',
+    return render_template('product_timeline.html',
                          title='Product Ownership History',
                          product=product,
-                         ownership_history=ownership_history)
+                         page=page,
+                         kinds=(OWNERSHIP_TRANSFER,))
 
 # Static Information Pages
 @bp.route('/about')
@@ -1213,7 +1390,11 @@ def reset_password(token):
     
     form = PasswordResetForm()
     if form.validate_on_submit():
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except PasswordHashingBusy as e:
+            flash(str(e), 'warning')
+            return render_template('reset_password.html', title='Reset Password', form=form)
         user.clear_reset_token()
         db.session.commit()
         flash('Your password has been reset successfully!', 'success')
@@ -1226,7 +1407,7 @@ def reset_password(token):
 @login_required
 def export_deal_pdf(deal_id):
     """Export deal as PDF"""
-    deal = Deal.query.get_or_404(deal_id)
+    deal = with_loaders(Deal.query, 'deal_document').filter(Deal.id == deal_id).first_or_404()
     
     # Check if user is involved in this deal or is admin
     if (deal.buyer_id != current_user.id and 
@@ -1235,22 +1416,19 @@ def export_deal_pdf(deal_id):
         flash('You can only export deals you are involved in', 'danger')
         return redirect(url_for('main.user_dashboard'))
     
-    # Generate PDF using ReportLab
-    from flask import make_response
-    from pdf_generator import generate_deal_pdf
-    
+    # Rendered by the PDF worker pool and served from the document cache
     try:
-        pdf_data = generate_deal_pdf(deal)
-        
-        response = make_response(pdf_data)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename=deal_{deal.id}_{deal.created_at.strftime("%Y%m%d")}.pdf'
-        response.headers['Content-Length'] = len(pdf_data)
-        
-        return response
+        path = get_pdf(deal, timeout=current_app.config['PDF_WAIT_SECONDS'])
     except Exception as e:
         flash(f'Error generating PDF: {str(e)}', 'danger')
         return redirect(url_for('main.deal_details', deal_id=deal.id))
+    
+    if path is None:
+        # Still rendering; the page reloads this URL until the file is ready
+        return render_template('pdf_pending.html', title='Preparing PDF', deal=deal), 202
+    
+    return send_file(path, mimetype='application/pdf', as_attachment=True,
+                     download_name=f'deal_{deal.id}_{deal.created_at.strftime("%Y%m%d")}.pdf')
 
 # Sale Deal Completion and Ownership Transfer
 @bp.route('/admin/complete_deal/<int:deal_id>', methods=['POST'])
@@ -1267,28 +1445,12 @@ def complete_deal(deal_id):
         flash('Only approved deals can be completed.', 'danger')
         return redirect(url_for('main.admin_deal_approval'))
     
-    # Complete the deal and transfer ownership
-    for deal_item in deal.deal_items:
-        product = deal_item.product
-        
-        # Record ownership history
-        ownership_record = OwnershipHistory(
-            product_id=product.id,
-            previous_owner_id=product.user_id,
-            new_owner_id=deal.buyer_id,
-            deal_id=deal.id,
-            transfer_type='sale'
-        )
-        db.session.add(ownership_record)
-        
-        # Transfer ownership
-        product.user_id = deal.buyer_id
-    
-    # Update deal status
-    deal.status = 'completed'
-    deal.completed_at = datetime.utcnow()
+    # Complete the deal and transfer any product not yet with the buyer
+    result = complete_deals([deal.id])
+    if not result.succeeded:
+        flash(result.errors[deal.id], 'danger')
+        return redirect(url_for('main.admin_deal_approval'))
     
-    db.session.commit()
     flash('Deal completed successfully! Ownership has been transferred.', 'success')
     return redirect(url_for('main.admin_deal_approval'))
 
@@ -1300,25 +1462,27 @@ def user_ownership_history(product_id):
     product = Product.query.get_or_404(product_id)
     
     # Check if user is current or previous owner
-    recent_history = OwnershipHistory.query.filter_by(product_id=product_id).order_by(
-        OwnershipHistory.transfer_date.desc()).limit(2).all()
+    recent_history = timeline_page(product.id, (OWNERSHIP_TRANSFER,), per_page=2)
+    recent_history.next_cursor = None  # Users only see the last two transfers
     
     user_can_view = False
     if current_user.is_admin:
         user_can_view = True
     elif product.user_id == current_user.id:
         user_can_view = True
-    elif recent_history and len(recent_history) > 1 and recent_history[1].previous_owner_id == current_user.id:
+    elif (len(recent_history) > 1 and recent_history.items[1].from_user is not None
+          and recent_history.items[1].from_user.id == current_user.id):
         user_can_view = True
     
     if not user_can_view:
         flash('You can only view ownership history for products you currently own or previously owned.', 'danger')
         return redirect(url_for('main.user_dashboard'))
     
-    return render_template('user_ownership_history.html',
+    return render_template('product_timeline.html',
                          title='Product Ownership History',
                          product=product,
-                         ownership_history=recent_history)
+                         page=recent_history,
+                         kinds=(OWNERSHIP_TRANSFER,))
 
 def register_routes(app):
     """Register blueprint with the Flask app"""
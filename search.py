@@ -0,0 +1,143 @@
+"""
+Search Index
+Substring search over the identifying fields of products, users and deals.
+
+On SQLite each searchable table has an FTS5 shadow table using the trigram
+tokenizer (product_fts, user_fts, deal_fts), kept in sync by triggers, so a
+'%term%' search becomes an index lookup instead of a table scan. On
+PostgreSQL the same columns carry pg_trgm GIN indexes, which the planner
+uses directly for ILIKE '%term%'. Anywhere the index is missing (a fresh
+db.create_all() database, or terms shorter than one trigram) the API falls
+back to plain ILIKE with identical results.
+
+Run rebuild_search_index.py to install the index on an existing database
+and backfill it.
+"""
+
+import weakref
+
+from sqlalchemy import inspect, literal_column, or_, select, table, column, text
+
+from extensions import db
+from models import User, Product, Deal
+
+# kind -> (model, searchable columns)
+SEARCH_FIELDS = {
+    'product': (Product, ('serial_number',)),
+    'user': (User, ('username', 'mobile_number', 'id_card_number', 'shop_name', 'email')),
+    'deal': (Deal, ('seller_name', 'seller_mobile')),
+}
+
+# Trigram tokens are three characters; shorter terms cannot use the index
+MIN_INDEXED_TERM_LENGTH = 3
+
+# engine -> whether the FTS tables exist; per engine, as in-memory URLs are shared
+_fts_available = weakref.WeakKeyDictionary()
+
+
+def fts_name(kind):
+    """Name of the FTS5 table shadowing a searchable table"""
+    return f'{SEARCH_FIELDS[kind][0].__tablename__}_fts'
+
+
+def sqlite_ddl():
+    """CREATE statements for the FTS5 tables and their sync triggers"""
+    statements = []
+    for kind, (model, fields) in SEARCH_FIELDS.items():
+        source = model.__tablename__
+        fts = fts_name(kind)
+        cols = ', '.join(fields)
+        new_values = ', '.join(f'new.{f}' for f in fields)
+        old_values = ', '.join(f'old.{f}' for f in fields)
+        statements += [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{cols}, content='{source}', content_rowid='id', tokenize='trigram')",
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON "{source}" BEGIN '
+            f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END',
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON "{source}" BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END",
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON "{source}" BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+            f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END',
+        ]
+    return statements
+
+
+def postgres_ddl():
+    """pg_trgm GIN indexes serving ILIKE '%term%' on every searchable column"""
+    statements = ['CREATE EXTENSION IF NOT EXISTS pg_trgm']
+    for model, fields in SEARCH_FIELDS.values():
+        source = model.__tablename__
+        for field in fields:
+            statements.append(
+                f'CREATE INDEX IF NOT EXISTS ix_{source}_{field}_trgm '
+                f'ON "{source}" USING gin ({field} gin_trgm_ops)')
+    return statements
+
+
+def install_search_index(connection):
+    """Create the index structures for the connection's dialect (idempotent)"""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        statements = sqlite_ddl()
+    elif dialect == 'postgresql':
+        statements = postgres_ddl()
+    else:
+        return False
+    for statement in statements:
+        connection.execute(text(statement))
+    _fts_available.clear()
+    return True
+
+
+def rebuild_search_index(connection):
+    """Repopulate the SQLite FTS tables from their content tables
+
+    PostgreSQL trigram indexes are maintained by the database and need no backfill.
+    """
+    if connection.dialect.name != 'sqlite':
+        return []
+    rebuilt = []
+    for kind in SEARCH_FIELDS:
+        fts = fts_name(kind)
+        connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+        rebuilt.append(fts)
+    return rebuilt
+
+
+def fts_enabled():
+    """True when the FTS5 tables exist on the current SQLite database"""
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return False
+    if engine not in _fts_available:
+        tables = set(inspect(engine).get_table_names())
+        _fts_available[engine] = all(fts_name(kind) in tables for kind in SEARCH_FIELDS)
+    return _fts_available[engine]
+
+
+def _fts_phrase(term, fields):
+    """FTS5 query matching term as a substring of any of the given columns"""
+    phrase = '"' + term.replace('"', '""') + '"'
+    return '{' + ' '.join(fields) + '} : ' + phrase
+
+
+def matching_ids(kind, term, fields=None):
+    """SELECT of primary keys of `kind` rows where any field contains term
+
+    Case-insensitive substring match; the result is meant to be used inside
+    an IN (...) filter so it composes with other predicates and pagination.
+    """
+    model, all_fields = SEARCH_FIELDS[kind]
+    fields = tuple(fields or all_fields)
+    unknown = set(fields) - set(all_fields)
+    if unknown:
+        raise ValueError(f'Fields not indexed for {kind}: {", ".join(sorted(unknown))}')
+
+    if len(term) >= MIN_INDEXED_TERM_LENGTH and fts_enabled():
+        fts = table(fts_name(kind), column('rowid'))
+        return select(fts.c.rowid).where(
+            literal_column(fts_name(kind)).op('MATCH')(_fts_phrase(term, fields)))
+
+    pattern = f'%{term}%'
+    return select(model.id).where(or_(*[getattr(model, f).ilike(pattern) for f in fields]))
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Synthetic registry data at benchmark scale.
+
+Fills an empty database with users, products, deals and their status and
+ownership history, shaped like production data: most products for sale,
+some locked or stolen, deals in every status with one to three items, and
+completed deals that moved the product to the buyer. Everything is
+generated from a seed, so the same scale gives the same rows on every
+commit, and written with multi-row INSERTs in batches. The counters and the
+search index are brought up to date at the end.
+
+    python synthetic_data.py --scale 100k --db /tmp/registry_100k.db
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from counters import reconcile_counters, reconcile_product_counts
+from extensions import db
+from models import User, Category, Brand, Product, Deal, DealItem, ProductStatusHistory, OwnershipHistory
+import password_policy
+from search import install_search_index, rebuild_search_index
+
+# Products per scale; users, deals and history rows are derived from it
+SCALES = {
+    '1k': 1000,
+    '10k': 10000,
+    '100k': 100000,
+    '1m': 1000000,
+}
+
+BATCH_SIZE = 10000
+
+# Every generated account logs in with this password
+PASSWORD = 'bench-password'
+ADMIN_USERNAME = 'bench_admin'
+
+CATEGORIES = ['Camera', 'Lens', 'Light', 'Audio', 'Accessories', 'Drone', 'Gimbal', 'Monitor']
+BRANDS = ['Canon', 'Nikon', 'Sony', 'Fujifilm', 'Panasonic', 'Godox', 'Manfrotto', 'DJI',
+          'Sigma', 'Tamron', 'Rode', 'Aputure', 'Blackmagic', 'Atomos', 'Zhiyun']
+
+PRODUCT_STATUSES = ['for_sale'] * 18 + ['locked', 'stolen']
+DEAL_STATUSES = ['pending'] * 8 + ['approved'] * 3 + ['rejected'] * 2 + ['completed'] * 7
+
+
+def dataset_size(products):
+    """Row counts generated for a number of products"""
+    return {
+        'products': products,
+        'users': max(20, products // 10),
+        'deals': max(10, products // 4),
+    }
+
+
+def _insert_batches(model, rows, batch_size):
+    """Insert an iterable of row dicts in batches of batch_size; returns the row count"""
+    batch = []
+    count = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            db.session.execute(insert(model), batch)
+            db.session.commit()
+            count += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(model), batch)
+        db.session.commit()
+        count += len(batch)
+    return count
+
+
+def _plan(sizes, rng, now):
+    """Owners, creation times and deals, decided before anything is written
+
+    Product and user ids are 1-based positions, as they will be in an empty
+    database. Completed deals with a registered seller move their products
+    to the buyer, so owners are final only once the deals are planned.
+    """
+    num_users, num_products, num_deals = sizes['users'], sizes['products'], sizes['deals']
+    # User 1 is the admin; regular users and shopkeepers follow
+    shopkeepers = set(rng.sample(range(2, num_users + 2), max(1, num_users // 7)))
+    owners = [rng.randint(2, num_users + 1) for _ in range(num_products)]
+    original_owners = list(owners)
+    created = [now - timedelta(days=rng.uniform(4, 730)) for _ in range(num_products)]
+    statuses = [rng.choice(PRODUCT_STATUSES) for _ in range(num_products)]
+
+    deals = []
+    transfers = []
+    for deal_id in range(1, num_deals + 1):
+        product_ids = rng.sample(range(1, num_products + 1), rng.choice((1, 1, 1, 2, 3)))
+        first = product_ids[0] - 1
+        seller_id = owners[first] if rng.random() < 0.7 else None
+        buyer_id = rng.randint(2, num_users + 1)
+        while buyer_id == seller_id:
+            buyer_id = rng.randint(2, num_users + 1)
+        status = rng.choice(DEAL_STATUSES)
+        age = (now - created[first]).total_seconds()
+        created_at = now - timedelta(seconds=rng.uniform(0, age))
+        deals.append((deal_id, status, seller_id, buyer_id, created_at, product_ids))
+
+        if status == 'completed' and seller_id is not None:
+            for product_id in product_ids:
+                if owners[product_id - 1] == seller_id:
+                    transfers.append((product_id, seller_id, buyer_id, deal_id, created_at))
+                    owners[product_id - 1] = buyer_id
+    return shopkeepers, owners, original_owners, created, statuses, deals, transfers
+
+
+def generate_dataset(products=10000, batch_size=BATCH_SIZE, seed=42, search_index=True, report=print):
+    """Fill the current app's (empty) database; returns the row count per table"""
+    if db.session.scalar(select(func.count(Product.id))):
+        raise ValueError('The database already has products; generate into an empty database.')
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    sizes = dataset_size(products)
+    num_users = sizes['users']
+    started = time.perf_counter()
+    counts = {}
+
+    def done(table, count):
+        report(f'{table}: {count} rows ({time.perf_counter() - started:.1f}s)')
+        counts[table] = count
+
+    shopkeepers, owners, original_owners, created, statuses, deals, transfers = _plan(sizes, rng, now)
+
+    done('category', _insert_batches(Category, ({'name': name} for name in CATEGORIES), batch_size))
+    done('brand', _insert_batches(Brand, ({'name': name} for name in BRANDS), batch_size))
+
+    # One hash for everyone: hashing per user would dominate generation
+    password_hash = password_policy.hash_password(PASSWORD)
+    admin = {
+        'username': ADMIN_USERNAME, 'email': 'bench_admin@example.com', 'mobile_number': '03000000000',
+        'id_card_number': '99999-0000000-0', 'password_hash': password_hash,
+        'is_admin': True, 'can_create_admins': True, 'shopkeeper_approved': True,
+        'created_at': now - timedelta(days=800)
+    }
+
+    def users():
+        yield admin
+        for user_id in range(2, num_users + 2):
+            shopkeeper = user_id in shopkeepers
+            yield {
+                'username': f'bench_user_{user_id}',
+                'email': f'bench_user_{user_id}@example.com',
+                'mobile_number': f'03{user_id:09d}',
+                'id_card_number': f'{35200 + user_id % 100:05d}-{user_id:07d}-{user_id % 10}',
+                'shop_name': f'Bench Shop {user_id}' if shopkeeper else None,
+                'password_hash': password_hash,
+                'is_shopkeeper': shopkeeper,
+                'shopkeeper_approved': not shopkeeper or rng.random() < 0.9,
+                'has_subscription': rng.random() < 0.1,
+                'created_at': now - timedelta(days=rng.uniform(1, 800))
+            }
+
+    done('user', _insert_batches(User, users(), batch_size))
+
+    def products_rows():
+        for i in range(products):
+            brand = BRANDS[i % len(BRANDS)]
+            category = CATEGORIES[(i // len(BRANDS)) % len(CATEGORIES)]
+            yield {
+                'name': f'{brand} {category} {rng.randint(100, 9999)}',
+                'serial_number': f'SN-{brand[:3].upper()}-{i + 1:08d}',
+                'status': statuses[i],
+                'user_id': owners[i],
+                'original_owner_id': original_owners[i],
+                'category_id': CATEGORIES.index(category) + 1,
+                'brand_id': BRANDS.index(brand) + 1,
+                'created_at': created[i],
+                'updated_at': created[i]
+            }
+
+    done('product', _insert_batches(Product, products_rows(), batch_size))
+
+    def status_rows():
+        for i in range(products):
+            yield {'product_id': i + 1, 'old_status': None, 'new_status': 'for_sale',
+                   'changed_at': created[i], 'changed_by': original_owners[i]}
+            if statuses[i] != 'for_sale':
+                yield {'product_id': i + 1, 'old_status': 'for_sale', 'new_status': statuses[i],
+                       'changed_at': created[i] + (now - created[i]) / 2, 'changed_by': owners[i]}
+
+    done('product_status_history', _insert_batches(ProductStatusHistory, status_rows(), batch_size))
+
+    def deal_rows():
+        for deal_id, status, seller_id, buyer_id, created_at, product_ids in deals:
+            walk_in = seller_id is None
+            decided = status != 'pending'
+            yield {
+                'status': status,
+                'total_amount': 0.0,
+                'description': f'Deal for {len(product_ids)} product(s)',
+                'seller_id': seller_id,
+                'buyer_id': buyer_id,
+                'seller_name': f'Walk-in Seller {deal_id}' if walk_in else None,
+                'seller_mobile': f'0345{deal_id:07d}' if walk_in else None,
+                'seller_id_card': f'42101-{deal_id:07d}-1' if walk_in else None,
+                'seller_address': f'Shop {deal_id % 500}, Hall Road, Lahore' if walk_in else None,
+                'approved_by': 1 if decided else None,
+                'approved_at': created_at + timedelta(hours=2) if decided else None,
+                'created_at': created_at,
+                'completed_at': created_at + timedelta(days=1) if status == 'completed' else None
+            }
+
+    done('deal', _insert_batches(Deal, deal_rows(), batch_size))
+    done('deal_item', _insert_batches(DealItem, ({
+        'deal_id': deal_id, 'product_id': product_id, 'price': 0.0
+    } for deal_id, _, _, _, _, product_ids in deals for product_id in product_ids), batch_size))
+    done('ownership_history', _insert_batches(OwnershipHistory, ({
+        'product_id': product_id, 'previous_owner_id': seller_id, 'new_owner_id': buyer_id,
+        'deal_id': deal_id, 'transfer_date': transferred_at, 'transfer_type': 'sale'
+    } for product_id, seller_id, buyer_id, deal_id, transferred_at in transfers), batch_size))
+
+    # The inserts bypass the ORM, so the counters are recounted in bulk
+    reconcile_counters()
+    reconcile_product_counts()
+    if search_index:
+        with db.engine.begin() as connection:
+            if install_search_index(connection):
+                rebuild_search_index(connection)
+    report(f'Done in {time.perf_counter() - started:.1f}s')
+    return counts
+
+
+if __name__ == '__main__':
+    from benchmark_common import create_benchmark_app
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scale', choices=SCALES, default='10k')
+    parser.add_argument('--db', help='SQLite file to (re)create; a temporary file by default')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    app, db_path = create_benchmark_app(args.db)
+    with app.app_context():
+        generate_dataset(SCALES[args.scale], args.batch_size, args.seed)
+    print(f'Database: {db_path}')
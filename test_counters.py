@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Registry counters: the totals kept in registry_stat and each user's
+product_count follow every ORM insert, delete, transfer and status change,
+and reconcile_counters() / reconcile_product_counts() repair what bulk
+statements leave behind"""
+
+import sys
+import os
+
+from sqlalchemy import func, insert, select, update
+
+# Add the project directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from counters import (get_counters, reconcile_counters, reconcile_product_counts, COUNTER_QUERIES,
+                      TOTAL_USERS, TOTAL_PRODUCTS, TOTAL_DEALS, STOLEN_PRODUCTS)
+from extensions import db
+from models import User, Category, Brand, Product, Deal
+from test_query_counts import build_app
+
+
+def build_counter_app():
+    app = build_app(2)
+    with app.app_context():
+        # build_app creates the schema without seeding the counters
+        assert set(reconcile_counters()) == set(COUNTER_QUERIES)
+    return app
+
+
+def live_counts():
+    return {name: query().scalar() for name, query in COUNTER_QUERIES.items()}
+
+
+def assert_counters_match_live():
+    assert get_counters() == live_counts()
+    for user_id, stored in db.session.execute(select(User.id, User.product_count)).all():
+        actual = db.session.scalar(select(func.count(Product.id)).where(Product.user_id == user_id))
+        assert stored == actual, f'user {user_id}: product_count {stored}, owns {actual}'
+    assert reconcile_counters() == {}
+    assert reconcile_product_counts() == {}
+
+
+def new_product(owner, serial, status='for_sale'):
+    category = db.session.scalar(select(Category))
+    brand = db.session.scalar(select(Brand))
+    return Product(name=f'Product {serial}', serial_number=serial, status=status,
+                   user_id=owner.id, category_id=category.id, brand_id=brand.id)
+
+
+def test_counters_follow_orm_changes():
+    app = build_counter_app()
+    with app.app_context():
+        before = get_counters()
+        user = User.query.filter_by(username='user').first()
+        shopkeeper = User.query.filter_by(username='shopkeeper').first()
+
+        db.session.add_all([new_product(user, 'CNT-1'), new_product(user, 'CNT-2', 'stolen')])
+        db.session.add(User(username='counted', email='counted@example.com', mobile_number='03000000020',
+                            id_card_number='35202-0000020-1', password_hash='x'))
+        db.session.add(Deal(buyer_id=shopkeeper.id, seller_id=user.id))
+        db.session.commit()
+        assert_counters_match_live()
+        after = get_counters()
+        assert after[TOTAL_PRODUCTS] == before[TOTAL_PRODUCTS] + 2
+        assert after[STOLEN_PRODUCTS] == before[STOLEN_PRODUCTS] + 1
+        assert after[TOTAL_USERS] == before[TOTAL_USERS] + 1
+        assert after[TOTAL_DEALS] == before[TOTAL_DEALS] + 1
+
+        # Status changes in both directions, a transfer, a promotion and deletions
+        Product.query.filter_by(serial_number='CNT-1').one().status = 'stolen'
+        Product.query.filter_by(serial_number='CNT-2').one().status = 'for_sale'
+        Product.query.filter_by(serial_number='CNT-2').one().user_id = shopkeeper.id
+        User.query.filter_by(username='counted').one().is_admin = True
+        db.session.commit()
+        assert_counters_match_live()
+
+        db.session.delete(Product.query.filter_by(serial_number='CNT-1').one())
+        db.session.delete(Deal.query.first())
+        db.session.commit()
+        assert_counters_match_live()
+
+
+def test_rolled_back_changes_leave_counters_alone():
+    app = build_counter_app()
+    with app.app_context():
+        before = get_counters()
+        user = User.query.filter_by(username='user').first()
+        db.session.add(new_product(user, 'CNT-ROLLBACK', 'stolen'))
+        db.session.flush()
+        db.session.rollback()
+        assert get_counters() == before
+        assert_counters_match_live()
+
+
+def test_reconcile_repairs_bulk_drift():
+    app = build_counter_app()
+    with app.app_context():
+        stored = get_counters()
+        user = User.query.filter_by(username='user').first()
+        owned = user.product_count
+        template = new_product(user, 'CNT-BULK-0', 'stolen')
+        # Core INSERTs bypass the flush listener
+        db.session.execute(insert(Product), [{
+            'name': template.name, 'serial_number': f'CNT-BULK-{i}', 'status': 'stolen',
+            'user_id': user.id, 'category_id': template.category_id, 'brand_id': template.brand_id
+        } for i in range(3)])
+        db.session.commit()
+        assert get_counters() == stored
+
+        drift = reconcile_counters()
+        assert drift == {
+            TOTAL_PRODUCTS: (stored[TOTAL_PRODUCTS], stored[TOTAL_PRODUCTS] + 3),
+            STOLEN_PRODUCTS: (stored[STOLEN_PRODUCTS], stored[STOLEN_PRODUCTS] + 3),
+        }
+        assert reconcile_product_counts() == {user.id: (owned, owned + 3)}
+        assert_counters_match_live()
+
+
+def test_loaded_owner_sees_its_new_product_count():
+    app = build_counter_app()
+    with app.app_context():
+        user = User.query.filter_by(username='user').first()
+        shopkeeper = User.query.filter_by(username='shopkeeper').first()
+        owned, shop_owned = user.product_count, shopkeeper.product_count
+
+        db.session.add(new_product(user, 'CNT-QUOTA'))
+        db.session.flush()
+        # Loaded owners are updated in place, so the quota check in the same request is exact
+        assert user.product_count == owned + 1
+
+        Product.query.filter_by(serial_number='CNT-QUOTA').one().user_id = shopkeeper.id
+        db.session.flush()
+        assert (user.product_count, shopkeeper.product_count) == (owned, shop_owned + 1)
+        db.session.commit()
+        assert_counters_match_live()
+
+
+def test_reconcile_repairs_product_counts():
+    app = build_counter_app()
+    with app.app_context():
+        user = User.query.filter_by(username='user').first()
+        shopkeeper = User.query.filter_by(username='shopkeeper').first()
+        owned, shop_owned = user.product_count, shopkeeper.product_count
+        # A Core UPDATE moves every product of the user without touching the counts
+        db.session.execute(update(Product).where(Product.user_id == user.id).values(user_id=shopkeeper.id)
+                           .execution_options(synchronize_session=False))
+        db.session.commit()
+
+        assert reconcile_product_counts() == {
+            user.id: (owned, 0),
+            shopkeeper.id: (shop_owned, shop_owned + owned),
+        }
+        assert_counters_match_live()
+
+
+if __name__ == "__main__":
+    test_counters_follow_orm_changes()
+    test_rolled_back_changes_leave_counters_alone()
+    test_reconcile_repairs_bulk_drift()
+    test_loaded_owner_sees_its_new_product_count()
+    test_reconcile_repairs_product_counts()
+    print("=== Registry counters checks passed ===")
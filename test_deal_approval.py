@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Deal approval: set-based approval moves each product once, writes its
+ownership history, keeps the counters exact and never processes a deal
+twice, even when two approvals race"""
+
+import sys
+import os
+
+from sqlalchemy import func, select
+
+# Add the project directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from counters import get_counters, reconcile_counters, reconcile_product_counts, COUNTER_QUERIES
+from extensions import db
+from models import User, Product, Deal, DealItem, OwnershipHistory
+import deal_approval
+from deal_approval import approve_deals, complete_deals
+from test_query_counts import build_app
+
+
+def build_approval_app():
+    app = build_app(2)
+    with app.app_context():
+        reconcile_counters()
+    return app
+
+
+def ids():
+    """{username: id}"""
+    return dict(db.session.execute(select(User.username, User.id)).all())
+
+
+def products_of(username):
+    return db.session.scalars(select(Product.id).join(User, User.id == Product.user_id)
+                              .where(User.username == username).order_by(Product.id)).all()
+
+
+def add_deal(seller_id, buyer_id, product_ids, status='pending'):
+    deal = Deal(status=status, seller_id=seller_id, buyer_id=buyer_id, total_amount=0.0)
+    db.session.add(deal)
+    db.session.flush()
+    for product_id in product_ids:
+        db.session.add(DealItem(deal_id=deal.id, product_id=product_id, price=0.0))
+    db.session.commit()
+    return deal.id
+
+
+def owner_of(product_id):
+    return db.session.scalar(select(Product.user_id).where(Product.id == product_id))
+
+
+def history_count():
+    return db.session.scalar(select(func.count(OwnershipHistory.id)))
+
+
+def assert_counts_match_live():
+    """Stored counters and per-user product counts equal a fresh count"""
+    live = {name: query().scalar() for name, query in COUNTER_QUERIES.items()}
+    assert get_counters() == live
+    for user_id, stored in db.session.execute(select(User.id, User.product_count)).all():
+        actual = db.session.scalar(select(func.count(Product.id)).where(Product.user_id == user_id))
+        assert stored == actual, f'user {user_id}: product_count {stored}, owns {actual}'
+    assert reconcile_counters() == {}
+    assert reconcile_product_counts() == {}
+
+
+def test_approve_one_deal_twice():
+    app = build_approval_app()
+    with app.app_context():
+        users = ids()
+        product_id = products_of('user')[0]
+        deal_id = add_deal(users['user'], users['shopkeeper'], [product_id])
+
+        first = approve_deals([deal_id], users['admin'])
+        second = approve_deals([deal_id], users['admin'])
+
+        assert first.succeeded == [deal_id] and not first.errors
+        assert second.succeeded == [] and 'approved, not pending' in second.errors[deal_id]
+        assert owner_of(product_id) == users['shopkeeper']
+        assert history_count() == 1
+        assert_counts_match_live()
+
+
+def test_concurrent_approval_is_applied_once():
+    app = build_approval_app()
+    with app.app_context():
+        users = ids()
+        product_id = products_of('user')[0]
+        deal_id = add_deal(users['user'], users['shopkeeper'], [product_id])
+
+        # Another request approves the deal between this one's check and its claim
+        check_deals = deal_approval._check_deals
+
+        def check_then_race(deal_ids, expected_status):
+            result = check_deals(deal_ids, expected_status)
+            with db.engine.begin() as connection:
+                connection.execute(db.update(Deal).where(Deal.id == deal_id).values(status='approved'))
+            return result
+
+        deal_approval._check_deals = check_then_race
+        try:
+            result = approve_deals([deal_id], users['admin'])
+        finally:
+            deal_approval._check_deals = check_deals
+
+        assert result.succeeded == []
+        assert 'already processed' in result.errors[deal_id]
+        # Rolled back: the product did not move and no history was written by this request
+        assert owner_of(product_id) == users['user']
+        assert history_count() == 0
+        assert_counts_match_live()
+
+
+def test_mixed_batch():
+    app = build_approval_app()
+    with app.app_context():
+        users = ids()
+        user_products = products_of('user')
+        shop_products = products_of('shopkeeper')
+
+        sale = add_deal(users['user'], users['shopkeeper'], [user_products[0]])
+        pair = add_deal(users['shopkeeper'], users['user'], shop_products)
+        rejected = add_deal(users['user'], users['owner0'], [user_products[1]], status='rejected')
+        clash = add_deal(users['user'], users['owner1'], [user_products[0]])
+        missing = clash + 100
+
+        result = approve_deals([sale, pair, rejected, clash, missing], users['admin'], 'batch')
+
+        assert result.succeeded == [sale, pair]
+        assert set(result.errors) == {rejected, clash, missing}
+        assert 'not found' in result.errors[missing]
+        assert 'rejected, not pending' in result.errors[rejected]
+        assert f'deal #{sale}' in result.errors[clash]
+
+        assert owner_of(user_products[0]) == users['shopkeeper']
+        assert [owner_of(p) for p in shop_products] == [users['user']] * len(shop_products)
+        assert owner_of(user_products[1]) == users['user']
+        statuses = dict(db.session.execute(select(Deal.id, Deal.status)).all())
+        assert statuses == {sale: 'approved', pair: 'approved', rejected: 'rejected', clash: 'pending'}
+
+        history = db.session.execute(select(OwnershipHistory.deal_id, OwnershipHistory.product_id,
+                                            OwnershipHistory.previous_owner_id, OwnershipHistory.new_owner_id)
+                                     .order_by(OwnershipHistory.id)).all()
+        assert sorted(history) == sorted(
+            [(sale, user_products[0], users['user'], users['shopkeeper'])] +
+            [(pair, p, users['shopkeeper'], users['user']) for p in shop_products])
+        assert_counts_match_live()
+
+        # Completing moves nothing more: every product is already with its buyer
+        completed = complete_deals([sale, pair])
+        assert completed.succeeded == [sale, pair]
+        assert history_count() == len(history)
+        assert_counts_match_live()
+
+
+if __name__ == "__main__":
+    test_approve_one_deal_twice()
+    test_concurrent_approval_is_applied_once()
+    test_mixed_batch()
+    print("=== Deal approval checks passed ===")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Migration chain: upgrading the shipped database to head must keep the
+search index in sync, so FTS and ILIKE find the same rows afterwards"""
+
+import sys
+import os
+import shutil
+import tempfile
+
+from flask_migrate import upgrade, downgrade
+from sqlalchemy import select
+
+# Add the project directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from extensions import db
+from models import User, Category, Brand, Product
+from search import SEARCH_FIELDS, fts_enabled, matching_ids
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SHIPPED_DB = os.path.join(BASE_DIR, 'instance', 'product_registry.db')
+MIGRATIONS = os.path.join(BASE_DIR, 'migrations')
+
+SERIAL = 'MIGRATED-SERIAL-0001'
+
+
+def ilike_ids(kind, term):
+    model, fields = SEARCH_FIELDS[kind]
+    pattern = f'%{term}%'
+    return set(db.session.scalars(select(model.id).where(
+        db.or_(*[getattr(model, field).ilike(pattern) for field in fields]))))
+
+
+def assert_search_in_sync(terms):
+    assert fts_enabled()
+    for kind, term in terms:
+        found = set(db.session.scalars(matching_ids(kind, term)))
+        assert found == ilike_ids(kind, term), f'{kind} "{term}": FTS {found}, ILIKE {ilike_ids(kind, term)}'
+
+
+def test_upgrade_keeps_search_index_in_sync():
+    directory = tempfile.mkdtemp(prefix='registry_migrations_')
+    path = os.path.join(directory, 'registry.db')
+    shutil.copy(SHIPPED_DB, path)
+    try:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'TESTING': True})
+        with app.app_context():
+            upgrade(directory=MIGRATIONS)
+            owner = db.session.scalars(select(User)).first()
+            owner_id = owner.id
+            category = Category(name='Migration Category')
+            brand = Brand(name='Migration Brand')
+            db.session.add_all([category, brand])
+            db.session.flush()
+            db.session.add(Product(name='Migrated', serial_number=SERIAL, user_id=owner.id,
+                                   category_id=category.id, brand_id=brand.id))
+            db.session.commit()
+
+            terms = [('product', SERIAL[3:12]), ('product', 'SN'), ('user', owner.username[:3])]
+            assert_search_in_sync(terms)
+            assert db.session.scalars(matching_ids('product', SERIAL)).all()
+
+            # Down one step and back: the product table is rebuilt on SQLite
+            downgrade(directory=MIGRATIONS, revision='-1')
+            upgrade(directory=MIGRATIONS)
+            db.session.execute(db.update(Product).where(Product.serial_number == SERIAL)
+                               .values(serial_number=SERIAL + '-B'))
+            db.session.commit()
+            assert_search_in_sync(terms + [('product', 'SERIAL-0001-B')])
+
+            # Down past add_user_product_count, which rebuilds the user table
+            db.session.remove()
+            downgrade(directory=MIGRATIONS, revision='add_registry_stat')
+            upgrade(directory=MIGRATIONS)
+            db.session.execute(db.update(User).where(User.id == owner_id).values(username='migrated_owner'))
+            db.session.commit()
+            assert_search_in_sync(terms + [('user', 'migrated_own')])
+            db.session.remove()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_upgrade_keeps_search_index_in_sync()
+    print("=== Migrations keep the search index in sync ===")
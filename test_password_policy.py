@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Password policy: a login under an old hashing method upgrades the stored
+hash, a saturated hashing pool answers with a retry message, and every app
+gets a pool of its own size"""
+
+import sys
+import os
+import threading
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Add the project directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extensions import db
+from models import User
+import password_policy
+from test_query_counts import build_app
+
+PASSWORD = 'policy-password'
+# Cheap methods keep the test fast; only the difference between them matters
+OLD_METHOD = 'pbkdf2:sha256:1000'
+NEW_METHOD = 'pbkdf2:sha256:2000'
+
+
+def build_policy_app(**config):
+    app = build_app(0)
+    app.config.update(PASSWORD_HASH_METHOD=NEW_METHOD, **config)
+    with app.app_context():
+        user = User.query.filter_by(username='user').first()
+        user.password_hash = generate_password_hash(PASSWORD, OLD_METHOD)
+        db.session.commit()
+    return app
+
+
+def stored_hash(app):
+    with app.app_context():
+        return User.query.filter_by(username='user').first().password_hash
+
+
+def login(app):
+    return app.test_client().post('/login', data={'username': 'user', 'password': PASSWORD})
+
+
+def test_login_upgrades_hash_to_current_method():
+    app = build_policy_app()
+    assert login(app).status_code == 302
+
+    password_hash = stored_hash(app)
+    assert password_hash.startswith(NEW_METHOD + '$'), password_hash
+    assert check_password_hash(password_hash, PASSWORD)
+
+
+def while_pool_busy(app, request):
+    """Response of request(client) sent while the app's only hashing worker is occupied"""
+    release = threading.Event()
+    with app.app_context():
+        password_policy._get_executor().submit(release.wait)
+    try:
+        return request(app.test_client())
+    finally:
+        release.set()
+
+
+def assert_asked_to_retry(response):
+    assert response.status_code == 200
+    assert b'Too many password checks at once' in response.data
+
+
+def build_busy_app():
+    return build_policy_app(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_TIMEOUT=0.05)
+
+
+def test_busy_hashing_pool_asks_to_retry():
+    app = build_busy_app()
+    assert_asked_to_retry(while_pool_busy(
+        app, lambda client: client.post('/login', data={'username': 'user', 'password': PASSWORD})))
+    assert stored_hash(app).startswith(OLD_METHOD + '$')
+
+
+def test_busy_pool_on_register():
+    app = build_busy_app()
+    assert_asked_to_retry(while_pool_busy(app, lambda client: client.post('/register', data={
+        'username': 'newcomer', 'email': 'newcomer@example.com', 'mobile_number': '03000000010',
+        'id_card_number': '35202-0000010-1', 'password': PASSWORD, 'password2': PASSWORD,
+        'user_type': 'user'})))
+    with app.app_context():
+        assert User.query.filter_by(username='newcomer').first() is None
+
+
+def test_busy_pool_on_create_admin():
+    app = build_busy_app()
+    with app.app_context():
+        admin = User.query.filter_by(username='admin').first()
+        admin.can_create_admins = True
+        db.session.commit()
+        admin_id = admin.id
+
+    def create_admin(client):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin_id)
+            session['_fresh'] = True
+        return client.post('/admin/create_admin', data={
+            'username': 'second_admin', 'email': 'second@example.com', 'mobile_number': '03000000011',
+            'id_card_number': '35202-0000011-1', 'password': PASSWORD, 'password2': PASSWORD,
+            'role': 'limited'})
+
+    assert_asked_to_retry(while_pool_busy(app, create_admin))
+    with app.app_context():
+        assert User.query.filter_by(username='second_admin').first() is None
+
+
+def test_busy_pool_on_reset_password():
+    app = build_busy_app()
+    with app.app_context():
+        token = User.query.filter_by(username='user').first().generate_reset_token()
+        db.session.commit()
+
+    assert_asked_to_retry(while_pool_busy(app, lambda client: client.post(
+        f'/reset_password/{token}', data={'password': 'another-password', 'password2': 'another-password'})))
+    with app.app_context():
+        # The token stays usable for another try
+        assert User.query.filter_by(username='user').first().reset_token == token
+    assert stored_hash(app).startswith(OLD_METHOD + '$')
+
+
+def test_each_app_has_its_own_pool():
+    small = build_policy_app(PASSWORD_HASH_WORKERS=1)
+    large = build_policy_app(PASSWORD_HASH_WORKERS=4)
+    with small.app_context():
+        small_pool = password_policy._get_executor()
+    with large.app_context():
+        large_pool = password_policy._get_executor()
+
+    assert small_pool is not large_pool
+    assert small_pool._max_workers == 1
+    assert large_pool._max_workers == 4
+
+
+if __name__ == "__main__":
+    test_login_upgrades_hash_to_current_method()
+    test_busy_hashing_pool_asks_to_retry()
+    test_busy_pool_on_register()
+    test_busy_pool_on_create_admin()
+    test_busy_pool_on_reset_password()
+    test_each_app_has_its_own_pool()
+    print("=== Password policy checks passed ===")
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Stored deal documents: the date printed on a document is part of its
+cache key, so a document issued yesterday is never served today"""
+
+import base64
+import re
+import sys
+import os
+import zlib
+
+# Add the project directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pdf_queue
+from extensions import db
+from models import User, Product, Deal, DealItem
+from pdf_generator import render_deal_pdf
+from pdf_queue import cache_path, deal_snapshot, document_key
+from test_query_counts import build_app
+
+
+def page_text(pdf):
+    """Decoded content streams of a ReportLab PDF (ASCII85 then Flate)"""
+    streams = re.findall(rb'stream\r?\n(.*?)endstream', pdf, re.S)
+    return b''.join(zlib.decompress(base64.a85decode(s.strip(), adobe=True)) for s in streams)
+
+
+def build_pdf_app(tmp_path):
+    app = build_app(1)
+    app.config['PDF_CACHE_DIR'] = str(tmp_path)
+    with app.app_context():
+        user = User.query.filter_by(username='user').first()
+        shopkeeper = User.query.filter_by(username='shopkeeper').first()
+        deal = Deal(buyer_id=shopkeeper.id, seller_id=user.id)
+        db.session.add(deal)
+        db.session.flush()
+        product = Product.query.filter_by(user_id=user.id).first()
+        db.session.add(DealItem(deal_id=deal.id, product_id=product.id, price=100.0))
+        db.session.commit()
+    return app
+
+
+def test_issue_date_is_printed_and_keyed(tmp_path, monkeypatch):
+    app = build_pdf_app(tmp_path)
+    with app.app_context():
+        deal = Deal.query.first()
+
+        monkeypatch.setattr(pdf_queue, 'issue_date', lambda: '2024-01-01')
+        first = deal_snapshot(deal)
+        assert document_key(deal_snapshot(deal)) == document_key(first)
+
+        monkeypatch.setattr(pdf_queue, 'issue_date', lambda: '2024-01-02')
+        second = deal_snapshot(deal)
+        assert cache_path(deal.id, document_key(second)) != cache_path(deal.id, document_key(first))
+
+    # Both the header date and the footer stamp come from the snapshot
+    text = page_text(render_deal_pdf(first))
+    assert b'Date: 2024-01-01' in text
+    assert b'Document generated on: 2024-01-01' in text
+    assert page_text(render_deal_pdf(second)).count(b'2024-01-02') == 2
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Cached principals must follow changes to their user: admin actions that
+change a user take effect on that user's next request in the same process"""
+
+import sys
+import os
+
+# Add the project directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extensions import db
+from models import User
+import principal
+from version_stamp import read_stamp, bump_stamp
+from test_query_counts import build_app
+
+
+def user_id(app, username):
+    with app.app_context():
+        return User.query.filter_by(username=username).first().id
+
+
+def login(app, username):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id(app, username))
+        session['_fresh'] = True
+    return client
+
+
+def is_cached(app, username):
+    with app.app_context():
+        version = read_stamp(app.config['PRINCIPAL_VERSION_FILE'])
+        return principal._cache().get(user_id(app, username), version)[0]
+
+
+def update_user(app, username, **values):
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        for name, value in values.items():
+            setattr(user, name, value)
+        db.session.commit()
+
+
+def test_demoted_admin_loses_admin_pages():
+    app = build_app(1)
+    admin = login(app, 'admin')
+    assert admin.get('/admin/stolen_report').status_code == 200
+    assert is_cached(app, 'admin')
+
+    update_user(app, 'admin', is_admin=False)
+    assert admin.get('/admin/stolen_report').status_code == 302
+
+
+def test_demotion_in_another_worker_reaches_this_one():
+    app = build_app(1)
+    admin = login(app, 'admin')
+    assert admin.get('/admin/stolen_report').status_code == 200
+
+    # Another worker's commit: the row changes behind this process's ORM and the stamp is bumped
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(db.update(User).where(User.username == 'admin').values(is_admin=False))
+    assert admin.get('/admin/stolen_report').status_code == 200, 'principal was not cached'
+    bump_stamp(app.config['PRINCIPAL_VERSION_FILE'])
+    assert admin.get('/admin/stolen_report').status_code == 302
+
+
+def test_approve_shopkeeper_evicts_principal():
+    app = build_app(1)
+    update_user(app, 'shopkeeper', shopkeeper_approved=False)
+    shopkeeper = login(app, 'shopkeeper')
+    assert shopkeeper.get('/register_product').status_code == 302
+    assert is_cached(app, 'shopkeeper')
+
+    admin = login(app, 'admin')
+    response = admin.post(f'/admin/approve_shopkeeper/{user_id(app, "shopkeeper")}', data={'action': 'approve'})
+    assert response.status_code == 302
+    assert shopkeeper.get('/register_product').status_code == 200
+
+
+def test_edit_user_evicts_principal():
+    app = build_app(1)
+    shopkeeper = login(app, 'shopkeeper')
+    assert shopkeeper.get('/register_product').status_code == 200
+    assert is_cached(app, 'shopkeeper')
+
+    admin = login(app, 'admin')
+    # shopkeeper_approved left out of the form: the edit revokes approval
+    response = admin.post(f'/admin/edit_user/{user_id(app, "shopkeeper")}', data={
+        'username': 'shopkeeper', 'email': 'shop@example.com', 'mobile_number': '03000000002'})
+    assert response.status_code == 302
+    assert shopkeeper.get('/register_product').status_code == 302
+
+
+def test_create_admin_principal_is_current():
+    app = build_app(1)
+    update_user(app, 'admin', can_create_admins=True)
+    admin = login(app, 'admin')
+    assert admin.get('/admin/create_admin').status_code == 200
+    assert is_cached(app, 'admin')
+
+    response = admin.post('/admin/create_admin', data={
+        'username': 'second_admin', 'email': 'second@example.com', 'mobile_number': '03000000009',
+        'id_card_number': '35202-0000009-1', 'password': 'second-password',
+        'password2': 'second-password', 'role': 'limited'})
+    assert response.status_code == 302
+    second = login(app, 'second_admin')
+    assert second.get('/admin/stolen_report').status_code == 200
+    # A limited admin cannot create admins, whatever the creator's cached row says
+    assert second.get('/admin/create_admin').status_code == 302
+
+
+if __name__ == "__main__":
+    test_demoted_admin_loses_admin_pages()
+    test_demotion_in_another_worker_reaches_this_one()
+    test_approve_shopkeeper_evicts_principal()
+    test_edit_user_evicts_principal()
+    test_create_admin_principal_is_current()
+    print("=== Principals follow user changes ===")
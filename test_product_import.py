@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Bulk product import: valid rows are registered in bulk, every other row
+is reported with its line number, and the counters the bulk INSERTs bypass
+are kept exact"""
+
+import sys
+import os
+import io
+
+from sqlalchemy import func, select
+
+# Add the project directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from counters import get_counters, reconcile_counters, reconcile_product_counts, TOTAL_PRODUCTS
+from extensions import db
+from models import User, Brand, Category, Product, ProductStatusHistory
+from product_import import read_rows, import_products
+from verification import lookup_serial
+from test_query_counts import build_app
+
+
+def build_import_app():
+    app = build_app(2)
+    with app.app_context():
+        reconcile_counters()
+    return app
+
+
+def csv_rows(lines):
+    data = '\n'.join(','.join(line) for line in lines).encode()
+    return read_rows(io.BytesIO(data), 'products.csv', 100)
+
+
+def product_count(username):
+    return db.session.scalar(select(User.product_count).where(User.username == username))
+
+
+def test_import_reports_bad_rows_and_keeps_counters():
+    app = build_import_app()
+    with app.app_context():
+        user = User.query.filter_by(username='user').first()
+        existing = db.session.scalar(select(Product.serial_number).where(Product.user_id == user.id))
+        brand = db.session.scalar(select(Brand.name))
+        category = db.session.scalar(select(Category.name))
+        total_before = get_counters()[TOTAL_PRODUCTS]
+        owned_before = product_count('user')
+        # Cache a miss: the import must make the new serial verifiable at once
+        assert lookup_serial('IMP-0001') is None
+
+        rows = csv_rows([
+            ('Name', 'Serial Number', 'Brand', 'Category'),
+            ('Camera A', 'IMP-0001', brand, category),
+            ('Camera B', 'IMP-0001', brand, category),
+            ('Camera C', existing, brand, category),
+            ('X', 'IMP-0003', 'No Such Brand', category),
+            ('', '', '', ''),
+            ('Camera D', 'IMP-0004', brand.upper(), category),
+        ])
+        result = import_products(user, rows)
+
+        # A regular user may own 3 products; the user owned 2
+        assert owned_before == 2
+        assert result.imported == 1
+        errors = {error.row: error.message for error in result.errors}
+        assert sorted(errors) == [3, 4, 5, 7]
+        assert 'repeats row 2' in errors[3]
+        assert 'already registered' in errors[4]
+        assert 'name must be' in errors[5] and 'Unknown brand' in errors[5]
+        assert 'limit reached' in errors[7]
+
+        product = Product.query.filter_by(serial_number='IMP-0001').one()
+        assert product.user_id == user.id and product.status == 'for_sale'
+        assert db.session.scalar(select(func.count(ProductStatusHistory.id))
+                                 .where(ProductStatusHistory.product_id == product.id)) == 1
+        assert lookup_serial('IMP-0001') is not None
+
+        assert product_count('user') == owned_before + 1
+        assert get_counters()[TOTAL_PRODUCTS] == total_before + 1
+        assert reconcile_counters() == {}
+        assert reconcile_product_counts() == {}
+
+
+def test_subscriber_imports_past_free_quota():
+    app = build_import_app()
+    with app.app_context():
+        user = User.query.filter_by(username='user').first()
+        user.has_subscription = True
+        db.session.commit()
+        brand = db.session.scalar(select(Brand.name))
+        category = db.session.scalar(select(Category.name))
+
+        rows = csv_rows([('name', 'serial', 'brand', 'category')] +
+                        [(f'Lens {i}', f'SUB-{i:04d}', brand, category) for i in range(5)])
+        result = import_products(user, rows)
+
+        assert result.imported == 5 and result.errors == []
+        assert product_count('user') == 7
+        assert reconcile_counters() == {}
+        assert reconcile_product_counts() == {}
+
+
+def test_unusable_files_are_rejected():
+    for data, filename, message in [
+        (b'name,serial\nA,B\n', 'products.csv', 'Missing column'),
+        (b'', 'products.csv', 'empty'),
+        (b'name,serial,brand,category\n', 'products.txt', '.csv or .xlsx'),
+        (b'name,serial,brand,category\nA1,S1,B,C\nA2,S2,B,C\n', 'products.csv', 'more than 1 products'),
+    ]:
+        try:
+            read_rows(io.BytesIO(data), filename, 1)
+        except ValueError as e:
+            assert message in str(e), str(e)
+        else:
+            raise AssertionError(f'{filename} {data!r} was accepted')
+
+
+if __name__ == "__main__":
+    test_import_reports_bad_rows_and_keeps_counters()
+    test_subscriber_imports_past_free_quota()
+    test_unusable_files_are_rejected()
+    print("=== Product import checks passed ===")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Query-count harness: list pages must issue a bounded number of SQL
+statements no matter how many rows they render"""
+
+import sys
+import os
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# Add the project directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from extensions import db
+from models import User, Category, Brand, Product
+
+# Statements allowed per page render (session user load + listing + counts)
+MAX_STATEMENTS = 8
+
+PAGES = [
+    ('user', '/user_dashboard'),
+    ('shopkeeper', '/shopkeeper_dashboard'),
+    ('admin', '/admin/stolen_report'),
+    ('admin', '/admin/deal_history?search=SN-'),
+]
+
+
+@contextmanager
+def count_queries(engine):
+    """Collect every statement executed on engine inside the block"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def build_app(products_per_user):
+    """In-memory registry with a regular user, a shopkeeper and an admin"""
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'WTF_CSRF_ENABLED': False,
+        'TESTING': True
+    })
+    with app.app_context():
+        db.create_all()
+        users = {
+            'user': User(username='user', email='user@example.com', mobile_number='03000000001',
+                         id_card_number='35202-0000001-1', shopkeeper_approved=True),
+            'shopkeeper': User(username='shopkeeper', email='shop@example.com', mobile_number='03000000002',
+                               id_card_number='35202-0000002-1', shop_name='Shop',
+                               is_shopkeeper=True, shopkeeper_approved=True),
+            'admin': User(username='admin', email='admin@example.com', mobile_number='03000000003',
+                          id_card_number='35202-0000003-1', is_admin=True),
+        }
+        # Other owners whose stolen products show up on the admin reports
+        owners = [User(username=f'owner{i}', email=f'owner{i}@example.com', mobile_number=f'0310{i:07d}',
+                       id_card_number=f'35202-{i:07d}-9', shopkeeper_approved=True)
+                  for i in range(products_per_user)]
+        for user in list(users.values()) + owners:
+            # Cheap hash: the harness measures queries, not password hashing
+            user.password_hash = 'x'
+            db.session.add(user)
+        db.session.flush()
+
+        # Distinct category/brand/owner per row so lazy loads cannot hit the identity map
+        def add_product(owner, i, status):
+            category = Category(name=f'Category {owner.id}-{i}')
+            brand = Brand(name=f'Brand {owner.id}-{i}')
+            db.session.add_all([category, brand])
+            db.session.flush()
+            db.session.add(Product(
+                name=f'Product {i}', serial_number=f'SN-{owner.id}-{i}', status=status,
+                user_id=owner.id, category_id=category.id, brand_id=brand.id))
+
+        for owner in (users['user'], users['shopkeeper']):
+            for i in range(products_per_user):
+                add_product(owner, i, 'stolen' if i % 2 else 'for_sale')
+        for i, owner in enumerate(owners):
+            add_product(owner, i, 'stolen')
+        db.session.commit()
+    return app
+
+
+def statements_per_page(products_per_user):
+    """Render every page once and return {url: statement count}"""
+    app = build_app(products_per_user)
+    counts = {}
+    for username, url in PAGES:
+        with app.test_client() as client, app.app_context():
+            with client.session_transaction() as session:
+                user_id = User.query.filter_by(username=username).first().id
+                session['_user_id'] = str(user_id)
+                session['_fresh'] = True
+            db.session.remove()
+            with count_queries(db.engine) as statements:
+                response = client.get(url)
+            assert response.status_code == 200, f'{url} returned {response.status_code}'
+            counts[url] = len(statements)
+    return counts
+
+
+def test_list_pages_have_bounded_query_counts():
+    """Statement count is independent of row count and stays under the cap"""
+    small = statements_per_page(2)
+    large = statements_per_page(40)
+    for url, count in large.items():
+        assert count == small[url], f'{url}: {small[url]} statements for 2 rows, {count} for 40'
+        assert count <= MAX_STATEMENTS, f'{url}: {count} statements (max {MAX_STATEMENTS})'
+
+
+if __name__ == "__main__":
+    for url, count in statements_per_page(40).items():
+        print(f"{url}: {count} statements")
+    test_list_pages_have_bounded_query_counts()
+    print("=== Query counts bounded ===")
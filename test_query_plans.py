@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Query-plan regression test: every statement the hot pages run against
+the large tables must be answered from an index, never a full table scan"""
+
+import os
+import re
+import sys
+
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# Add the project directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from extensions import db
+from models import User, Category, Brand, Product, Deal, DealItem, ProductStatusHistory, OwnershipHistory
+from counters import reconcile_counters
+from search import install_search_index
+
+# Tables that grow with usage; small reference tables may be scanned
+HOT_TABLES = ('product', 'deal', 'deal_item', 'ownership_history', 'product_status_history')
+
+FULL_SCAN = re.compile(r'\bSCAN (%s)\b' % '|'.join(HOT_TABLES))
+
+PAGES = [
+    ('user', '/user_dashboard'),
+    ('user', '/user_deals'),
+    ('user', '/product_history/{product_id}'),
+    ('user', '/product_timeline/{product_id}'),
+    ('user', '/deal/{deal_id}'),
+    ('admin', '/admin/deals?status=pending'),
+    ('admin', '/admin/deals?status=pending&search=SN-1'),
+    ('admin', '/admin/stolen_report'),
+    ('admin', '/admin/product_deal_history/{product_id}'),
+]
+
+
+@contextmanager
+def capture_statements(engine):
+    """Collect (statement, parameters) for everything executed on engine inside the block"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def build_app():
+    """In-memory registry with the production indexes and search index
+
+    The tables are small and never ANALYZEd, so SQLite plans as if they were
+    large: an index that exists and applies is always chosen.
+    """
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'WTF_CSRF_ENABLED': False,
+        'TESTING': True
+    })
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as connection:
+            install_search_index(connection)
+
+        user = User(username='user', email='user@example.com', mobile_number='03000000001',
+                    id_card_number='35202-0000001-1', password_hash='x')
+        other = User(username='other', email='other@example.com', mobile_number='03000000002',
+                     id_card_number='35202-0000002-1', password_hash='x')
+        admin = User(username='admin', email='admin@example.com', mobile_number='03000000003',
+                     id_card_number='35202-0000003-1', password_hash='x', is_admin=True)
+        category = Category(name='Camera')
+        brand = Brand(name='Canon')
+        db.session.add_all([user, other, admin, category, brand])
+        db.session.flush()
+
+        for i in range(20):
+            product = Product(name=f'Product {i}', serial_number=f'SN-{i}',
+                              status='stolen' if i % 4 == 0 else 'for_sale',
+                              user_id=user.id, category_id=category.id, brand_id=brand.id)
+            db.session.add(product)
+            db.session.flush()
+            db.session.add(ProductStatusHistory(product_id=product.id, old_status=None,
+                                                new_status=product.status, changed_by=user.id))
+            deal = Deal(buyer_id=user.id, seller_id=other.id, status='pending')
+            db.session.add(deal)
+            db.session.flush()
+            db.session.add(DealItem(deal_id=deal.id, product_id=product.id, price=0.0))
+            db.session.add(OwnershipHistory(product_id=product.id, previous_owner_id=other.id,
+                                            new_owner_id=user.id, deal_id=deal.id))
+        db.session.commit()
+        # Dashboards read the stored counters, as they would after the migration
+        reconcile_counters()
+    return app
+
+
+def page_statements():
+    """Render every page once; returns [(url, statement, parameters)]"""
+    app = build_app()
+    captured = []
+    for username, url in PAGES:
+        with app.test_client() as client, app.app_context():
+            url = url.format(product_id=Product.query.first().id, deal_id=Deal.query.first().id)
+            with client.session_transaction() as session:
+                session['_user_id'] = str(User.query.filter_by(username=username).first().id)
+                session['_fresh'] = True
+            db.session.remove()
+            with capture_statements(db.engine) as statements:
+                response = client.get(url)
+            assert response.status_code == 200, f'{url} returned {response.status_code}'
+            captured.extend((url, statement, parameters) for statement, parameters in statements)
+    return app, captured
+
+
+def full_scans():
+    """[(url, statement, plan line)] for every statement that scans a hot table"""
+    app, captured = page_statements()
+    scans = []
+    with app.app_context():
+        connection = db.session.connection()
+        for url, statement, parameters in captured:
+            if not statement.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+            for row in plan:
+                if FULL_SCAN.search(row[-1]):
+                    scans.append((url, statement, row[-1]))
+    return scans
+
+
+def test_hot_queries_use_indexes():
+    """No hot-page statement falls back to a full scan of a large table"""
+    scans = full_scans()
+    assert not scans, '\n\n'.join(f'{url}: {line}\n{statement}' for url, statement, line in scans)
+
+
+if __name__ == "__main__":
+    for url, statement, line in full_scans():
+        print(f"{url}: {line}\n{statement}\n")
+    test_hot_queries_use_indexes()
+    print("=== All hot queries use indexes ===")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Registry exports must hand user-entered text to spreadsheets as text,
+never as a formula, and refuse what they cannot export before the
+download starts"""
+
+import sys
+import os
+import re
+import tempfile
+import zipfile
+
+import pytest
+
+# Add the project directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extensions import db
+from models import Product, User
+import registry_export
+from registry_export import stream_csv, stream_export, write_xlsx
+from test_query_counts import build_app
+
+FORMULA = '=1+1'
+
+
+def build_export_app():
+    """Registry with one product whose name is a formula"""
+    app = build_app(1)
+    with app.app_context():
+        product = Product.query.order_by(Product.id).first()
+        product.name = FORMULA
+        db.session.commit()
+    return app
+
+
+def test_xlsx_writes_formula_text_as_string():
+    app = build_export_app()
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        with app.app_context():
+            write_xlsx('products', {}, path)
+        with zipfile.ZipFile(path) as workbook:
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+    finally:
+        os.remove(path)
+
+    assert '<f>' not in sheet, 'the workbook contains a formula'
+    cell = re.search(r'<c r="C2"[^>]*>.*?</c>', sheet)
+    assert cell is not None, 'product name cell missing'
+    # constant_memory workbooks store strings inline
+    assert 't="inlineStr"' in cell.group(0), cell.group(0)
+    assert f'<t>{FORMULA}</t>' in cell.group(0), cell.group(0)
+
+
+def test_csv_neutralises_formula_text():
+    app = build_export_app()
+    with app.app_context():
+        content = b''.join(stream_csv('products', {})).decode('utf-8-sig')
+    assert f"'{FORMULA}" in content
+    assert f',{FORMULA},' not in content
+
+
+def test_xlsx_row_limit_is_checked_before_streaming(monkeypatch):
+    app = build_export_app()
+    with app.app_context():
+        rows = Product.query.count()
+        monkeypatch.setattr(registry_export, 'XLSX_MAX_ROWS', rows)
+        chunks, filename, _ = stream_export('products', {}, 'xlsx')
+        chunks.close()
+        assert filename.endswith('.xlsx')
+
+        monkeypatch.setattr(registry_export, 'XLSX_MAX_ROWS', rows - 1)
+        with pytest.raises(ValueError, match='more than one XLSX sheet'):
+            stream_export('products', {}, 'xlsx')
+        # CSV has no row limit
+        stream_export('products', {}, 'csv')[0].close()
+
+
+def test_deal_only_filters_are_rejected():
+    app = build_export_app()
+    with app.app_context():
+        with pytest.raises(ValueError, match='cannot be filtered by user'):
+            stream_export('products', {'user': 'user'}, 'csv')
+        with pytest.raises(ValueError, match='cannot be filtered by deal_ids'):
+            stream_export('deals', {'deal_ids': [1]}, 'csv')
+        admin_id = User.query.filter_by(username='admin').first().id
+
+    with app.test_client() as client:
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin_id)
+            session['_fresh'] = True
+        response = client.get('/admin/export?dataset=products&user=user')
+        assert response.status_code == 302
+        response = client.get('/admin/export?dataset=products&status=stolen')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/csv'
+
+
+if __name__ == "__main__":
+    test_xlsx_writes_formula_text_as_string()
+    test_csv_neutralises_formula_text()
+    print("=== Exports write formulas as text ===")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""Search index: the FTS5 path of matching_ids() and search_deals() returns
+exactly the rows of the ILIKE fallback, before and after inserts, updates
+and deletes, and keyset pages of a deal search (exact matches first) walk
+every result once in both directions"""
+
+import sys
+import os
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+# Add the project directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import search
+from deal_search import search_deals
+from extensions import db
+from models import User, Product, Deal, DealItem
+from pagination import paginate
+from search import SEARCH_FIELDS, install_search_index, rebuild_search_index, matching_ids
+from test_query_counts import build_app
+
+TERMS = ['SN-1', 'sn-1-1', 'SN-1-1', 'owner1', '0310', 'Shop', 'traders', '03000000001', 'SN', 'zz-no-match']
+
+BASE_TIME = datetime(2024, 1, 1, 12, 0)
+
+
+def build_search_app():
+    """build_app() with the search index installed and twelve deals of user's products
+
+    Deals share created_at in threes so the id tie-breaker is part of the ordering.
+    """
+    app = build_app(12)
+    with app.app_context():
+        with db.engine.begin() as connection:
+            install_search_index(connection)
+            rebuild_search_index(connection)
+        user = User.query.filter_by(username='user').first()
+        shopkeeper = User.query.filter_by(username='shopkeeper').first()
+        for i in range(12):
+            product = Product.query.filter_by(serial_number=f'SN-{user.id}-{i}').first()
+            add_deal(shopkeeper, user, [product], BASE_TIME + timedelta(minutes=i // 3))
+        # Unregistered seller whose name only contains a serial
+        add_deal(shopkeeper, None, [], BASE_TIME + timedelta(minutes=1), seller_name=f'SN-{user.id}-1 Traders',
+                 seller_mobile='03119999999')
+        db.session.commit()
+    return app
+
+
+def add_deal(buyer, seller, products, created_at, **fields):
+    deal = Deal(buyer_id=buyer.id, seller_id=seller.id if seller else None, created_at=created_at, **fields)
+    db.session.add(deal)
+    db.session.flush()
+    for product in products:
+        db.session.add(DealItem(deal_id=deal.id, product_id=product.id, price=100.0))
+    return deal
+
+
+@contextmanager
+def fts(enabled):
+    """Force matching_ids() onto the FTS path or the ILIKE fallback"""
+    engine = db.engine
+    search._fts_available[engine] = enabled
+    try:
+        yield
+    finally:
+        search._fts_available.pop(engine, None)
+
+
+def ids(kind, term, fields=None):
+    return set(db.session.scalars(matching_ids(kind, term, fields)))
+
+
+def deal_ids(term):
+    query, keys = search_deals(Deal.query, term)
+    return set(deal.id for deal in query)
+
+
+def assert_search_in_sync():
+    assert search.fts_enabled()
+    for term in TERMS:
+        for kind, (_, fields) in SEARCH_FIELDS.items():
+            for subset in (None,) + tuple((field,) for field in fields):
+                with fts(True):
+                    indexed = ids(kind, term, subset)
+                with fts(False):
+                    scanned = ids(kind, term, subset)
+                assert indexed == scanned, f'{kind} {subset} {term!r}: FTS {indexed}, ILIKE {scanned}'
+        with fts(True):
+            indexed = deal_ids(term)
+        with fts(False):
+            scanned = deal_ids(term)
+        assert indexed == scanned, f'deals {term!r}: FTS {indexed}, ILIKE {scanned}'
+
+
+def test_fts_matches_ilike_through_changes():
+    app = build_search_app()
+    with app.app_context():
+        assert_search_in_sync()
+        user = User.query.filter_by(username='user').first()
+        shopkeeper = User.query.filter_by(username='shopkeeper').first()
+        assert ids('product', f'sn-{user.id}-1') == set(db.session.scalars(
+            select(Product.id).where(Product.serial_number.in_(
+                [f'SN-{user.id}-1', f'SN-{user.id}-10', f'SN-{user.id}-11']))))
+
+        # Inserts
+        category_id, brand_id = db.session.execute(
+            select(Product.category_id, Product.brand_id).where(Product.user_id == user.id)).first()
+        added = Product(name='Added', serial_number=f'sn-{user.id}-1-ADDED', status='for_sale',
+                        user_id=shopkeeper.id, category_id=category_id, brand_id=brand_id)
+        db.session.add(added)
+        db.session.add(User(username='owner1_traders', email='traders@example.com', mobile_number='03100000099',
+                            id_card_number='35202-0000099-1', password_hash='x'))
+        add_deal(user, None, [], BASE_TIME, seller_name='Owner1 Traders')
+        db.session.commit()
+        assert added.id in ids('product', f'SN-{user.id}-1')
+        assert_search_in_sync()
+
+        # Updates, including moving a row out of and into a match
+        added.serial_number = 'RENAMED-0001'
+        Product.query.filter_by(serial_number=f'SN-{user.id}-0').first().serial_number = f'SN-{user.id}-1-MOVED'
+        User.query.filter_by(username='owner1').first().username = 'ownerX'
+        Deal.query.filter_by(seller_name='Owner1 Traders').first().seller_mobile = '03000000001'
+        db.session.commit()
+        assert added.id not in ids('product', f'SN-{user.id}-1')
+        assert_search_in_sync()
+
+        # Deletes
+        db.session.delete(Deal.query.filter_by(seller_name='Owner1 Traders').first())
+        db.session.delete(User.query.filter_by(username='owner1_traders').first())
+        db.session.commit()
+        db.session.delete(added)
+        db.session.commit()
+        assert_search_in_sync()
+
+
+def walk(query, keys, per_page):
+    """Every page forward from the start, then every page back from the last"""
+    forward, page = [], paginate(query, keys=keys, per_page=per_page)
+    pages = [page]
+    while True:
+        forward += [deal.id for deal in page.items]
+        if not page.has_next:
+            break
+        page = paginate(query, keys=keys, cursor=page.next_cursor, per_page=per_page)
+        pages.append(page)
+
+    backward = [deal.id for deal in page.items]
+    while page.prev_cursor:
+        page = paginate(query, keys=keys, cursor=page.prev_cursor, direction='prev', per_page=per_page)
+        backward = [deal.id for deal in page.items] + backward
+    return forward, backward, len(pages)
+
+
+def test_deal_search_pages_exact_matches_first():
+    app = build_search_app()
+    with app.app_context():
+        user = User.query.filter_by(username='user').first()
+        term = f'SN-{user.id}-1'
+        # Two more deals of the exactly matching product, older and newer than the rest
+        product = Product.query.filter_by(serial_number=term).first()
+        shopkeeper = User.query.filter_by(username='shopkeeper').first()
+        add_deal(shopkeeper, user, [product], BASE_TIME - timedelta(days=1))
+        add_deal(shopkeeper, user, [product], BASE_TIME + timedelta(days=1))
+        db.session.commit()
+
+        deals = Deal.query.all()
+
+        def serials(deal):
+            return [item.product.serial_number for item in DealItem.query.filter_by(deal_id=deal.id)]
+
+        exact = [deal for deal in deals if term in serials(deal)]
+        partial = [deal for deal in deals if deal not in exact and (
+            any(term.lower() in serial.lower() for serial in serials(deal))
+            or term.lower() in (deal.seller_name or '').lower())]
+        newest_first = lambda deal: (deal.created_at, deal.id)
+        expected = ([deal.id for deal in sorted(exact, key=newest_first, reverse=True)]
+                    + [deal.id for deal in sorted(partial, key=newest_first, reverse=True)])
+        assert len(exact) == 3 and len(partial) == 3
+
+        for enabled in (True, False):
+            with fts(enabled):
+                query, keys = search_deals(Deal.query, term)
+                for per_page in (1, 2, 4, 25):
+                    forward, backward, pages = walk(query, keys, per_page)
+                    assert forward == expected, (enabled, per_page)
+                    assert backward == expected, (enabled, per_page)
+                    assert pages == -(-len(expected) // per_page)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Version stamps: concurrent bumps from many threads never fail or leave
+temporary files behind"""
+
+import sys
+import os
+import shutil
+import tempfile
+import threading
+
+# Add the project directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from version_stamp import read_stamp, bump_stamp
+
+THREADS = 8
+BUMPS = 300
+
+
+def test_concurrent_bumps():
+    directory = tempfile.mkdtemp(prefix='registry_stamp_')
+    path = os.path.join(directory, 'data.version')
+    errors = []
+
+    def bump_many():
+        for _ in range(BUMPS):
+            try:
+                bump_stamp(path)
+            except OSError as e:
+                errors.append(e)
+
+    try:
+        assert read_stamp(path) == ''
+        threads = [threading.Thread(target=bump_many) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert not errors, f'{len(errors)} bumps failed, e.g. {errors[0]!r}'
+        assert read_stamp(path)
+        assert os.listdir(directory) == ['data.version']
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_concurrent_bumps()
+    print("=== Concurrent stamp bumps succeed ===")
@@ -0,0 +1,163 @@
+"""
+Product Timeline
+One chronological stream of everything that happened to a product: status
+changes, ownership transfers and the deals it was part of.
+
+The three sources are merged by a single UNION ALL query, paged with a
+keyset cursor on (occurred_at, kind, event_id), newest first. Each branch
+is served by the product's history or deal item index. The users a page
+refers to are then loaded with one IN query, so rendering a page never
+lazy-loads per row.
+"""
+
+from collections import namedtuple
+
+from sqlalchemy import Integer, String, cast, literal, null, select, union_all
+
+from models import User, Deal, DealItem, ProductStatusHistory, OwnershipHistory
+from pagination import paginate_select, DEFAULT_PER_PAGE
+
+STATUS_CHANGE = 'status'
+OWNERSHIP_TRANSFER = 'transfer'
+DEAL = 'deal'
+
+EVENT_KINDS = (STATUS_CHANGE, OWNERSHIP_TRANSFER, DEAL)
+
+
+class TimelineEvent(namedtuple('TimelineEvent', [
+        'kind', 'id', 'occurred_at', 'actor', 'from_user', 'to_user',
+        'old_value', 'new_value', 'deal_id', 'note'])):
+    """One timeline entry; actor/from_user/to_user are User objects or None
+
+    status:   actor changed the status from old_value to new_value
+    transfer: ownership moved from from_user to to_user (new_value is the transfer type)
+    deal:     to_user (buyer) and from_user or note (seller) opened deal deal_id,
+              whose current status is new_value
+    """
+    __slots__ = ()
+
+    def to_dict(self):
+        def username(user):
+            return user.username if user is not None else None
+
+        return {
+            'kind': self.kind,
+            'id': self.id,
+            'occurred_at': self.occurred_at.isoformat() if self.occurred_at else None,
+            'actor': username(self.actor),
+            'from_user': username(self.from_user),
+            'to_user': username(self.to_user),
+            'old_value': self.old_value,
+            'new_value': self.new_value,
+            'deal_id': self.deal_id,
+            'note': self.note
+        }
+
+
+_COLUMNS = ('kind', 'event_id', 'occurred_at', 'actor_id', 'from_user_id', 'to_user_id',
+            'old_value', 'new_value', 'deal_id', 'note')
+
+
+def _event_select(kind, event_id, occurred_at, actor_id=None, from_user_id=None, to_user_id=None,
+                  old_value=None, new_value=None, deal_id=None, note=None):
+    """One UNION branch; missing values become typed NULLs so every branch lines up"""
+    def user(column):
+        return cast(null(), Integer) if column is None else column
+
+    def text(column):
+        return cast(null(), String) if column is None else column
+
+    values = (literal(kind, String), event_id, occurred_at, user(actor_id), user(from_user_id),
+              user(to_user_id), text(old_value), text(new_value), user(deal_id), text(note))
+    return select(*[value.label(name) for value, name in zip(values, _COLUMNS)])
+
+
+def _status_events(product_id):
+    return _event_select(
+        STATUS_CHANGE, ProductStatusHistory.id, ProductStatusHistory.changed_at,
+        actor_id=ProductStatusHistory.changed_by,
+        old_value=ProductStatusHistory.old_status,
+        new_value=ProductStatusHistory.new_status
+    ).where(ProductStatusHistory.product_id == product_id)
+
+
+def _transfer_events(product_id):
+    return _event_select(
+        OWNERSHIP_TRANSFER, OwnershipHistory.id, OwnershipHistory.transfer_date,
+        from_user_id=OwnershipHistory.previous_owner_id,
+        to_user_id=OwnershipHistory.new_owner_id,
+        new_value=OwnershipHistory.transfer_type,
+        deal_id=OwnershipHistory.deal_id
+    ).where(OwnershipHistory.product_id == product_id)
+
+
+def _deal_events(product_id):
+    return _event_select(
+        DEAL, Deal.id, Deal.created_at,
+        from_user_id=Deal.seller_id,
+        to_user_id=Deal.buyer_id,
+        new_value=Deal.status,
+        deal_id=Deal.id,
+        note=Deal.seller_name
+    ).join(DealItem, DealItem.deal_id == Deal.id).where(DealItem.product_id == product_id)
+
+
+_BRANCHES = {
+    STATUS_CHANGE: _status_events,
+    OWNERSHIP_TRANSFER: _transfer_events,
+    DEAL: _deal_events,
+}
+
+
+def timeline_statement(product_id, kinds=EVENT_KINDS):
+    """SELECT over the merged event rows of a product, restricted to kinds"""
+    branches = [_BRANCHES[kind](product_id) for kind in kinds]
+    events = (union_all(*branches) if len(branches) > 1 else branches[0]).subquery('timeline')
+    return select(events), events
+
+
+def _resolve_users(rows):
+    user_ids = {user_id for row in rows
+                for user_id in (row.actor_id, row.from_user_id, row.to_user_id) if user_id is not None}
+    if not user_ids:
+        return {}
+    return {user.id: user for user in User.query.filter(User.id.in_(user_ids))}
+
+
+def timeline_page(product_id, kinds=EVENT_KINDS, cursor=None, direction='next',
+                  per_page=DEFAULT_PER_PAGE, prefix=''):
+    """One KeysetPage of TimelineEvents, newest first"""
+    stmt, events = timeline_statement(product_id, kinds)
+    keys = [(events.c.occurred_at, True), (events.c.kind, True), (events.c.event_id, True)]
+    page = paginate_select(stmt, keys, cursor=cursor, direction=direction,
+                           per_page=per_page, prefix=prefix)
+
+    users = _resolve_users(page.items)
+    page.items = [TimelineEvent(
+        kind=row.kind,
+        id=row.event_id,
+        occurred_at=row.occurred_at,
+        actor=users.get(row.actor_id),
+        from_user=users.get(row.from_user_id),
+        to_user=users.get(row.to_user_id),
+        old_value=row.old_value,
+        new_value=row.new_value,
+        deal_id=row.deal_id,
+        note=row.note
+    ) for row in page.items]
+    return page
+
+
+def parse_kinds(value):
+    """Event kinds from a comma-separated request argument; all kinds when empty
+
+    Raises ValueError for an unknown kind.
+    """
+    if not value:
+        return EVENT_KINDS
+    kinds = tuple(dict.fromkeys(kind.strip() for kind in value.split(',') if kind.strip()))
+    unknown = [kind for kind in kinds if kind not in EVENT_KINDS]
+    if unknown or not kinds:
+        raise ValueError(f'Unknown timeline event kind(s): {", ".join(unknown)}. '
+                         f'Use {", ".join(EVENT_KINDS)}.')
+    return kinds
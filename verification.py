@@ -0,0 +1,241 @@
+"""
+Serial Number Verification
+Resolves a serial number to a flat verification record with a single
+indexed query and keeps recently verified serials in an in-process cache.
+Multi-serial deal forms are checked in one batch with verify_serials().
+
+The cache is only trusted while the verification version stamp
+(VERIFICATION_VERSION_FILE, see version_stamp.py) is unchanged. Every
+commit that changes a product, or an owner's shopkeeper flag, bumps the
+stamp, so no worker keeps serving a product as for sale once it has been
+reported stolen.
+"""
+
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from local_cache import EngineCaches
+from models import User, Product, Category, Brand
+from version_stamp import read_stamp, bump_stamp
+
+
+class VerificationRecord(namedtuple('VerificationRecord', [
+        'product_id', 'name', 'serial_number', 'brand_name', 'category_name',
+        'status', 'created_at', 'owner_is_shopkeeper'])):
+    """Everything the public verification pages need to know about a product"""
+    __slots__ = ()
+
+    @property
+    def can_sell(self):
+        # Evaluated on read so the 3-day holding period never goes stale in the cache
+        return Product.is_sellable(self.status, self.owner_is_shopkeeper, self.created_at)
+
+    def to_dict(self):
+        """JSON payload used by verify_product_ajax"""
+        return {
+            'name': self.name,
+            'serial_number': self.serial_number,
+            'brand': self.brand_name,
+            'category': self.category_name,
+            'status': self.status,
+            'can_sell': self.can_sell
+        }
+
+
+# serial -> VerificationRecord, or None for a cached miss
+_caches = EngineCaches()
+
+
+def _cache():
+    return _caches.get()
+
+
+def _version_file():
+    return current_app.config['VERIFICATION_VERSION_FILE']
+
+
+def _verification_query():
+    """Single joined query returning only the columns a verification needs"""
+    return db.session.query(
+        Product.id, Product.name, Product.serial_number, Brand.name, Category.name,
+        Product.status, Product.created_at, User.is_shopkeeper
+    ).join(Brand, Product.brand_id == Brand.id) \
+     .join(Category, Product.category_id == Category.id) \
+     .join(User, Product.user_id == User.id)
+
+
+def fetch_verification(serial_number):
+    """Load a verification record straight from the database (no cache)"""
+    row = _verification_query().filter(Product.serial_number == serial_number).first()
+    if row is None:
+        return None
+    return VerificationRecord(*row)
+
+
+def lookup_serial(serial_number):
+    """Return the VerificationRecord for a serial number, or None if it is not registered"""
+    # Read the stamp before querying: a change committed meanwhile is not cached
+    version = read_stamp(_version_file())
+    cache = _cache()
+    found, record = cache.get(serial_number, version)
+    if found:
+        return record
+
+    record = fetch_verification(serial_number)
+    cache.set(serial_number, record, version,
+              current_app.config.get('VERIFICATION_CACHE_TTL', 300),
+              current_app.config.get('VERIFICATION_CACHE_SIZE', 10000))
+    return record
+
+
+# Batch verification
+
+# Verdicts returned by verify_serials(), with the wording used in flash messages
+VERDICT_OK = 'ok'
+VERDICT_MESSAGES = {
+    'not_found': 'not found',
+    'locked': 'locked',
+    'stolen': 'stolen/snatched',
+    'not_for_sale': 'not for sale',
+    'holding_period': 'not eligible for sale - holding period not met',
+    VERDICT_OK: 'ok'
+}
+
+# Keeps each IN list well below the bound-parameter limits of SQLite/Postgres
+BATCH_CHUNK_SIZE = 500
+
+
+def parse_serial_numbers(raw):
+    """Split a comma/newline separated serial list, dropping blanks and duplicates"""
+    serials = []
+    seen = set()
+    for serial_number in raw.replace('\n', ',').split(','):
+        serial_number = serial_number.strip()
+        if serial_number and serial_number not in seen:
+            seen.add(serial_number)
+            serials.append(serial_number)
+    return serials
+
+
+def product_verdict(product):
+    """Classify a product (or None) the way the deal forms report it"""
+    if product is None:
+        return 'not_found'
+    if product.status in ('locked', 'stolen'):
+        return product.status
+    if product.status != 'for_sale':
+        return 'not_for_sale'
+    if product.owner is None or not Product.is_sellable(
+            product.status, product.owner.is_shopkeeper, product.created_at):
+        return 'holding_period'
+    return VERDICT_OK
+
+
+def load_products_by_serial(serial_numbers):
+    """Fetch products with owner, brand and category eagerly joined, keyed by serial"""
+    products = {}
+    serial_numbers = list(serial_numbers)
+    for start in range(0, len(serial_numbers), BATCH_CHUNK_SIZE):
+        chunk = serial_numbers[start:start + BATCH_CHUNK_SIZE]
+        query = Product.query.options(
+            joinedload(Product.owner),
+            joinedload(Product.brand),
+            joinedload(Product.category)
+        ).filter(Product.serial_number.in_(chunk))
+        for product in query:
+            products[product.serial_number] = product
+    return products
+
+
+def verify_serials(serial_numbers):
+    """Verify many serials at once
+
+    Returns an ordered list of (serial_number, verdict, product) tuples, where
+    product is None for unknown serials.
+    """
+    serial_numbers = list(dict.fromkeys(serial_numbers))
+    products = load_products_by_serial(serial_numbers)
+    results = []
+    for serial_number in serial_numbers:
+        product = products.get(serial_number)
+        results.append((serial_number, product_verdict(product), product))
+    return results
+
+
+def describe_rejections(results, allowed=(VERDICT_OK,)):
+    """Format rejected serials as 'SERIAL (reason)' strings for flash messages"""
+    return [f'{serial_number} ({VERDICT_MESSAGES[verdict]})'
+            for serial_number, verdict, _ in results if verdict not in allowed]
+
+
+def invalidate_serials(serial_numbers):
+    """Drop cached records everywhere, e.g. after a bulk UPDATE that bypasses the ORM"""
+    _cache().discard(serial_numbers)
+    bump_stamp(_version_file())
+
+
+def clear_cache():
+    """Empty this database's verification cache in this process"""
+    _cache().clear()
+
+
+# Cache invalidation
+# Any flushed change to a Product (status update, ownership transfer, deal
+# approval, registration or deletion), or to a user's shopkeeper flag, which
+# decides whether their products can be sold, makes cached records stale.
+# This process evicts the serials at flush; once the transaction commits the
+# version stamp is bumped so every other process drops its records too.
+
+_PENDING_KEY = 'verification_stale_serials'
+
+
+def _stale_records(session):
+    """Serials changed by this flush, and whether a shopkeeper flag changed"""
+    serials = set()
+    shopkeeper_changed = False
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            shopkeeper_changed = shopkeeper_changed or inspect(obj).attrs.is_shopkeeper.history.has_changes()
+            continue
+        if not isinstance(obj, Product):
+            continue
+        if obj.serial_number:
+            serials.add(obj.serial_number)
+        # A changed serial number must also evict the old key
+        history = inspect(obj).attrs.serial_number.history
+        serials.update(s for s in history.deleted if s)
+    return serials, shopkeeper_changed
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_stale_serials(session, flush_context):
+    serials, shopkeeper_changed = _stale_records(session)
+    if not serials and not shopkeeper_changed:
+        return
+    session.info.setdefault(_PENDING_KEY, set()).update(serials)
+    if has_app_context():
+        # Evict now as well so this worker never serves the old row mid-transaction
+        if shopkeeper_changed:
+            _cache().clear()
+        else:
+            _cache().discard(serials)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _evict_stale_serials(session):
+    if _PENDING_KEY in session.info and has_app_context():
+        # The commit already succeeded; a failed bump must not fail the request
+        try:
+            bump_stamp(_version_file())
+        except OSError:
+            current_app.logger.exception('Could not bump the verification version stamp')
+    session.info.pop(_PENDING_KEY, None)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_stale_serials(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,39 @@
+"""
+Version Stamps
+A small file holding a token that tells every process on the host that
+some cached data changed. Reading a stamp is one small file read; bumping
+it atomically replaces the file with a new token, so the next read in any
+worker sees a different value.
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+
+def read_stamp(path):
+    """Current stamp of path; '' while it has never been bumped"""
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return ''
+
+
+def bump_stamp(path):
+    """Give path a new stamp"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # A temporary file of its own per call, so concurrent bumps never share one
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(f'{time.time_ns()}-{os.getpid()}-{threading.get_ident()}')
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise